@@ -0,0 +1,389 @@
+"""
+Admission control for deepfake detection.
+
+detect_deepfake is memory and CPU heavy, so running many at once makes every
+request slow and can exhaust the dyno's memory. DetectionGovernor bounds the
+number of concurrent detections:
+
+- per process: at most `process_slots` detections run in this worker
+- per host: at most `host_slots` detections run across all workers on the
+  machine, using flock'ed slot files in `slot_dir` (POSIX only)
+
+Requests that cannot run immediately wait in a bounded queue. When the queue
+is full the request is rejected at once with 429, and when it waits longer
+than `queue_timeout` it is rejected with 503. Both carry a Retry-After
+estimate based on recent detection times.
+
+Waiting requests are not served first-come-first-served. Each priority class
+(PRIORITY_CLASSES, highest first) keeps one queue per user and free slots go
+to the highest class with an eligible waiter. Within a class users are served
+by deficit round-robin: every round a user's deficit grows by `quantum` and
+their next request runs once its cost (seconds of video) fits in the deficit,
+so a user queueing many or long videos cannot starve the others. A user never
+runs more than `user_slots` detections at once.
+
+The queue and the process slots live in the web process, so they only order
+requests that one process handles concurrently. The Procfile therefore runs
+gunicorn with threaded (gthread) workers: with the default sync workers each
+process serves one request at a time, waiting requests sit in gunicorn's
+listen backlog where neither priority nor fairness applies, and only the
+host slots bound concurrency. Host slots are not fair-queued either; a
+process that has admitted a request polls for one, so across processes they
+are first-come-first-served at HOST_POLL_INTERVAL granularity.
+"""
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a detection cannot be admitted"""
+
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _HostSlots:
+    """Cross-process slots backed by flock'ed files, one file per slot"""
+
+    def __init__(self, count, slot_dir):
+        self.count = count
+        self.slot_dir = slot_dir
+        os.makedirs(slot_dir, exist_ok=True)
+
+    def try_acquire(self):
+        """Return an open, locked slot file or None if every slot is taken"""
+        for i in range(self.count):
+            fd = os.open(os.path.join(self.slot_dir, f"slot-{i}.lock"), os.O_CREAT | os.O_RDWR, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    def in_use(self):
+        """Number of slots currently held by any process on this host"""
+        used = 0
+        for i in range(self.count):
+            path = os.path.join(self.slot_dir, f"slot-{i}.lock")
+            if not os.path.exists(path):
+                continue
+            fd = os.open(path, os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            except OSError:
+                used += 1
+            finally:
+                os.close(fd)
+        return used
+
+    @staticmethod
+    def release(fd):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+# Priority classes, highest first: uploads a user is waiting on, then re-analysis
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+PRIORITY_CLASSES = (INTERACTIVE, BULK)
+
+
+class DetectionTicket:
+    """An admitted detection; release it (or use it as a context manager) when done"""
+
+    def __init__(self, governor, user, priority, host_fd, waited):
+        self.governor = governor
+        self.user = user
+        self.priority = priority
+        self.host_fd = host_fd
+        self.waited = waited
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.governor._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class _Waiter:
+    __slots__ = ('user', 'priority', 'cost', 'enqueued', 'event', 'granted')
+
+    def __init__(self, user, priority, cost):
+        self.user = user
+        self.priority = priority
+        self.cost = cost
+        self.enqueued = time.monotonic()
+        self.event = threading.Event()
+        self.granted = False
+
+
+class _FairQueue:
+    """Deficit round-robin over per-user FIFO queues for one priority class"""
+
+    def __init__(self, quantum):
+        # pop() tops deficits up by the quantum until a request fits, so it must be positive
+        self.quantum = max(1.0, float(quantum))
+        self.queues = OrderedDict()  # user -> deque of waiters, in round-robin order
+        self.deficits = {}
+        self.size = 0
+
+    def push(self, waiter):
+        self.queues.setdefault(waiter.user, deque()).append(waiter)
+        self.deficits.setdefault(waiter.user, 0.0)
+        self.size += 1
+
+    def remove(self, waiter):
+        queue = self.queues.get(waiter.user)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self.size -= 1
+        if not queue:
+            self._drop(waiter.user)
+
+    def _drop(self, user):
+        del self.queues[user]
+        del self.deficits[user]
+
+    def pop(self, eligible):
+        """Return the next waiter whose user passes `eligible(user)`, or None"""
+        if not any(eligible(user) for user in self.queues):
+            return None
+        while True:
+            user = next(iter(self.queues))
+            queue = self.queues[user]
+            if eligible(user) and queue[0].cost <= self.deficits[user]:
+                waiter = queue.popleft()
+                self.size -= 1
+                self.deficits[user] -= waiter.cost
+                if not queue:
+                    # Idle users do not bank credit
+                    self._drop(user)
+                return waiter
+            if eligible(user):
+                self.deficits[user] += self.quantum
+            self.queues.move_to_end(user)
+
+
+class DetectionGovernor:
+    """Bound concurrent detections per process, per user and per host"""
+
+    # Host slots are polled while waiting, this is the polling interval
+    HOST_POLL_INTERVAL = 0.1
+
+    def __init__(self, process_slots=1, host_slots=0, max_queue=4, queue_timeout=30.0, slot_dir=None,
+                 user_slots=1, quantum=30.0, default_cost=30.0):
+        self.process_slots = max(1, int(process_slots))
+        self.user_slots = max(1, int(user_slots))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = float(queue_timeout)
+        self.default_cost = float(default_cost)
+        self.host = None
+        if host_slots and fcntl is not None:
+            slot_dir = slot_dir or os.path.join(tempfile.gettempdir(), 'truevision-detection-slots')
+            self.host = _HostSlots(int(host_slots), slot_dir)
+        elif host_slots:
+            logger.warning("fcntl not available, cross-process detection slots are disabled")
+
+        self._lock = threading.Lock()
+        self._queues = {name: _FairQueue(float(quantum)) for name in PRIORITY_CLASSES}
+        self._active = 0
+        self._active_by_user = {}
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+        self._class_stats = {
+            name: {"admitted": 0, "rejected": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for name in PRIORITY_CLASSES
+        }
+        # Moving average of detection run time, used for Retry-After
+        self._avg_runtime = 30.0
+
+    def _waiting(self):
+        return sum(q.size for q in self._queues.values())
+
+    def _retry_after(self, queued):
+        # Time for the queue ahead of the caller to drain, rounded up to a second
+        return max(1, math.ceil(self._avg_runtime * (queued + 1) / self.process_slots))
+
+    def _eligible(self, user):
+        return self._active_by_user.get(user, 0) < self.user_slots
+
+    def _dispatch(self):
+        """Hand free process slots to waiters; call with the lock held"""
+        while self._active < self.process_slots:
+            for name in PRIORITY_CLASSES:
+                waiter = self._queues[name].pop(self._eligible)
+                if waiter is not None:
+                    break
+            else:
+                return
+            self._active += 1
+            self._active_by_user[waiter.user] = self._active_by_user.get(waiter.user, 0) + 1
+            waiter.granted = True
+            waiter.event.set()
+
+    def _reject(self, priority, counter, message, status_code, retry_after):
+        setattr(self, counter, getattr(self, counter) + 1)
+        self._class_stats[priority]["rejected"] += 1
+        raise AdmissionRejected(message, status_code, retry_after)
+
+    def acquire(self, user=None, priority=INTERACTIVE, cost=None, timeout=None):
+        """
+        Wait for a detection slot and return a DetectionTicket.
+        `user` identifies the fair-queuing flow, `priority` is one of
+        PRIORITY_CLASSES and `cost` the video length in seconds (defaults
+        to default_cost when unknown).
+        Raises AdmissionRejected when the queue is full or the wait times out.
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class {priority!r}")
+        timeout = self.queue_timeout if timeout is None else timeout
+        cost = self.default_cost if not cost or cost <= 0 else float(cost)
+        waiter = _Waiter(user, priority, cost)
+        deadline = waiter.enqueued + timeout
+
+        with self._lock:
+            waiting = self._waiting()
+            if waiting >= self.max_queue and (self._active >= self.process_slots or not self._eligible(user)):
+                logger.warning(f"Detection rejected, queue full ({waiting} waiting)")
+                self._reject(priority, '_rejected_queue_full',
+                             "Too many detections in progress, please retry later", 429,
+                             self._retry_after(waiting))
+            self._queues[priority].push(waiter)
+            self._dispatch()
+
+        if not waiter.event.wait(max(0.0, deadline - time.monotonic())):
+            with self._lock:
+                if not waiter.granted:
+                    self._queues[priority].remove(waiter)
+                    logger.warning(f"Detection rejected after waiting {timeout:.0f}s for a slot")
+                    self._reject(priority, '_rejected_timeout',
+                                 "Detection service is busy, please retry later", 503,
+                                 self._retry_after(self._waiting()))
+
+        host_fd = None
+        if self.host is not None:
+            # Holding a process slot, now wait for one of the host-wide slots
+            host_fd = self.host.try_acquire()
+            while host_fd is None:
+                if time.monotonic() >= deadline:
+                    with self._lock:
+                        self._release_slot(user)
+                        logger.warning("Detection rejected, no host-wide slot became free")
+                        self._reject(priority, '_rejected_timeout',
+                                     "Detection service is busy, please retry later", 503,
+                                     self._retry_after(self.host.count))
+                time.sleep(self.HOST_POLL_INTERVAL)
+                host_fd = self.host.try_acquire()
+
+        waited = time.monotonic() - waiter.enqueued
+        with self._lock:
+            stats = self._class_stats[priority]
+            stats["admitted"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+        return DetectionTicket(self, user, priority, host_fd, waited)
+
+    def _release_slot(self, user):
+        """Give back a process slot; call with the lock held"""
+        self._active -= 1
+        remaining = self._active_by_user.get(user, 1) - 1
+        if remaining > 0:
+            self._active_by_user[user] = remaining
+        else:
+            self._active_by_user.pop(user, None)
+        self._dispatch()
+
+    def _release(self, ticket):
+        if ticket.host_fd is not None:
+            _HostSlots.release(ticket.host_fd)
+        runtime = time.monotonic() - ticket.started
+        with self._lock:
+            self._avg_runtime = 0.8 * self._avg_runtime + 0.2 * runtime
+            self._release_slot(ticket.user)
+
+    def stats(self):
+        with self._lock:
+            classes = {}
+            admitted = 0
+            wait_total = 0.0
+            for name in PRIORITY_CLASSES:
+                cs = self._class_stats[name]
+                admitted += cs["admitted"]
+                wait_total += cs["wait_total"]
+                classes[name] = {
+                    "queue_depth": self._queues[name].size,
+                    "waiting_users": len(self._queues[name].queues),
+                    "admitted": cs["admitted"],
+                    "rejected": cs["rejected"],
+                    "avg_queue_wait": cs["wait_total"] / cs["admitted"] if cs["admitted"] else 0.0,
+                    "max_queue_wait": cs["wait_max"],
+                }
+            stats = {
+                "process_slots": self.process_slots,
+                "user_slots": self.user_slots,
+                "active": self._active,
+                "active_users": len(self._active_by_user),
+                "queue_depth": self._waiting(),
+                "max_queue": self.max_queue,
+                "admitted": admitted,
+                "rejected_queue_full": self._rejected_queue_full,
+                "rejected_timeout": self._rejected_timeout,
+                "avg_queue_wait": wait_total / admitted if admitted else 0.0,
+                "avg_detection_time": self._avg_runtime,
+                "classes": classes,
+            }
+        if self.host is not None:
+            stats["host_slots"] = self.host.count
+            stats["host_slots_in_use"] = self.host.in_use()
+        return stats
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_detection_governor():
+    """Process-wide governor configured from the DETECTION_* settings"""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            from django.conf import settings
+            _governor = DetectionGovernor(
+                process_slots=getattr(settings, 'DETECTION_PROCESS_SLOTS', 1),
+                host_slots=getattr(settings, 'DETECTION_HOST_SLOTS', 2),
+                max_queue=getattr(settings, 'DETECTION_MAX_QUEUE', 4),
+                queue_timeout=getattr(settings, 'DETECTION_QUEUE_TIMEOUT', 30),
+                slot_dir=getattr(settings, 'DETECTION_SLOT_DIR', None) or None,
+                user_slots=getattr(settings, 'DETECTION_USER_SLOTS', 1),
+                quantum=getattr(settings, 'DETECTION_DRR_QUANTUM', 30),
+                default_cost=getattr(settings, 'DETECTION_DEFAULT_COST', 30),
+            )
+        return _governor
@@ -0,0 +1,147 @@
+"""
+Dynamic micro-batching for the deepfake classifier.
+
+Concurrent detect_deepfake calls in one process each produce a handful of
+face tensors per frame. MicroBatcher collects those requests and runs them
+through the model as one forward pass, flushing when max_batch_size items
+are queued or when the oldest request has waited max_wait seconds. Each
+caller gets a Future that resolves to the probabilities for its own items.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    __slots__ = ('items', 'future', 'submitted', 'key')
+
+    def __init__(self, items, future):
+        self.items = items
+        self.future = future
+        self.submitted = time.monotonic()
+        # Only tensors of the same shape can share a forward pass
+        self.key = getattr(items[0], 'shape', None)
+
+
+class MicroBatcher:
+    """
+    Batch calls to `fn(items) -> results` (one result per item) across threads.
+    A request larger than max_batch_size is run on its own rather than split.
+    """
+
+    def __init__(self, fn, max_batch_size=16, max_wait=0.01, name='micro-batcher'):
+        self.fn = fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self.name = name
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._requests = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._largest = 0
+
+    def submit(self, items):
+        """Queue `items` and return a Future for their results"""
+        future = Future()
+        items = list(items)
+        if not items:
+            future.set_result([])
+            return future
+        with self._cond:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+            self._pending.append(_Request(items, future))
+            self._cond.notify()
+        return future
+
+    def __call__(self, items):
+        return self.submit(items).result()
+
+    def _queued_items(self, key):
+        return sum(len(r.items) for r in self._pending if r.key == key)
+
+    def _take_batch(self):
+        """Pop the oldest request plus compatible requests that still fit"""
+        first = self._pending.popleft()
+        batch, size = [first], len(first.items)
+        for req in list(self._pending):
+            if size >= self.max_batch_size:
+                break
+            if req.key == first.key and size + len(req.items) <= self.max_batch_size:
+                self._pending.remove(req)
+                batch.append(req)
+                size += len(req.items)
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Wait for the batch to fill, but never past the oldest request's deadline
+                head = self._pending[0]
+                deadline = head.submitted + self.max_wait
+                while self._queued_items(head.key) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            self._execute(batch)
+
+    def _execute(self, batch):
+        started = time.monotonic()
+        items = [item for req in batch for item in req.items]
+        self._record(batch, len(items), started)
+        try:
+            results = list(self.fn(items))
+            if len(results) != len(items):
+                raise RuntimeError(f"Batch function returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            logger.error(f"{self.name}: batch of {len(items)} failed: {e}")
+            for req in batch:
+                req.future.set_exception(e)
+            return
+        offset = 0
+        for req in batch:
+            n = len(req.items)
+            req.future.set_result(results[offset:offset + n])
+            offset += n
+
+    def _record(self, batch, size, started):
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._requests += len(batch)
+            self._largest = max(self._largest, size)
+            for req in batch:
+                wait = started - req.submitted
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+
+    def stats(self):
+        """Batch fill rate and queueing latency added by batching"""
+        with self._stats_lock:
+            batches, items, requests = self._batches, self._items, self._requests
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": batches,
+                "requests": requests,
+                "items": items,
+                "largest_batch": self._largest,
+                "avg_batch_size": items / batches if batches else 0.0,
+                "fill_rate": items / (batches * self.max_batch_size) if batches else 0.0,
+                "avg_queue_ms": self._wait_total / requests * 1000 if requests else 0.0,
+                "max_queue_ms": self._wait_max * 1000,
+            }
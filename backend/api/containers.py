@@ -0,0 +1,443 @@
+"""
+Incremental container header parsing for uploaded videos.
+
+ContainerProbe is fed the bytes of a video as they arrive and picks the
+duration, resolution, frame rate, codec and frame count out of the
+container header without decoding anything: the `moov` box (mvhd, tkhd, mdhd, stts) for MP4/MOV and
+the EBML Info and Tracks elements for WebM/Matroska. Media data is skipped,
+only header elements are buffered, up to MAX_HEADER_BYTES.
+
+When the header cannot be parsed (another container, a header that is too
+large, a WebM recording without a Duration) details() returns None and
+callers fall back to ffprobe (see api.metadata).
+"""
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+# Largest header (MP4 moov box, WebM bytes before the first Cluster) buffered while probing
+MAX_HEADER_BYTES = 4 * 1024 * 1024
+
+# Top-level ISO BMFF boxes a file may start with
+MP4_LEADING_BOXES = {b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pdin', b'styp', b'uuid'}
+
+# Sample entry / CodecID to the codec names ffprobe reports
+MP4_CODECS = {
+    b'avc1': 'h264', b'avc3': 'h264', b'hvc1': 'hevc', b'hev1': 'hevc',
+    b'mp4v': 'mpeg4', b'vp09': 'vp9', b'av01': 'av1', b'mjpa': 'mjpeg', b'jpeg': 'mjpeg',
+}
+MATROSKA_CODECS = {
+    'V_VP8': 'vp8', 'V_VP9': 'vp9', 'V_AV1': 'av1', 'V_MPEG4/ISO/AVC': 'h264',
+    'V_MPEGH/ISO/HEVC': 'hevc', 'V_MPEG4/ISO/ASP': 'mpeg4', 'V_MJPEG': 'mjpeg',
+}
+
+EBML_MAGIC = b'\x1a\x45\xdf\xa3'
+
+# Matroska element IDs (marker bits included)
+EBML_SEGMENT = 0x18538067
+EBML_CLUSTER = 0x1F43B675
+EBML_INFO = 0x1549A966
+EBML_TIMECODE_SCALE = 0x2AD7B1
+EBML_DURATION = 0x4489
+EBML_TRACKS = 0x1654AE6B
+EBML_TRACK_ENTRY = 0xAE
+EBML_TRACK_TYPE = 0x83
+EBML_DEFAULT_DURATION = 0x23E383
+EBML_CODEC_ID = 0x86
+EBML_VIDEO = 0xE0
+EBML_PIXEL_WIDTH = 0xB0
+EBML_PIXEL_HEIGHT = 0xBA
+
+
+class ContainerProbe:
+    """
+    Feed a video's bytes in order with feed(); `done` turns true once the
+    header has been parsed (or given up on) and further bytes can be skipped.
+    After that `format`, `duration` (seconds), `width`, `height`, `fps`,
+    `codec` and `frame_count` hold whatever the header provided.
+    
+    feed_at() accepts a later part of the file when the bytes in between are
+    not available, e.g. the tail of an MP4 whose moov box follows mdat.
+    """
+
+    def __init__(self, max_header_bytes=MAX_HEADER_BYTES):
+        self.max_header_bytes = max_header_bytes
+        self.format = None
+        self.duration = None
+        self.width = None
+        self.height = None
+        self.fps = None
+        self.codec = None
+        self.frame_count = None
+        self.done = False
+        # File offset of the next byte to be fed
+        self.position = 0
+        self._parser = None
+        self._head = b''
+
+    def feed(self, data):
+        if self.done or not data:
+            return
+        self.position += len(data)
+        if self._parser is None:
+            # Wait for enough bytes to tell the container apart
+            self._head += bytes(data)
+            if len(self._head) < 8:
+                return
+            data, self._head = self._head, b''
+            if data[4:8] in MP4_LEADING_BOXES:
+                self.format = 'mp4'
+                self._parser = _Mp4Parser(self)
+            elif data[:4] == EBML_MAGIC:
+                self.format = 'webm'
+                self._parser = _EbmlParser(self)
+            else:
+                logger.debug("Unknown container, not probing the upload")
+                self.done = True
+                return
+        try:
+            self._parser.feed(data)
+        except (struct.error, ValueError, IndexError) as e:
+            logger.debug(f"Could not parse {self.format} header: {e}")
+            self.done = True
+
+    def feed_at(self, data, offset):
+        """
+        Feed `data` that starts at file `offset`. Bytes before the current
+        position are ignored; a gap is only bridged when the parser would skip
+        it anyway (MP4 media data). Returns False if the gap cannot be bridged.
+        """
+        if self.done:
+            return True
+        if offset <= self.position:
+            self.feed(data[self.position - offset:])
+            return True
+        resume = self._parser.resume_offset(self.position) if self._parser is not None else None
+        if resume is None or not offset <= resume < offset + len(data):
+            return False
+        self._parser.skip = 0
+        self.position = resume
+        self.feed(data[resume - offset:])
+        return True
+
+    def next_offset(self):
+        """File offset of the next byte worth feeding, past any media data being skipped"""
+        resume = self._parser.resume_offset(self.position) if self._parser is not None else None
+        return resume if resume is not None else self.position
+
+    def details(self):
+        """Full-precision metadata, or None unless duration, resolution and frame rate are all known"""
+        if not self.duration or not self.width or not self.height or not self.fps:
+            return None
+        frame_count = self.frame_count
+        if frame_count is None:
+            frame_count = int(round(self.duration * self.fps))
+        return {
+            'format': self.format,
+            'duration': self.duration,
+            'width': self.width,
+            'height': self.height,
+            'fps': self.fps,
+            'codec': self.codec,
+            'frame_count': frame_count
+        }
+
+
+def _boxes(data, start, end):
+    """Yield (type, body_start, body_end) for the ISO BMFF boxes in data[start:end]"""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise ValueError(f"bad {box_type!r} box size {size}")
+        yield box_type, pos + header, pos + size
+        pos += size
+
+
+def _find_box(data, start, end, box_type):
+    for child_type, body_start, body_end in _boxes(data, start, end):
+        if child_type == box_type:
+            return body_start, body_end
+    return None
+
+
+class _Mp4Parser:
+    """Skip top-level boxes as they stream past and parse `moov` once it is complete"""
+
+    def __init__(self, probe):
+        self.probe = probe
+        self.header = b''
+        self.skip = 0
+        self.moov = None
+        self.moov_size = 0
+
+    def resume_offset(self, position):
+        """File offset where parsing can continue after the box being skipped"""
+        return position + self.skip if self.skip else None
+
+    def feed(self, data):
+        view = memoryview(data)
+        pos = 0
+        while pos < len(view) and not self.probe.done:
+            if self.skip:
+                n = min(self.skip, len(view) - pos)
+                self.skip -= n
+                pos += n
+            elif self.moov is not None:
+                chunk = view[pos:pos + self.moov_size - len(self.moov)]
+                self.moov += chunk
+                pos += len(chunk)
+                if len(self.moov) == self.moov_size:
+                    self._parse_moov(bytes(self.moov))
+                    self.probe.done = True
+            else:
+                pos = self._read_header(view, pos)
+
+    def _read_header(self, view, pos):
+        """Accumulate the next box header; returns the new position in view"""
+        need = 16 if len(self.header) >= 4 and self.header[:4] == b'\x00\x00\x00\x01' else 8
+        chunk = bytes(view[pos:pos + need - len(self.header)])
+        self.header += chunk
+        pos += len(chunk)
+        if len(self.header) < need:
+            return pos
+        size, box_type = struct.unpack_from('>I4s', self.header)
+        if size == 1 and need == 8:
+            # 64-bit box size follows
+            return pos
+        if size == 1:
+            size = struct.unpack_from('>Q', self.header, 8)[0]
+        header_len = len(self.header)
+        self.header = b''
+
+        if size == 0:
+            # Box runs to the end of the file
+            if box_type == b'moov':
+                raise ValueError("moov box without a size")
+            self.probe.done = True
+            return pos
+        if size < header_len:
+            raise ValueError(f"bad {box_type!r} box size {size}")
+        if box_type == b'moov':
+            if size - header_len > self.probe.max_header_bytes:
+                logger.debug(f"moov box of {size} bytes is too large to probe")
+                self.probe.done = True
+                return pos
+            self.moov = bytearray()
+            self.moov_size = size - header_len
+        else:
+            self.skip = size - header_len
+        return pos
+
+    def _parse_moov(self, moov):
+        probe = self.probe
+        end = len(moov)
+
+        mvhd = _find_box(moov, 0, end, b'mvhd')
+        if mvhd:
+            start = mvhd[0]
+            if moov[start] == 1:
+                timescale, duration = struct.unpack_from('>IQ', moov, start + 20)
+            else:
+                timescale, duration = struct.unpack_from('>II', moov, start + 12)
+            if timescale and duration:
+                probe.duration = duration / timescale
+
+        for box_type, trak_start, trak_end in _boxes(moov, 0, end):
+            if box_type != b'trak':
+                continue
+            mdia = _find_box(moov, trak_start, trak_end, b'mdia')
+            if not mdia:
+                continue
+            hdlr = _find_box(moov, mdia[0], mdia[1], b'hdlr')
+            if not hdlr or moov[hdlr[0] + 8:hdlr[0] + 12] != b'vide':
+                continue
+
+            tkhd = _find_box(moov, trak_start, trak_end, b'tkhd')
+            if tkhd:
+                offset = tkhd[0] + (88 if moov[tkhd[0]] == 1 else 76)
+                width, height = struct.unpack_from('>II', moov, offset)
+                probe.width, probe.height = width >> 16, height >> 16
+
+            mdhd = _find_box(moov, mdia[0], mdia[1], b'mdhd')
+            if mdhd:
+                start = mdhd[0]
+                if moov[start] == 1:
+                    timescale, media_duration = struct.unpack_from('>IQ', moov, start + 20)
+                else:
+                    timescale, media_duration = struct.unpack_from('>II', moov, start + 12)
+                if not probe.duration and timescale and media_duration:
+                    probe.duration = media_duration / timescale
+
+                # Frame rate from the number of samples over the track duration
+                minf = _find_box(moov, mdia[0], mdia[1], b'minf')
+                stbl = minf and _find_box(moov, minf[0], minf[1], b'stbl')
+                stsd = stbl and _find_box(moov, stbl[0], stbl[1], b'stsd')
+                if stsd:
+                    # First sample entry: version/flags, entry count, then size and format
+                    fourcc = bytes(moov[stsd[0] + 12:stsd[0] + 16])
+                    probe.codec = MP4_CODECS.get(fourcc, fourcc.decode('latin-1').strip())
+                stts = stbl and _find_box(moov, stbl[0], stbl[1], b'stts')
+                if stts and timescale and media_duration:
+                    entries = struct.unpack_from('>I', moov, stts[0] + 4)[0]
+                    samples = sum(
+                        struct.unpack_from('>I', moov, stts[0] + 8 + i * 8)[0]
+                        for i in range(entries)
+                    )
+                    probe.frame_count = samples
+                    probe.fps = samples * timescale / media_duration
+            # First video track only
+            break
+
+
+def _read_vint(data, pos, keep_marker):
+    """EBML variable-length integer at data[pos]; returns (value, length) or None if incomplete"""
+    if pos >= len(data):
+        return None
+    first = data[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ValueError("invalid EBML vint")
+    if pos + length > len(data):
+        return None
+    value = first if keep_marker else first & (mask - 1)
+    for b in data[pos + 1:pos + length]:
+        value = (value << 8) | b
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        # All ones: unknown size
+        value = None
+    return value, length
+
+
+def _elements(data, start, end):
+    """Yield (id, body_start, size) for EBML elements in data[start:end]; size None if unknown"""
+    pos = start
+    while pos < end:
+        element_id = _read_vint(data, pos, keep_marker=True)
+        if element_id is None:
+            return
+        size = _read_vint(data, pos + element_id[1], keep_marker=False)
+        if size is None:
+            return
+        body_start = pos + element_id[1] + size[1]
+        yield element_id[0], body_start, size[0]
+        if size[0] is None:
+            return
+        pos = body_start + size[0]
+
+
+def _ebml_uint(data, start, size):
+    return int.from_bytes(data[start:start + size], 'big')
+
+
+class _EbmlParser:
+    """
+    Buffer the start of a WebM/Matroska file and read Info and Tracks once
+    they are complete. Both precede the first Cluster in practice.
+    """
+
+    def __init__(self, probe):
+        self.probe = probe
+        self.buffer = bytearray()
+
+    def resume_offset(self, position):
+        # Info and Tracks are at the start of the file, a tail does not help
+        return None
+
+    def feed(self, data):
+        self.buffer += data
+        if self._parse():
+            self.probe.done = True
+        elif len(self.buffer) > self.probe.max_header_bytes:
+            logger.debug("WebM header is too large to probe")
+            self.probe.done = True
+
+    def _parse(self):
+        """Try to parse the buffered bytes; True once nothing more is needed"""
+        data = self.buffer
+        top = _elements(data, 0, len(data))
+        header = next(top, None)
+        if header is None or header[2] is None:
+            return False
+        segment = next(top, None)
+        if segment is None:
+            return False
+        if segment[0] != EBML_SEGMENT:
+            raise ValueError("no Segment after the EBML header")
+
+        info = tracks = None
+        for element_id, body_start, size in _elements(data, segment[1], len(data)):
+            if element_id == EBML_CLUSTER or size is None:
+                break
+            if body_start + size > len(data):
+                return False
+            if element_id == EBML_INFO:
+                info = (body_start, size)
+            elif element_id == EBML_TRACKS:
+                tracks = (body_start, size)
+            if info and tracks:
+                break
+        else:
+            # Ran out of buffered elements before the first Cluster
+            return False
+
+        if info:
+            self._parse_info(data, *info)
+        if tracks:
+            self._parse_tracks(data, *tracks)
+        return True
+
+    def _parse_info(self, data, start, size):
+        timecode_scale = 1000000
+        duration = None
+        for element_id, body_start, body_size in _elements(data, start, start + size):
+            if element_id == EBML_TIMECODE_SCALE:
+                timecode_scale = _ebml_uint(data, body_start, body_size)
+            elif element_id == EBML_DURATION:
+                fmt = '>f' if body_size == 4 else '>d'
+                duration = struct.unpack_from(fmt, data, body_start)[0]
+        if duration:
+            self.probe.duration = duration * timecode_scale / 1e9
+
+    def _parse_tracks(self, data, start, size):
+        for element_id, entry_start, entry_size in _elements(data, start, start + size):
+            if element_id != EBML_TRACK_ENTRY:
+                continue
+            track_type = None
+            default_duration = None
+            codec_id = None
+            video = None
+            for child_id, body_start, body_size in _elements(data, entry_start, entry_start + entry_size):
+                if child_id == EBML_TRACK_TYPE:
+                    track_type = _ebml_uint(data, body_start, body_size)
+                elif child_id == EBML_DEFAULT_DURATION:
+                    default_duration = _ebml_uint(data, body_start, body_size)
+                elif child_id == EBML_CODEC_ID:
+                    codec_id = bytes(data[body_start:body_start + body_size]).decode('ascii', 'replace').rstrip('\x00')
+                elif child_id == EBML_VIDEO:
+                    video = (body_start, body_size)
+            if track_type != 1 or video is None:
+                continue
+            for child_id, body_start, body_size in _elements(data, video[0], video[0] + video[1]):
+                if child_id == EBML_PIXEL_WIDTH:
+                    self.probe.width = _ebml_uint(data, body_start, body_size)
+                elif child_id == EBML_PIXEL_HEIGHT:
+                    self.probe.height = _ebml_uint(data, body_start, body_size)
+            if codec_id:
+                self.probe.codec = MATROSKA_CODECS.get(codec_id, codec_id)
+            if default_duration:
+                # Nanoseconds per frame
+                self.probe.fps = 1e9 / default_duration
+            # First video track only
+            break
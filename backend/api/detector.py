@@ -1,11 +1,15 @@
 import logging
 import os
-import tempfile
 import time
 import json
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from django.conf import settings
 from .models import DeepFakeDetection, Detection
 from .utils import conf
+from .timeline import pack_timeline, TIMELINE_DTYPE
+from .batching import MicroBatcher
+from .spooling import spool_to_tempfile
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -112,14 +116,38 @@ except ImportError as e:
     cv2.dnn.readNetFromCaffe = cv2.dnn_readNetFromCaffe
     cv2.dnn.blobFromImage = cv2.dnn_blobFromImage
 
-# Try to import PyTorch with error handling
-try:
-    import torch
-    import torch.nn as nn
-    
-    # Try EfficientNet import
-    try:
-        from efficientnet_pytorch import EfficientNet
+# PyTorch and the classifier are imported on first use (see _load_torch), so
+# web workers that send inference to the server (api.inference) never load them
+torch = None
+EffNetLSTM = None
+TORCH_DEVICE = None
+# None until _load_torch() has run, then whether the deep learning model is usable
+HAS_DL_MODEL = None
+_torch_lock = threading.Lock()
+
+def _load_torch():
+    """Import PyTorch and define EffNetLSTM once per process; returns HAS_DL_MODEL"""
+    global torch, EffNetLSTM, TORCH_DEVICE, HAS_DL_MODEL
+    with _torch_lock:
+        if HAS_DL_MODEL is not None:
+            return HAS_DL_MODEL
+        # Try to import PyTorch with error handling
+        try:
+            import torch as _torch
+            import torch.nn as nn
+        except ImportError as e:
+            logger.warning(f"PyTorch not available: {e}")
+            HAS_DL_MODEL = False
+            return HAS_DL_MODEL
+        torch = _torch
+        
+        # Try EfficientNet import
+        try:
+            from efficientnet_pytorch import EfficientNet
+        except ImportError as e:
+            logger.warning(f"EfficientNet not available: {e}")
+            HAS_DL_MODEL = False
+            return HAS_DL_MODEL
         
         # Define the model class as provided by the user
         class EffNetLSTM(nn.Module):
@@ -148,58 +176,72 @@ try:
                 out = self.linear(self.dp(out))
 
                 return fmap, out
-                
+        
         # Set device for PyTorch
         TORCH_DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         logger.info(f"PyTorch using device: {TORCH_DEVICE}")
         
         # Flag indicating deep learning model is available
         HAS_DL_MODEL = True
+        return HAS_DL_MODEL
+
+
+def ssd_detections(frame, net, conf_thresh=0.5):
+    """
+    Run the SSD face detector on a frame and return an (N, 5) float32 array
+    of (confidence, x1, y1, x2, y2) rows with normalised coordinates for
+    detections at or above conf_thresh.
+    """
+    # Create blob from the frame
+    logger.debug("Creating blob from frame")
+    blob = cv2.dnn.blobFromImage(frame, 1.0, (300, 300), (104, 177, 123),
+                                 swapRB=False, crop=False)
+    net.setInput(blob)
+    
+    # Run the network
+    logger.debug("Running face detection network")
+    dets = net.forward()
+    logger.debug(f"Network returned {dets.shape[2]} potential detections")
+    
+    rows = np.asarray(dets[0, 0, :, 2:7], dtype=np.float32)
+    return rows[rows[:, 0] >= conf_thresh]
+
+def boxes_from_detections(rows, w, h, with_confidence=False):
+    """Convert normalised SSD rows from ssd_detections into pixel boxes"""
+    boxes = []
+    for row in rows:
+        conf = float(row[0])
         
-    except ImportError as e:
-        logger.warning(f"EfficientNet not available: {e}")
-        HAS_DL_MODEL = False
+        # Get box coordinates and convert to pixels
+        x1, y1, x2, y2 = (row[1:5] * np.array([w, h, w, h])).astype(int)
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        x2, y2 = min(w, int(x2)), min(h, int(y2))
         
-except ImportError as e:
-    logger.warning(f"PyTorch not available: {e}")
-    HAS_DL_MODEL = False
+        # Ensure the box has valid dimensions
+        if x2 <= x1 or y2 <= y1:
+            logger.debug(f"Skipping invalid box: ({x1}, {y1}, {x2}, {y2})")
+            continue
+            
+        logger.debug(f"Face detected with confidence {conf:.4f} at ({x1}, {y1}, {x2}, {y2})")
+        if with_confidence:
+            boxes.append(((x1, y1, x2, y2), conf))
+        else:
+            boxes.append((x1, y1, x2, y2))
+    return boxes
 
 # Function to detect face locations
-def detect_face_locations(frame, net, conf_thresh=0.5):
+def detect_face_locations(frame, net, conf_thresh=0.5, with_confidence=False):
+    """
+    Run the SSD face detector on a frame and return pixel boxes.
+    With with_confidence=True each entry is a (box, confidence) tuple.
+    """
     try:
         logger.debug("Starting face detection")
         h, w = frame.shape[:2]
         logger.debug(f"Frame dimensions: {w}x{h}")
         
-        # Create blob from the frame
-        logger.debug("Creating blob from frame")
-        blob = cv2.dnn.blobFromImage(frame, 1.0, (300, 300), (104, 177, 123),
-                                     swapRB=False, crop=False)
-        net.setInput(blob)
-        
-        # Run the network
-        logger.debug("Running face detection network")
-        dets = net.forward()
-        logger.debug(f"Network returned {dets.shape[2]} potential detections")
-        
-        boxes = []
-        for i in range(dets.shape[2]):
-            conf = float(dets[0, 0, i, 2])
-            if conf < conf_thresh:
-                continue
-                
-            # Get box coordinates and convert to pixels
-            x1, y1, x2, y2 = (dets[0, 0, i, 3:7] * np.array([w, h, w, h])).astype(int)
-            x1, y1 = max(0, x1), max(0, y1)
-            x2, y2 = min(w, x2), min(h, y2)
-            
-            # Ensure the box has valid dimensions
-            if x2 <= x1 or y2 <= y1:
-                logger.debug(f"Skipping invalid box: ({x1}, {y1}, {x2}, {y2})")
-                continue
-                
-            logger.debug(f"Face detected with confidence {conf:.4f} at ({x1}, {y1}, {x2}, {y2})")
-            boxes.append((x1, y1, x2, y2))
+        rows = ssd_detections(frame, net, conf_thresh)
+        boxes = boxes_from_detections(rows, w, h, with_confidence)
             
         logger.debug(f"Total valid faces detected: {len(boxes)}")
         return boxes
@@ -207,6 +249,346 @@ def detect_face_locations(frame, net, conf_thresh=0.5):
         logger.error(f"Error in face detection: {e}")
         return []
 
+def _box_iou(a, b):
+    """Intersection over union of two (x1, y1, x2, y2) boxes"""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+class FaceTracker:
+    """
+    Keep stable face tracks across sampled frames while running the SSD
+    detector only on keyframes.
+
+    The detector runs every `keyframe_interval` sampled frames. In between,
+    each track is propagated by template matching its keyframe crop inside a
+    search window around the previous box on a downscaled grayscale frame.
+    If any track's match score drops below `min_confidence` the frame is
+    promoted to a keyframe and the detector runs again.
+    
+    Track ids count up without limit, so every track keeps its own crop
+    budget and probability cache entries however many faces a video has;
+    only the timeline wraps them to fit its one-byte face field.
+    """
+    def __init__(self, detect, keyframe_interval=5, min_confidence=0.5,
+                 iou_threshold=0.3, search_margin=0.5, work_width=320):
+        self.detect = detect
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.min_confidence = min_confidence
+        self.iou_threshold = iou_threshold
+        self.search_margin = search_margin
+        self.work_width = work_width
+        self.tracks = []  # dicts: id, box, conf, template
+        self.next_id = 0
+        self.since_keyframe = None
+        self.detector_calls = 0
+        self.propagated_frames = 0
+        self.redetections = 0
+    
+    def _work_frame(self, frame):
+        """Downscaled grayscale copy of the frame used for matching"""
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.work_width / float(w))
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        return gray, scale
+    
+    def _template(self, gray, scale, box):
+        x1, y1, x2, y2 = [int(v * scale) for v in box]
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            return None
+        return gray[y1:y2, x1:x2].copy()
+    
+    def _keyframe(self, frame, gray, scale):
+        """Run the detector and match detections to existing tracks by IoU"""
+        self.detector_calls += 1
+        self.since_keyframe = 0
+        detections = self.detect(frame)
+        
+        unmatched = list(self.tracks)
+        tracks = []
+        for box, det_conf in detections:
+            best, best_iou = None, self.iou_threshold
+            for track in unmatched:
+                overlap = _box_iou(box, track['box'])
+                if overlap >= best_iou:
+                    best, best_iou = track, overlap
+            if best is not None:
+                unmatched.remove(best)
+                track_id = best['id']
+            else:
+                track_id = self.next_id
+                self.next_id += 1
+            tracks.append({
+                'id': track_id,
+                'box': box,
+                'conf': det_conf,
+                'template': self._template(gray, scale, box),
+            })
+        self.tracks = tracks
+        return tracks
+    
+    def _propagate(self, gray, scale, track):
+        """Shift a track's box to the best template match; None if lost"""
+        template = track['template']
+        if template is None:
+            return None
+        th, tw = template.shape[:2]
+        gh, gw = gray.shape[:2]
+        x1, y1, x2, y2 = [int(v * scale) for v in track['box']]
+        mx, my = int(tw * self.search_margin), int(th * self.search_margin)
+        sx1, sy1 = max(0, x1 - mx), max(0, y1 - my)
+        sx2, sy2 = min(gw, x2 + mx), min(gh, y2 + my)
+        window = gray[sy1:sy2, sx1:sx2]
+        if window.shape[0] < th or window.shape[1] < tw:
+            return None
+        scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, loc = cv2.minMaxLoc(scores)
+        if score < self.min_confidence:
+            return None
+        dx = (sx1 + loc[0] - x1) / scale
+        dy = (sy1 + loc[1] - y1) / scale
+        bx1, by1, bx2, by2 = track['box']
+        fh, fw = int(gh / scale), int(gw / scale)
+        box = (int(max(0, bx1 + dx)), int(max(0, by1 + dy)),
+               int(min(fw, bx2 + dx)), int(min(fh, by2 + dy)))
+        if box[2] <= box[0] or box[3] <= box[1]:
+            return None
+        return box
+    
+    def update(self, frame):
+        """Return [(track_id, box, confidence)] for the current sampled frame"""
+        try:
+            gray, scale = self._work_frame(frame)
+        except Exception as e:
+            logger.debug(f"Tracker could not prepare frame, falling back to detection: {e}")
+            self.detector_calls += 1
+            return [(idx, box, det_conf) for idx, (box, det_conf) in enumerate(self.detect(frame))]
+        
+        if self.since_keyframe is None or self.since_keyframe + 1 >= self.keyframe_interval:
+            tracks = self._keyframe(frame, gray, scale)
+        else:
+            self.since_keyframe += 1
+            propagated = []
+            for track in self.tracks:
+                try:
+                    box = self._propagate(gray, scale, track)
+                except Exception as e:
+                    logger.debug(f"Track {track['id']} propagation failed: {e}")
+                    box = None
+                if box is None:
+                    propagated = None
+                    break
+                propagated.append(dict(track, box=box))
+            if propagated is None:
+                # Tracking confidence dropped, re-anchor on a detector pass
+                self.redetections += 1
+                tracks = self._keyframe(frame, gray, scale)
+            else:
+                self.propagated_frames += 1
+                self.tracks = propagated
+                tracks = propagated
+        return [(t['id'], t['box'], t['conf']) for t in tracks]
+    
+    def stats(self):
+        return {
+            "detector_calls": self.detector_calls,
+            "propagated_frames": self.propagated_frames,
+            "redetections": self.redetections,
+            "tracks": self.next_id,
+            "keyframe_interval": self.keyframe_interval,
+        }
+
+def score_face_crop(frame, box, det_conf):
+    """
+    Cheap informativeness score for a face crop in [0, 1], combining SSD
+    confidence, box size and Laplacian sharpness. Returns (score, parts).
+    """
+    x1, y1, x2, y2 = box
+    side = min(x2 - x1, y2 - y1)
+    area_score = min(1.0, side / 224.0)
+    sharpness = 0.0
+    try:
+        crop = frame[y1:y2, x1:x2]
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        if max(gray.shape[:2]) > 64:
+            gray = cv2.resize(gray, (64, 64), interpolation=cv2.INTER_AREA)
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    except Exception as e:
+        logger.debug(f"Could not compute crop sharpness: {e}")
+    sharp_score = min(1.0, sharpness / 300.0)
+    score = 0.4 * det_conf + 0.3 * area_score + 0.3 * sharp_score
+    return score, {"side": side, "sharpness": sharpness, "confidence": det_conf}
+
+class CropSelector:
+    """
+    Bound the number of face crops sent to the classifier.
+    Per sampled frame only the top `max_faces_per_frame` crops by
+    score_face_crop are kept, each track contributes at most
+    `max_crops_per_track` crops and at most `max_crops_total` crops are
+    classified for the whole video. Crops smaller than `min_face_size`
+    pixels on their short side are dropped.
+    
+    When the number of sampled frames is known (`expected_samples`) both
+    budgets are spread over the video instead of being spent on its first
+    seconds: a track's picks are spaced expected_samples / max_crops_per_track
+    samples apart from its first appearance, and by sample n at most
+    max_crops_total * (n + 1) / expected_samples crops have been selected.
+    """
+    def __init__(self, max_faces_per_frame=4, max_crops_per_track=24,
+                 max_crops_total=200, min_face_size=40, expected_samples=None):
+        self.max_faces_per_frame = max_faces_per_frame
+        self.max_crops_per_track = max_crops_per_track
+        self.max_crops_total = max_crops_total
+        self.min_face_size = min_face_size
+        self.expected_samples = expected_samples
+        self.track_stride = (
+            max(1.0, expected_samples / max_crops_per_track)
+            if expected_samples and max_crops_per_track > 0 else 1.0
+        )
+        self.per_track = {}
+        self.first_sample = {}
+        self.selected = 0
+        self.skipped = 0
+    
+    def _track_due(self, track_id, sample_no):
+        """Whether the track has budget left and its next evenly spaced pick is due"""
+        count = self.per_track.get(track_id, 0)
+        if count >= self.max_crops_per_track:
+            return False
+        first = self.first_sample.setdefault(track_id, sample_no)
+        return sample_no - first >= count * self.track_stride
+    
+    def _total_allowance(self, sample_no):
+        if not self.expected_samples:
+            return self.max_crops_total
+        paced = -(-self.max_crops_total * (sample_no + 1) // self.expected_samples)
+        return min(self.max_crops_total, paced)
+    
+    def select(self, frame, faces, sample_no=0):
+        """
+        Filter [(track_id, box, conf)] of sampled frame `sample_no` down to
+        the crops worth classifying
+        """
+        candidates = []
+        for track_id, box, det_conf in faces:
+            if min(box[2] - box[0], box[3] - box[1]) < self.min_face_size:
+                continue
+            if not self._track_due(track_id, sample_no):
+                continue
+            score, _ = score_face_crop(frame, box, det_conf)
+            candidates.append((score, track_id, box, det_conf))
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        budget = max(0, min(self.max_faces_per_frame, self._total_allowance(sample_no) - self.selected))
+        chosen = candidates[:budget]
+        for _, track_id, _, _ in chosen:
+            self.per_track[track_id] = self.per_track.get(track_id, 0) + 1
+        self.selected += len(chosen)
+        self.skipped += len(faces) - len(chosen)
+        return [(track_id, box, det_conf) for _, track_id, box, det_conf in chosen]
+    
+    def policy(self):
+        return {
+            "max_faces_per_frame": self.max_faces_per_frame,
+            "max_crops_per_track": self.max_crops_per_track,
+            "max_crops_total": self.max_crops_total,
+            "min_face_size": self.min_face_size,
+            "expected_samples": self.expected_samples,
+            "track_stride": round(self.track_stride, 2),
+            "score": "0.4*ssd_conf + 0.3*min(1, side/224) + 0.3*min(1, laplacian_var/300)",
+            "selected": self.selected,
+            "skipped": self.skipped,
+        }
+
+class FrameRing:
+    """
+    Small ring of reusable frame buffers for the decode loop. read() decodes
+    into the next buffer through OpenCV's read(image) out-parameter instead
+    of allocating a new array per frame; skip() moves past a frame that is
+    not analysed without retrieving it at all.
+    
+    A frame returned by read() belongs to the caller only until `size` more
+    frames are read, after which its buffer is overwritten. Stages that keep
+    image data across frames (tracker templates, model inputs) copy it.
+    """
+    def __init__(self, size=2):
+        self.size = max(1, int(size))
+        self.buffers = [None] * self.size
+        self.index = 0
+        self.allocations = 0
+        self.reuses = 0
+        self.skipped = 0
+    
+    def read(self, cap):
+        buf = self.buffers[self.index]
+        ret, frame = cap.read() if buf is None else cap.read(image=buf)
+        if not ret:
+            return False, None
+        if frame is buf:
+            self.reuses += 1
+        else:
+            # First use of this slot, or OpenCV had to reallocate (frame size changed)
+            self.buffers[self.index] = frame
+            self.allocations += 1
+        self.index = (self.index + 1) % self.size
+        return True, frame
+    
+    def skip(self, cap):
+        ret = cap.grab()
+        if ret:
+            self.skipped += 1
+        return ret
+    
+    def stats(self):
+        return {
+            "buffers": self.size,
+            "allocations": self.allocations,
+            "reuses": self.reuses,
+            "skipped_frames": self.skipped,
+        }
+
+def dhash(image, hash_size=8):
+    """Difference hash of a BGR or grayscale image, hash_size**2 bits (64 by default)"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+class CropProbabilityCache:
+    """
+    Remember the probability of recently classified crops by dHash so that
+    near-duplicate crops (hamming distance <= threshold) reuse it instead of
+    running the classifier again. Holds at most `capacity` entries.
+    """
+    def __init__(self, threshold=3, capacity=64):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.entries = []  # (track_id, hash, prob), most recent last
+        self.hits = 0
+    
+    def lookup(self, track_id, crop_hash):
+        for entry_track, entry_hash, prob in reversed(self.entries):
+            if entry_track == track_id and hamming(entry_hash, crop_hash) <= self.threshold:
+                self.hits += 1
+                return prob
+        return None
+    
+    def add(self, track_id, crop_hash, prob):
+        self.entries.append((track_id, crop_hash, prob))
+        if len(self.entries) > self.capacity:
+            self.entries.pop(0)
+
 # Function to preprocess face for the model
 def preprocess_face(frame, box, size=(224, 224)):
     """
@@ -375,89 +757,152 @@ def _download_models_if_needed():
         # Return dummy paths for fallback mode
         return "dummy.prototxt", "dummy.caffemodel"
         
-def detect_deepfake(video_obj):
+def _load_face_net():
+    """Load the SSD face detector (CPU only)"""
+    # Download models if needed and get paths
+    prototxt_path, model_path = _download_models_if_needed()
+    
+    logger.info(f"Loading face detection model from: {prototxt_path}, {model_path}")
+    face_net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
+    face_net.setPreferableBackend(cv2.dnn.DNN_BACKEND_DEFAULT)
+    face_net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    logger.info("Face detection model loaded successfully")
+    return face_net
+
+def _load_deepfake_model():
+    """Load the EfficientNet-B1 + LSTM deepfake classifier"""
+    if not _load_torch():
+        logger.error("Deep learning model dependencies not available")
+        raise Exception("Deep learning model dependencies not available")
+    
+    try:
+        # Path for the model file in models directory
+        model_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
+                               'models', 'EfficientNet-b1_model.dat')
+        
+        logger.info(f"Checking for EfficientNet model at: {model_path}")
+        # Check if the model file exists
+        if os.path.exists(model_path):
+            logger.info("EfficientNet model file found, loading model...")
+            # Initialize the model
+            deepfake_model = EffNetLSTM(2).to(TORCH_DEVICE)
+            # Load the state dictionary
+            state_dict = torch.load(model_path, map_location=TORCH_DEVICE)
+            deepfake_model.load_state_dict(state_dict)
+            deepfake_model.eval()
+            logger.info("Successfully loaded deepfake detection model")
+            return deepfake_model
+        else:
+            logger.error(f"Deepfake model file not found at {model_path}")
+            raise Exception("Deepfake detection model not found")
+    except Exception as e:
+        logger.error(f"Error loading deepfake detection model: {e}")
+        raise Exception(f"Failed to load deepfake detection model: {e}")
+
+def _classify_faces(deepfake_model, face_tensors):
     """
-    Process a video and detect deepfakes
-    Returns the Detection object and detection results
+    Return the deepfake probability for each preprocessed CHW face.
+    Faces are independent clips of length 1, so they share one forward pass.
     """
-    logger.info(f"Starting deepfake detection for video ID: {video_obj.Video_id}")
-    temp_file_path = None
-    cap = None
+    if len(face_tensors) == 0:
+        return []
+    # Convert to a PyTorch tensor of shape (N, 1, C, H, W)
+    batch = np.ascontiguousarray(np.stack(face_tensors), dtype=np.float32)
+    inp = torch.from_numpy(batch).unsqueeze(1).to(TORCH_DEVICE)
     
-    # Create a Detection object
-    detection = Detection.objects.create(
-        Video_id=video_obj
-    )
+    # Run inference
+    with torch.no_grad():
+        fmap, logits = deepfake_model(inp)
+    
+    # Get the probabilities
+    return torch.softmax(logits, dim=1)[:, 1].tolist()  # deepfake probability
+
+# Process-wide classifier shared by concurrent detections (see api.batching)
+_classify_batcher = None
+_classify_batcher_lock = threading.Lock()
+
+def _get_classify_batcher():
+    """Load the deepfake model once per process behind a MicroBatcher"""
+    global _classify_batcher
+    with _classify_batcher_lock:
+        if _classify_batcher is None:
+            deepfake_model = _load_deepfake_model()
+            _classify_batcher = MicroBatcher(
+                lambda faces: _classify_faces(deepfake_model, faces),
+                max_batch_size=getattr(settings, 'DETECTOR_MICROBATCH_MAX_SIZE', 16),
+                max_wait=getattr(settings, 'DETECTOR_MICROBATCH_MAX_WAIT_MS', 10) / 1000,
+                name="deepfake-classifier"
+            )
+        return _classify_batcher
+
+class LocalInferenceBackend:
+    """
+    Run the face detector and the deepfake classifier in this process.
+    With a batcher, faces are classified together with those of other
+    detections running concurrently in this process.
+    """
+    name = "in-process"
+    
+    def __init__(self, face_net, deepfake_model, batcher=None):
+        self.face_net = face_net
+        self.deepfake_model = deepfake_model
+        self.batcher = batcher
+    
+    def detect_faces(self, frame, conf_thresh=0.6):
+        return detect_face_locations(frame, self.face_net, conf_thresh=conf_thresh, with_confidence=True)
     
+    def classify(self, face_tensors):
+        if self.batcher is not None:
+            return self.batcher(face_tensors)
+        return _classify_faces(self.deepfake_model, face_tensors)
+
+def _get_inference_backend():
+    """
+    Use the shared inference server when INFERENCE_SOCKET is configured and
+    reachable, otherwise load the models in this process.
+    """
+    socket_path = getattr(settings, 'INFERENCE_SOCKET', '')
+    if socket_path:
+        from .inference import get_inference_client
+        client = get_inference_client(socket_path)
+        if client.ping():
+            logger.info(f"Using inference server at {socket_path}")
+            return client
+        logger.warning(f"Inference server at {socket_path} is not reachable, loading models in-process")
+    if getattr(settings, 'DETECTOR_MICROBATCH', True):
+        return LocalInferenceBackend(_load_face_net(), None, batcher=_get_classify_batcher())
+    return LocalInferenceBackend(_load_face_net(), _load_deepfake_model())
+
+def _analyse_video(video_path, backend, sample_interval=3, max_frames=300,
+                   input_size=(224, 224), track_faces=False, keyframe_interval=5,
+                   on_progress=None, start_frame=0, end_frame=None,
+                   select_crops=False, max_crops_total=None, max_crops_per_track=None,
+                   hash_reuse=False):
+    """
+    Run one detection pass over a local video file using `backend` (see
+    LocalInferenceBackend) for face detection and classification.
+    Returns a dict with the frame/face counts, probability sum and max, the
+    per-face results used for the timeline, and the per-stage statistics.
+    on_progress(frames_read, frames_to_read, faces, prob_sum) is called
+    after every sampled frame.
+    
+    With start_frame/end_frame only that range (end exclusive) is analysed,
+    see _analyse_segmented; max_frames then does not apply. With
+    select_crops only the crops CropSelector picks are classified, within
+    budgets that default to the DETECTOR_MAX_CROPS_* settings; otherwise
+    every detected face is. With hash_reuse, near-duplicate frames reuse
+    the faces of the previous one and near-duplicate crops reuse their
+    probability (see dhash); otherwise every sampled frame and crop goes
+    through the models.
+    """
+    start_time = time.time()
+    
+    # Process the video
+    logger.info(f"Opening video file with OpenCV: {video_path}")
+    cap = cv2.VideoCapture(video_path)
     try:
-        # Download models if needed and get paths
-        prototxt_path, model_path = _download_models_if_needed()
-        
-        # Load the SSD face detector (CPU only)
-        logger.info(f"Loading face detection model from: {prototxt_path}, {model_path}")
-        face_net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
-        face_net.setPreferableBackend(cv2.dnn.DNN_BACKEND_DEFAULT)
-        face_net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
-        logger.info("Face detection model loaded successfully")
-        
-        # Try to load the deepfake detection model
-        deepfake_model = None
-        if HAS_DL_MODEL:
-            try:
-                # Path for the model file in models directory
-                model_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                       'models', 'EfficientNet-b1_model.dat')
-                
-                logger.info(f"Checking for EfficientNet model at: {model_path}")
-                # Check if the model file exists
-                if os.path.exists(model_path):
-                    logger.info("EfficientNet model file found, loading model...")
-                    # Initialize the model
-                    deepfake_model = EffNetLSTM(2).to(TORCH_DEVICE)
-                    # Load the state dictionary
-                    state_dict = torch.load(model_path, map_location=TORCH_DEVICE)
-                    deepfake_model.load_state_dict(state_dict)
-                    deepfake_model.eval()
-                    logger.info("Successfully loaded deepfake detection model")
-                else:
-                    logger.error(f"Deepfake model file not found at {model_path}")
-                    raise Exception("Deepfake detection model not found")
-            except Exception as e:
-                logger.error(f"Error loading deepfake detection model: {e}")
-                raise Exception(f"Failed to load deepfake detection model: {e}")
-        else:
-            logger.error("Deep learning model dependencies not available")
-            raise Exception("Deep learning model dependencies not available")
-        
-        # Create a temporary file for processing
-        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(video_obj.Video_File.name)[1], delete=False) as temp_file:
-            temp_file_path = temp_file.name
-            
-            # Save the video to the temporary file
-            logger.info(f"Processing video file: {video_obj.Video_File.name}")
-            chunk_count = 0
-            for chunk in video_obj.Video_File.chunks():
-                temp_file.write(chunk)
-                chunk_count += 1
-                # Clear the chunk from memory immediately
-                chunk = None
-                if chunk_count % 10 == 0:
-                    # Force garbage collection periodically during large file downloads
-                    import gc
-                    gc.collect()
-            
-            logger.info(f"Saved video to temporary file: {temp_file_path}")
-            
-            # Release the file handle to free up resources
-            temp_file.flush()
-        
-        start_time = time.time()
-        
-        # Process the video
-        logger.info(f"Opening video file with OpenCV: {temp_file_path}")
-        cap = cv2.VideoCapture(temp_file_path)
         if not cap.isOpened():
-            logger.error(f"Failed to open video file: {temp_file_path}")
+            logger.error(f"Failed to open video file: {video_path}")
             raise Exception("Failed to open video file")
             
         # Get video properties
@@ -466,52 +911,142 @@ def detect_deepfake(video_obj):
         fps = int(cap.get(cv2.CAP_PROP_FPS))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         logger.info(f"Video properties: {width}x{height} at {fps}fps, {total_frames} frames")
+        if end_frame is not None:
+            frames_to_read = max(1, end_frame - start_frame)
+        else:
+            frames_to_read = min(total_frames, max_frames + 1) if total_frames > 0 else max_frames + 1
         
-        all_probs = []
+        prob_sum = 0.0
+        max_prob = 0.0
         deepfake_counts = 0
         total_clips = 0
-        frame_no = 0
+        frame_no = start_frame
         results = []
+        if start_frame:
+            # Decoding resumes from the keyframe before start_frame
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        
+        logger.info(f"Starting frame analysis with sample interval: {sample_interval}, input size: {input_size}")
         
-        # Process video frames
-        sample_interval = 3  # Sample every 10th frame to speed up processing
+        # Face detector used on every sampled frame, or only on keyframes when tracking
+        def run_face_detector(image):
+            return backend.detect_faces(image, conf_thresh=0.6)
         
-        logger.info(f"Starting frame analysis with sample interval: {sample_interval}")
+        tracker = None
+        if track_faces:
+            tracker = FaceTracker(
+                run_face_detector,
+                keyframe_interval=keyframe_interval,
+                min_confidence=getattr(settings, 'DETECTOR_TRACK_MIN_CONFIDENCE', 0.5),
+            )
+            logger.info(f"Face tracking enabled with keyframe interval: {keyframe_interval}")
+        detector_calls = 0
+        
+        # Near-duplicate frames skip face detection and near-duplicate crops reuse probabilities
+        frame_hash_threshold = getattr(settings, 'DETECTOR_FRAME_HASH_THRESHOLD', 2)
+        crop_cache = None
+        if hash_reuse:
+            crop_cache = CropProbabilityCache(threshold=getattr(settings, 'DETECTOR_CROP_HASH_THRESHOLD', 3))
+        last_frame_hash = None
+        last_faces = []
+        frame_hash_hits = 0
+        
+        # Only the most informative crops go through EfficientNet
+        crop_selector = None
+        if select_crops:
+            crop_selector = CropSelector(
+                max_faces_per_frame=getattr(settings, 'DETECTOR_MAX_FACES_PER_FRAME', 4),
+                max_crops_per_track=max_crops_per_track or getattr(settings, 'DETECTOR_MAX_CROPS_PER_TRACK', 24),
+                max_crops_total=max_crops_total or getattr(settings, 'DETECTOR_MAX_CROPS_TOTAL', 200),
+                min_face_size=getattr(settings, 'DETECTOR_MIN_FACE_SIZE', 40),
+                expected_samples=-(-frames_to_read // sample_interval),
+            )
+        
+        # Sampled frames are decoded into reused buffers, the others are only grabbed
+        frame_ring = FrameRing(size=2)
         
         while True:
-            ret, frame = cap.read()
+            sampled = frame_no % sample_interval == 0
+            if sampled:
+                ret, frame = frame_ring.read(cap)
+            else:
+                ret = frame_ring.skip(cap)
             if not ret:
                 logger.info(f"End of video reached after {frame_no} frames")
                 break
                 
             # Process only at the sampling interval
-            if frame_no % sample_interval == 0:
+            if sampled:
                 logger.debug(f"Processing frame {frame_no}")
-                boxes = detect_face_locations(frame, face_net, conf_thresh=0.6)
+                frame_hash = None
+                if hash_reuse:
+                    try:
+                        frame_hash = dhash(frame)
+                    except Exception as e:
+                        logger.debug(f"Could not hash frame {frame_no}: {e}")
                 
-                if not boxes:
+                if (frame_hash is not None and last_frame_hash is not None
+                        and hamming(frame_hash, last_frame_hash) <= frame_hash_threshold):
+                    # Looks the same as the last processed frame, reuse its faces
+                    frame_hash_hits += 1
+                    faces = last_faces
+                else:
+                    if tracker is not None:
+                        faces = tracker.update(frame)
+                    else:
+                        detector_calls += 1
+                        faces = [(idx, box, det_conf) for idx, (box, det_conf) in enumerate(run_face_detector(frame))]
+                    last_frame_hash = frame_hash
+                    last_faces = faces
+                
+                if not faces:
                     logger.debug(f"Frame {frame_no}: No faces detected")
                     results.append((frame_no, 'no_face'))
                 else:
-                    logger.debug(f"Frame {frame_no}: Detected {len(boxes)} faces")
-                    for idx, box in enumerate(boxes):
-                        # Use the deep learning model for detection
-                        logger.debug(f"Frame {frame_no}, Face {idx}: Using deep learning model")
-                        # Preprocess the face for the model
-                        face_tensor = preprocess_face(frame, box)
-                        # Convert to PyTorch tensor
-                        inp = torch.from_numpy(face_tensor).unsqueeze(0).unsqueeze(1).to(TORCH_DEVICE)
-                        
-                        # Run inference
-                        with torch.no_grad():
-                            fmap, logits = deepfake_model(inp)
-                        
-                        # Get the probability
-                        prob = torch.softmax(logits, dim=1)[0, 1].item()  # deepfake probability
-                        logger.debug(f"Frame {frame_no}, Face {idx}: DL model result - probability: {prob:.4f}")
+                    logger.debug(f"Frame {frame_no}: Detected {len(faces)} faces")
+                    if crop_selector is not None:
+                        detected = faces
+                        faces = crop_selector.select(frame, faces, sample_no=(frame_no - start_frame) // sample_interval)
                         
+                        # Faces left out by the crop budget still get a timeline record, without a probability
+                        chosen_ids = {idx for idx, _box, _det_conf in faces}
+                        for idx, _box, _det_conf in detected:
+                            if idx not in chosen_ids:
+                                results.append((frame_no, idx, 'skipped', None))
+                    
+                    # Reuse probabilities of near-duplicate crops, classify the rest in one batch
+                    probs = []
+                    pending = []
+                    for idx, box, _det_conf in faces:
+                        x1, y1, x2, y2 = box
+                        crop_hash = None
+                        if crop_cache is not None:
+                            try:
+                                crop_hash = dhash(frame[y1:y2, x1:x2])
+                            except Exception as e:
+                                logger.debug(f"Could not hash crop for frame {frame_no}, face {idx}: {e}")
+                        prob = crop_cache.lookup(idx, crop_hash) if crop_hash is not None else None
+                        if prob is not None:
+                            logger.debug(f"Frame {frame_no}, Face {idx}: reusing probability of a near-duplicate crop")
+                        else:
+                            # Preprocess the face for the model
+                            pending.append((len(probs), idx, crop_hash, preprocess_face(frame, box, size=input_size)))
+                        probs.append(prob)
+                    
+                    if pending:
+                        # Use the deep learning model for detection
+                        logger.debug(f"Frame {frame_no}: classifying {len(pending)} faces with deep learning model")
+                        batch_probs = backend.classify([tensor for _, _, _, tensor in pending])
+                        for (slot, idx, crop_hash, _), prob in zip(pending, batch_probs):
+                            logger.debug(f"Frame {frame_no}, Face {idx}: DL model result - probability: {prob:.4f}")
+                            probs[slot] = prob
+                            if crop_hash is not None:
+                                crop_cache.add(idx, crop_hash, prob)
+                    
+                    for (idx, _box, _det_conf), prob in zip(faces, probs):
                         # Record results
-                        all_probs.append(prob)
+                        prob_sum += prob
+                        max_prob = max(max_prob, prob)
                         total_clips += 1
                         if prob > 0.5:
                             deepfake_counts += 1
@@ -520,14 +1055,12 @@ def detect_deepfake(video_obj):
                         results.append((frame_no, idx, label, prob))
                         logger.debug(f"Frame {frame_no}, Face {idx}: Final label: {label}")
                 
-                # Clear the frame from memory to reduce RAM usage
-                del frame
+                if on_progress is not None:
+                    on_progress(frame_no + 1 - start_frame, frames_to_read, total_clips, prob_sum)
                 
-                # Periodic garbage collection
+                # Frame buffers are reused, only the CUDA cache needs periodic trimming
                 if frame_no % 50 == 0:
-                    import gc
-                    gc.collect()
-                    if HAS_DL_MODEL and hasattr(torch, 'cuda') and torch.cuda.is_available():
+                    if torch is not None and torch.cuda.is_available():
                         try:
                             torch.cuda.empty_cache()
                         except:
@@ -535,27 +1068,451 @@ def detect_deepfake(video_obj):
             
             frame_no += 1
             
+            if end_frame is not None:
+                if frame_no >= end_frame:
+                    break
             # Early stopping for very long videos
-            if frame_no > 300:  # Limit to 300 frames (100 processed frames at interval 3)
+            elif frame_no > max_frames:  # Default 300 frames (100 processed frames at interval 3)
                 logger.info(f"Early stopping at frame {frame_no} to limit processing time")
                 break
-        
+    finally:
         # Release video capture resources immediately
-        if cap is not None:
-            cap.release()
-            cap = None
+        cap.release()
+        
+    frames_read = frame_no - start_frame
+    logger.info(f"Processed {frames_read} frames, found {total_clips} faces")
+    
+    if tracker is not None:
+        tracking_stats = tracker.stats()
+        detector_calls = tracking_stats["detector_calls"]
+        logger.info(f"Face tracking stats: {tracking_stats}")
+    else:
+        tracking_stats = None
+    
+    return {
+        "frames": frames_read,
+        "faces": total_clips,
+        "deepfake_counts": deepfake_counts,
+        "prob_sum": prob_sum,
+        "max_prob": max_prob,
+        "results": results,
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "total_frames": total_frames,
+        "elapsed": time.time() - start_time,
+        "sample_interval": sample_interval,
+        "input_size": list(input_size),
+        "tracked": tracker is not None,
+        "ssd_invocations": detector_calls,
+        "face_tracking": tracking_stats,
+        "crop_selection": crop_selector.policy() if crop_selector is not None else None,
+        "frame_ring": frame_ring.stats(),
+        "perceptual_hashing": {
+            "frame_hash_hits": frame_hash_hits,
+            "crop_hash_hits": crop_cache.hits,
+            "frame_threshold": frame_hash_threshold,
+            "crop_threshold": crop_cache.threshold
+        } if crop_cache is not None else None
+    }
+
+def _keyframe_indices(video_path, fps):
+    """Frame indices of the video's keyframes from ffprobe, or [] if unavailable"""
+    import subprocess
+    from .toolchain import get_tool
+    ffprobe = get_tool('ffprobe', detect=False)
+    if not ffprobe.available:
+        return []
+    cmd = [
+        ffprobe.path,
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-skip_frame', 'nokey',
+        '-show_entries', 'frame=best_effort_timestamp_time',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.info(f"ffprobe keyframe scan unavailable: {e}")
+        return []
+    if result.returncode != 0:
+        logger.info(f"ffprobe keyframe scan failed: {result.stderr.strip()}")
+        return []
+    indices = []
+    for line in result.stdout.splitlines():
+        try:
+            indices.append(int(round(float(line.strip().strip(',')) * fps)))
+        except ValueError:
+            continue
+    return sorted(set(indices))
+
+def plan_segments(video_path, frames_to_read, segments, fps, min_segment_frames=60):
+    """
+    Split [0, frames_to_read) into up to `segments` contiguous frame ranges.
+    Boundaries snap to the nearest keyframe when ffprobe can list them, so
+    each worker starts decoding on a keyframe; otherwise the split is even.
+    """
+    segments = max(1, min(segments, frames_to_read // max(1, min_segment_frames)))
+    if segments == 1:
+        return [(0, frames_to_read)]
+
+    targets = [frames_to_read * i // segments for i in range(1, segments)]
+    keyframes = [k for k in _keyframe_indices(video_path, fps) if 0 < k < frames_to_read]
+    if keyframes:
+        boundaries = sorted({min(keyframes, key=lambda k: abs(k - t)) for t in targets})
+    else:
+        boundaries = targets
+
+    edges = [0] + boundaries + [frames_to_read]
+    return [(start, end) for start, end in zip(edges, edges[1:]) if end > start]
+
+# Process pool for segmented analysis; each worker keeps its own decoder and backend
+_segment_pool = None
+_segment_pool_lock = threading.Lock()
+_worker_backend = None
+
+def _segment_worker_init():
+    """Set up Django in a spawned segment worker"""
+    import django
+    django.setup()
+
+def _analyse_segment(video_path, start_frame, end_frame, options):
+    """Analyse one frame range in a pool worker, loading the backend on first use"""
+    global _worker_backend
+    if _worker_backend is None:
+        _worker_backend = _get_inference_backend()
+    return _analyse_video(video_path, _worker_backend, start_frame=start_frame, end_frame=end_frame, **options)
+
+def _get_segment_pool(workers):
+    global _segment_pool
+    with _segment_pool_lock:
+        if _segment_pool is None:
+            import multiprocessing
+            # Spawn rather than fork: the web process may hold torch/OpenCV threads
+            _segment_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_segment_worker_init
+            )
+        return _segment_pool
+
+# Fields of the per-stage statistics that count work; the others are configuration
+_STAGE_COUNTERS = {
+    "face_tracking": ("detector_calls", "propagated_frames", "redetections", "tracks"),
+    "perceptual_hashing": ("frame_hash_hits", "crop_hash_hits"),
+    "frame_ring": ("allocations", "reuses", "skipped_frames"),
+    "crop_selection": ("expected_samples", "selected", "skipped"),
+}
+
+def _merge_counters(parts, counters):
+    """
+    Merge per-segment statistics dicts: the `counters` fields are summed,
+    everything else (configuration) is taken from the first segment
+    """
+    parts = [p for p in parts if p]
+    if not parts:
+        return None
+    merged = dict(parts[0])
+    for key in counters:
+        if key in merged and merged[key] is not None:
+            merged[key] = sum(p.get(key) or 0 for p in parts)
+    return merged
+
+def _merge_stats(parts):
+    """Combine per-segment _analyse_video results into one pass result"""
+    merged = dict(parts[0])
+    for key in ("frames", "faces", "deepfake_counts", "prob_sum", "ssd_invocations"):
+        merged[key] = sum(p[key] for p in parts)
+    merged["max_prob"] = max(p["max_prob"] for p in parts)
+    merged["results"] = [r for p in parts for r in p["results"]]
+    merged["elapsed"] = max(p["elapsed"] for p in parts)
+    for stage, counters in _STAGE_COUNTERS.items():
+        merged[stage] = _merge_counters([p[stage] for p in parts], counters)
+    # Each segment got a share of the budgets; report the budgets of the whole pass
+    crop_selection = merged["crop_selection"]
+    if crop_selection is not None:
+        crop_selection["max_crops_total"] = sum(p["crop_selection"]["max_crops_total"] for p in parts)
+        crop_selection["max_crops_per_track"] = getattr(settings, 'DETECTOR_MAX_CROPS_PER_TRACK', 24)
+    return merged
+
+def _split_budget(budget, shares):
+    """Split an integer budget in proportion to `shares` (largest remainders first), at least 1 each"""
+    parts = [int(budget * share) for share in shares]
+    by_remainder = sorted(range(len(shares)), key=lambda i: budget * shares[i] - parts[i], reverse=True)
+    for i in by_remainder[:budget - sum(parts)]:
+        parts[i] += 1
+    return [max(1, part) for part in parts]
+
+def _split_crop_budgets(ranges, frames_to_read):
+    """
+    Per-segment (max_crops_total, max_crops_per_track) in proportion to the
+    segment lengths, so that the segments together stay within the budgets
+    of a serial pass
+    """
+    shares = [(end - start) / frames_to_read for start, end in ranges]
+    return list(zip(
+        _split_budget(getattr(settings, 'DETECTOR_MAX_CROPS_TOTAL', 200), shares),
+        _split_budget(getattr(settings, 'DETECTOR_MAX_CROPS_PER_TRACK', 24), shares),
+    ))
+
+def _analyse_segmented(video_path, workers, on_progress=None, max_frames=300, **options):
+    """
+    Analyse a video as parallel frame ranges in the segment process pool and
+    merge the per-segment counts, probability sums and maxima. Only used when
+    DETECTOR_SEGMENTED is on (see _run_pass).
+    
+    Sampled frames keep their position in the video, so with face tracking,
+    hash reuse and crop selection off every frame is analysed exactly as in
+    a serial pass and the merged result is the same. Those three carry state
+    from frame to frame, and each segment starts its own: a face crossing a
+    boundary starts a new track, the first frame of a segment is never a
+    near-duplicate, and crop budgets are split between the segments in
+    proportion to their length. With any of them on, the verdict can differ
+    from a serial pass.
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    finally:
+        cap.release()
+    frames_to_read = min(total_frames, max_frames + 1) if total_frames > 0 else max_frames + 1
+
+    ranges = plan_segments(
+        video_path, frames_to_read, workers, fps,
+        min_segment_frames=getattr(settings, 'DETECTOR_SEGMENT_MIN_FRAMES', 60)
+    )
+    if options.get("select_crops"):
+        budgets = _split_crop_budgets(ranges, frames_to_read)
+    else:
+        budgets = [(None, None)] * len(ranges)
+    logger.info(f"Segmented analysis: {len(ranges)} segments {ranges} on {workers} workers, crop budgets {budgets}")
+
+    pool = _get_segment_pool(workers)
+    futures = {
+        pool.submit(_analyse_segment, video_path, start, end,
+                    dict(options, max_crops_total=total, max_crops_per_track=per_track)): i
+        for i, ((start, end), (total, per_track)) in enumerate(zip(ranges, budgets))
+    }
+
+    parts = [None] * len(ranges)
+    frames_done = faces = 0
+    prob_sum = 0.0
+    for future in as_completed(futures):
+        part = future.result()
+        parts[futures[future]] = part
+        frames_done += part["frames"]
+        faces += part["faces"]
+        prob_sum += part["prob_sum"]
+        if on_progress is not None:
+            on_progress(frames_done, frames_to_read, faces, prob_sum)
+
+    merged = _merge_stats(parts)
+    merged["segments"] = [{"start_frame": start, "end_frame": end} for start, end in ranges]
+    return merged
+
+def _segment_workers():
+    """
+    Size of the segment process pool: DETECTOR_SEGMENT_WORKERS, never more
+    than the number of CPUs. Every worker loads its own face detector and
+    classifier unless INFERENCE_SOCKET is set, so each one costs a full
+    model's memory on top of the web process's own copy.
+    """
+    workers = getattr(settings, 'DETECTOR_SEGMENT_WORKERS', 2)
+    return max(1, min(workers, os.cpu_count() or 1))
+
+def _run_pass(video_path, backend, **options):
+    """
+    One analysis pass over the video. Segment-parallel analysis is opt-in
+    (DETECTOR_SEGMENTED, off by default) and needs more than one worker;
+    otherwise the pass runs serially in this process.
+    """
+    if getattr(settings, 'DETECTOR_SEGMENTED', False):
+        workers = _segment_workers()
+        if workers > 1:
+            return _analyse_segmented(video_path, workers, **options)
+    return _analyse_video(video_path, backend, **options)
+
+def _summarise(stats):
+    """Return (avg_prob, max_prob, deepfake_pct) for an analysis pass"""
+    total_clips = stats["faces"]
+    if total_clips > 0:
+        avg_prob = stats["prob_sum"] / total_clips
+        max_prob = stats["max_prob"]
+        deepfake_pct = stats["deepfake_counts"] / total_clips * 100
+        logger.info(f"Detection stats: avg_prob={avg_prob:.2f}, max_prob={max_prob:.2f}, deepfake_pct={deepfake_pct:.2f}%")
+    else:
+        avg_prob = max_prob = deepfake_pct = 0.0
+        logger.warning("No faces detected in video, returning default values of 0")
+    return avg_prob, max_prob, deepfake_pct
+
+def _stage_summary(name, stats):
+    """Compact description of one cascade stage for the metadata"""
+    avg_prob, _, _ = _summarise(stats)
+    return {
+        "stage": name,
+        "input_size": stats["input_size"],
+        "sample_interval": stats["sample_interval"],
+        "processed_frames": stats["frames"],
+        "processed_faces": stats["faces"],
+        "avg_probability": avg_prob,
+        "time": stats["elapsed"],
+    }
+
+# Process-wide cascade counters, used to report the escalation rate
+_cascade_lock = threading.Lock()
+_cascade_counts = {"runs": 0, "escalated": 0}
+
+class DetectionCancelled(Exception):
+    """Raised by a detect_deepfake progress callback to abandon the detection"""
+
+class _ProgressReporter:
+    """Throttled progress events for detect_deepfake(progress=...)"""
+    
+    # Minimum seconds between two frame progress events
+    MIN_INTERVAL = 0.25
+    
+    def __init__(self, callback):
+        self.callback = callback
+        self._last = 0.0
+    
+    def stage(self, stage, progress, **extra):
+        """Emit an event; `progress` is the overall fraction done (0-1)"""
+        if self.callback is None:
+            return
+        try:
+            self.callback({"stage": stage, "progress": round(min(1.0, progress), 3), **extra})
+        except DetectionCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"Progress callback failed: {e}")
+    
+    def analysis(self, stage, start, end):
+        """Return an _analyse_video on_progress hook mapping the pass onto [start, end]"""
+        if self.callback is None:
+            return None
+        
+        def on_progress(frames, frames_to_read, faces, prob_sum):
+            now = time.monotonic()
+            if frames < frames_to_read and now - self._last < self.MIN_INTERVAL:
+                return
+            self._last = now
+            self.stage(
+                stage, start + (end - start) * min(1.0, frames / frames_to_read),
+                frames=frames,
+                total_frames=frames_to_read,
+                faces=faces,
+                running_probability=round(prob_sum / faces, 4) if faces else None,
+            )
+        return on_progress
+
+def detect_deepfake(video_obj, track_faces=None, keyframe_interval=None, cascade=None, progress=None):
+    """
+    Process a video and detect deepfakes
+    Returns the Detection object and detection results
+    
+    With track_faces the SSD detector only runs on keyframes (every
+    keyframe_interval sampled frames) and faces are propagated in between,
+    see FaceTracker. With cascade a cheap pass (reduced input resolution,
+    sparser sampling) runs first and the full pass only runs when its
+    average probability lands within DETECTOR_CASCADE_BAND of 0.5 or it
+    found no faces. Defaults come from the DETECTOR_* settings.
+    
+    `progress`, if given, is called with dicts describing the current stage
+    ("download", "analysis", or "quick"/"full" with cascade, then "saving"),
+    the overall fraction done and, during analysis, frames processed and
+    the running probability. It may raise DetectionCancelled to stop.
+    """
+    if track_faces is None:
+        track_faces = getattr(settings, 'DETECTOR_TRACK_FACES', False)
+    if keyframe_interval is None:
+        keyframe_interval = getattr(settings, 'DETECTOR_KEYFRAME_INTERVAL', 5)
+    if cascade is None:
+        cascade = getattr(settings, 'DETECTOR_CASCADE', False)
+    logger.info(f"Starting deepfake detection for video ID: {video_obj.Video_id}")
+    temp_file_path = None
+    spooled = None
+    backend = None
+    reporter = _ProgressReporter(progress)
+    
+    # Create a Detection object
+    detection = Detection.objects.create(
+        Video_id=video_obj
+    )
+    
+    try:
+        backend = _get_inference_backend()
+        reporter.stage("download", 0.0)
+        
+        # Make the video available locally, streaming it in fixed-size chunks
+        logger.info(f"Processing video file: {video_obj.Video_File.name}")
+        spooled = spool_to_tempfile(video_obj.Video_File)
+        temp_file_path = spooled.path
+        logger.info(f"Video available at {temp_file_path} ({spooled.size} bytes, sha256 {spooled.sha256})")
+        
+        reporter.stage("download", 0.05)
+        
+        start_time = time.time()
+        pass_options = {
+            "track_faces": track_faces,
+            "keyframe_interval": keyframe_interval,
+            "max_frames": getattr(settings, 'DETECTOR_MAX_FRAMES', 300),
+            "select_crops": getattr(settings, 'DETECTOR_SELECT_CROPS', False),
+            "hash_reuse": getattr(settings, 'DETECTOR_HASH_REUSE', False),
+        }
+        
+        cascade_info = None
+        if cascade:
+            # Cheap first pass: same model at reduced resolution on fewer frames
+            quick_size = getattr(settings, 'DETECTOR_CASCADE_INPUT_SIZE', 112)
+            band = getattr(settings, 'DETECTOR_CASCADE_BAND', 0.15)
+            quick = _run_pass(
+                temp_file_path, backend,
+                sample_interval=getattr(settings, 'DETECTOR_CASCADE_SAMPLE_INTERVAL', 9),
+                input_size=(quick_size, quick_size),
+                on_progress=reporter.analysis("quick", 0.05, 0.35),
+                **pass_options
+            )
+            quick_avg, _, _ = _summarise(quick)
+            escalate = quick["faces"] == 0 or abs(quick_avg - 0.5) < band
+            stages = [_stage_summary("quick", quick)]
+            
+            if escalate:
+                logger.info(f"Cascade: quick pass avg_prob={quick_avg:.3f} is uncertain, escalating to full pass")
+                stats = _run_pass(temp_file_path, backend,
+                                  on_progress=reporter.analysis("full", 0.35, 0.95),
+                                  **pass_options)
+                stages.append(_stage_summary("full", stats))
+            else:
+                logger.info(f"Cascade: quick pass avg_prob={quick_avg:.3f} is clear-cut, skipping full pass")
+                stats = quick
+            
+            with _cascade_lock:
+                _cascade_counts["runs"] += 1
+                if escalate:
+                    _cascade_counts["escalated"] += 1
+                escalation_rate = _cascade_counts["escalated"] / _cascade_counts["runs"]
             
-        logger.info(f"Processed {frame_no} frames, found {total_clips} faces")
+            cascade_info = {
+                "escalated": escalate,
+                "band": band,
+                "stages": stages,
+                "escalation_rate": escalation_rate,
+            }
+        else:
+            stats = _run_pass(temp_file_path, backend,
+                              on_progress=reporter.analysis("analysis", 0.05, 0.95),
+                              **pass_options)
+        
+        frame_no = stats["frames"]
+        total_clips = stats["faces"]
+        deepfake_counts = stats["deepfake_counts"]
+        results = stats["results"]
         
         # Calculate summaries
-        if total_clips > 0:
-            avg_prob = sum(all_probs) / total_clips
-            max_prob = max(all_probs) if all_probs else 0.0
-            deepfake_pct = deepfake_counts / total_clips * 100
-            logger.info(f"Detection stats: avg_prob={avg_prob:.2f}, max_prob={max_prob:.2f}, deepfake_pct={deepfake_pct:.2f}%")
-        else:
-            avg_prob = max_prob = deepfake_pct = 0.0
-            logger.warning("No faces detected in video, returning default values of 0")
+        avg_prob, max_prob, deepfake_pct = _summarise(stats)
             
         # Determine if the video is fake based on thresholds
         is_fake = avg_prob > 0.5
@@ -573,6 +1530,11 @@ def detect_deepfake(video_obj):
         elapsed_time = time.time() - start_time
         logger.info(f"Detection completed in {elapsed_time:.2f} seconds")
         
+        reporter.stage("saving", 0.95, running_probability=round(avg_prob, 4))
+        
+        # Pack the per-frame results so they can be served later without rerunning the model
+        timeline = pack_timeline(results)
+        
         # Compile metadata
         metadata = {
             "processed_frames": frame_no,
@@ -583,8 +1545,19 @@ def detect_deepfake(video_obj):
             "max_probability": max_prob,
             "detection_time": elapsed_time,
             "model_used": "EfficientNet-B1 + LSTM",
-            "video_dimensions": f"{width}x{height}",
-            "video_fps": fps
+            "inference_backend": backend.name,
+            "micro_batching": backend.batcher.stats() if getattr(backend, 'batcher', None) else None,
+            "video_dimensions": f"{stats['width']}x{stats['height']}",
+            "video_fps": stats["fps"],
+            "video_sha256": spooled.sha256,
+            "timeline_records": len(timeline) // TIMELINE_DTYPE.itemsize,
+            "ssd_invocations": stats["ssd_invocations"],
+            "face_tracking": stats["face_tracking"],
+            "crop_selection": stats["crop_selection"],
+            "perceptual_hashing": stats["perceptual_hashing"],
+            "frame_ring": stats["frame_ring"],
+            "segments": stats.get("segments"),
+            "cascade": cascade_info
         }
         
         # Save the detection result
@@ -592,7 +1565,9 @@ def detect_deepfake(video_obj):
             detection=detection,
             face_count=total_clips,
             frame_count=frame_no,
-            detection_time=elapsed_time
+            detection_time=elapsed_time,
+            detection_method='dnn_face_tracked' if stats["tracked"] else 'dnn_face',
+            timeline=timeline
         )
         
         # Update the video object
@@ -600,24 +1575,25 @@ def detect_deepfake(video_obj):
         video_obj.save()
         
         # Clear memory
-        all_probs = None
+        stats = None
         results = None
+        timeline = None
         
         # Explicitly clean up large objects
-        if face_net is not None:
-            face_net = None
-        
-        if deepfake_model is not None:
-            # Delete the model to free up CUDA memory
-            del deepfake_model
-            deepfake_model = None
+        if isinstance(backend, LocalInferenceBackend):
+            # Delete the models to free up CUDA memory
+            # (a shared batcher keeps its model for the next detection)
+            backend.face_net = None
+            backend.deepfake_model = None
+            backend.batcher = None
+        backend = None
         
         # Force Python garbage collection
         import gc
         gc.collect()
         
         # If we're using PyTorch, also clear CUDA cache if available
-        if HAS_DL_MODEL and hasattr(torch, 'cuda') and torch.cuda.is_available():
+        if torch is not None and torch.cuda.is_available():
             try:
                 torch.cuda.empty_cache()
                 logger.info("CUDA memory cache cleared")
@@ -633,30 +1609,16 @@ def detect_deepfake(video_obj):
         # Re-raise to let the calling code handle it
         raise 
     finally:
-        # Clean up resources in the finally block to ensure they're always released
-        if cap is not None:
-            try:
-                cap.release()
-                logger.info("Video capture resource released")
-            except Exception as e:
-                logger.warning(f"Error releasing video capture: {e}")
-        
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                logger.info(f"Removed temporary file: {temp_file_path}")
-            except Exception as e:
-                logger.warning(f"Failed to remove temporary file: {e}")
+        # Clean up the spooled copy (uploads already on disk are left alone)
+        if spooled is not None:
+            spooled.close()
+            logger.info(f"Released local video file: {temp_file_path}")
                 
         # Clear Python memory again
         import gc
         gc.collect()
-        if HAS_DL_MODEL and hasattr(torch, 'cuda') and torch.cuda.is_available():
+        if torch is not None and torch.cuda.is_available():
             try:
                 torch.cuda.empty_cache()
             except:
-                pass 
-
-
-
+                pass
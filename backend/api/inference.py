@@ -0,0 +1,268 @@
+"""
+Out-of-process inference server shared by all web workers on a host.
+
+The server (started with `python manage.py run_inference_server`) loads the
+SSD face detector and the EffNetLSTM classifier once and answers requests
+over a Unix socket. Web workers use InferenceClient, which exposes the same
+detect_faces/classify interface as detector.LocalInferenceBackend, so they
+never load torch or the model weights themselves.
+
+Wire format: every message is a 5-byte header (op: uint8, payload length:
+uint32, network order) followed by the payload.
+
+    OP_DETECT_FACES  request:  height, width (uint16), conf_thresh (float32)
+                               + height*width*3 BGR uint8 pixels
+                     response: N x 5 float32 rows (conf, x1, y1, x2, y2),
+                               coordinates normalised to [0, 1]
+    OP_CLASSIFY      request:  n, height, width (uint16)
+                               + n*3*height*width float16 CHW faces
+                     response: n float32 deepfake probabilities
+    OP_STATS         request:  empty
+                     response: UTF-8 JSON with server counters
+    OP_OK / OP_ERROR response status; OP_ERROR carries a UTF-8 message
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import numpy as np
+
+from .batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('!BI')
+DETECT_HEADER = struct.Struct('!HHf')
+CLASSIFY_HEADER = struct.Struct('!HHH')
+
+OP_OK = 0
+OP_DETECT_FACES = 1
+OP_CLASSIFY = 2
+OP_STATS = 3
+OP_ERROR = 255
+
+# The SSD resizes every frame to 300x300, so clients send it pre-resized
+SSD_INPUT_SIZE = 300
+
+
+class InferenceError(Exception):
+    """Raised by the client when the server reports an error"""
+
+
+def _recv_exactly(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("Inference socket closed")
+        received += n
+    return buf
+
+
+def send_message(sock, op, payload=b''):
+    """Send one framed message"""
+    sock.sendall(HEADER.pack(op, len(payload)))
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_message(sock):
+    """Receive one framed message, returns (op, payload)"""
+    op, size = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    payload = _recv_exactly(sock, size) if size else bytearray()
+    return op, payload
+
+
+class _InferenceRequestHandler(socketserver.BaseRequestHandler):
+    """Serve framed requests on one client connection until it closes"""
+
+    def handle(self):
+        while True:
+            try:
+                op, payload = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                reply = self.server.dispatch(op, payload)
+                send_message(self.request, OP_OK, reply)
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                logger.error(f"Inference request failed: {e}", exc_info=True)
+                try:
+                    send_message(self.request, OP_ERROR, str(e).encode('utf-8'))
+                except OSError:
+                    return
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server holding one copy of the face detector and classifier"""
+    daemon_threads = True
+
+    def __init__(self, socket_path, face_net, deepfake_model, max_batch_size=16, max_wait=0.01):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _InferenceRequestHandler)
+        os.chmod(socket_path, 0o660)
+        self.socket_path = socket_path
+        self.face_net = face_net
+        self.deepfake_model = deepfake_model
+        # cv2.dnn nets are not thread-safe; classification requests from all
+        # connections are merged into shared forward passes by the batcher
+        self._face_lock = threading.Lock()
+        self.batcher = MicroBatcher(
+            self._classify,
+            max_batch_size=max_batch_size, max_wait=max_wait, name="inference-classifier"
+        )
+        self._stats_lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {
+            "detect_requests": 0,
+            "classify_requests": 0,
+            "faces_classified": 0,
+            "errors": 0,
+        }
+
+    def _classify(self, faces):
+        from .detector import _classify_faces
+        return _classify_faces(self.deepfake_model, faces)
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.counters[key] += amount
+
+    def dispatch(self, op, payload):
+        from .detector import ssd_detections
+
+        try:
+            if op == OP_DETECT_FACES:
+                h, w, conf_thresh = DETECT_HEADER.unpack_from(payload)
+                frame = np.frombuffer(payload, dtype=np.uint8, offset=DETECT_HEADER.size).reshape(h, w, 3)
+                with self._face_lock:
+                    rows = ssd_detections(frame, self.face_net, conf_thresh)
+                self._count("detect_requests")
+                return np.ascontiguousarray(rows, dtype=np.float32).tobytes()
+
+            if op == OP_CLASSIFY:
+                n, h, w = CLASSIFY_HEADER.unpack_from(payload)
+                faces = np.frombuffer(payload, dtype=np.float16, offset=CLASSIFY_HEADER.size).reshape(n, 3, h, w)
+                probs = self.batcher(list(faces.astype(np.float32)))
+                self._count("classify_requests")
+                self._count("faces_classified", n)
+                return np.asarray(probs, dtype=np.float32).tobytes()
+
+            if op == OP_STATS:
+                return json.dumps(self.stats()).encode('utf-8')
+
+            raise ValueError(f"Unknown inference op {op}")
+        except Exception:
+            self._count("errors")
+            raise
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self.counters)
+        stats["uptime"] = time.time() - self.started_at
+        stats["micro_batching"] = self.batcher.stats()
+        return stats
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class InferenceClient:
+    """
+    Thin client for InferenceServer with the same interface as
+    detector.LocalInferenceBackend. Each thread keeps its own connection.
+    """
+    name = "inference-server"
+
+    def __init__(self, socket_path, timeout=120):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            finally:
+                self._local.sock = None
+
+    def _call(self, op, payload=b''):
+        # Retry once on a stale connection (e.g. the server was restarted)
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                send_message(sock, op, payload)
+                status, reply = recv_message(sock)
+                break
+            except (ConnectionError, OSError):
+                self.close()
+                if attempt == 1:
+                    raise
+        if status == OP_ERROR:
+            raise InferenceError(bytes(reply).decode('utf-8', errors='replace'))
+        return reply
+
+    def ping(self):
+        """Return True if the server answers"""
+        try:
+            self.stats()
+            return True
+        except Exception as e:
+            logger.debug(f"Inference server ping failed: {e}")
+            return False
+
+    def stats(self):
+        return json.loads(bytes(self._call(OP_STATS)).decode('utf-8'))
+
+    def detect_faces(self, frame, conf_thresh=0.6):
+        import cv2
+        from .detector import boxes_from_detections
+
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (SSD_INPUT_SIZE, SSD_INPUT_SIZE))
+        payload = DETECT_HEADER.pack(SSD_INPUT_SIZE, SSD_INPUT_SIZE, conf_thresh) + small.tobytes()
+        rows = np.frombuffer(self._call(OP_DETECT_FACES, payload), dtype=np.float32).reshape(-1, 5)
+        return boxes_from_detections(rows, w, h, with_confidence=True)
+
+    def classify(self, face_tensors):
+        if len(face_tensors) == 0:
+            return []
+        faces = np.ascontiguousarray(np.stack(face_tensors), dtype=np.float16)
+        n, _, h, w = faces.shape
+        payload = CLASSIFY_HEADER.pack(n, h, w) + faces.tobytes()
+        return np.frombuffer(self._call(OP_CLASSIFY, payload), dtype=np.float32).tolist()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_inference_client(socket_path):
+    """Process-wide client per socket path"""
+    with _clients_lock:
+        client = _clients.get(socket_path)
+        if client is None:
+            client = _clients[socket_path] = InferenceClient(socket_path)
+        return client
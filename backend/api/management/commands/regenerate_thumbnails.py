@@ -1,90 +1,260 @@
 from django.core.management.base import BaseCommand, CommandError
-from api.models import Video
-from django.db import transaction
+from django.db.models import Q
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import contextlib
+import io
+import json
+import multiprocessing
+import os
 import time
 
+# Default checkpoint file, in the working directory
+DEFAULT_CHECKPOINT = 'regenerate_thumbnails.checkpoint.json'
+
+# Videos at least this large have their frames read in place with range requests;
+# for smaller ones the seeks' read-ahead costs about as much as downloading the file
+RANGED_MIN_SIZE = 32 * 1024 * 1024
+
+
+def _init_worker():
+    """Set up Django in a freshly spawned worker process"""
+    import django
+    django.setup()
+
+
+def regenerate(video_id, quiet=True, ranged_min_size=RANGED_MIN_SIZE):
+    """
+    Regenerate one video's thumbnail. Videos of at least `ranged_min_size`
+    bytes have their candidate frames read from storage with range requests
+    instead of being downloaded. Runs in a worker process.
+    Returns (video_id, status, message) with status 'ok', 'placeholder' or 'error'.
+    """
+    from api.models import Video
+    
+    output = io.StringIO() if quiet else None
+    try:
+        with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+            video = Video.objects.get(Video_id=video_id)
+            # Uploads to storage, so no transaction is held open around it
+            result = video.generate_thumbnail(ranged=video.size >= ranged_min_size)
+            video.save(update_fields=['Thumbnail', 'Thumbnail_renditions', 'Thumbnail_preview'])
+        if result:
+            return video_id, 'ok', video.Thumbnail.name
+        return video_id, 'placeholder', 'no valid frame found'
+    except Video.DoesNotExist:
+        return video_id, 'error', 'video no longer exists'
+    except Exception as e:
+        return video_id, 'error', str(e)
+
+
+class Checkpoint:
+    """
+    Progress of a bulk run, saved after every video so an interrupted run
+    can resume. Videos are handed out in Video_id order but finish out of
+    order, so this keeps the highest id below which everything is finished
+    plus the finished ids above it. Failed ids are kept apart from the done
+    ones, whatever last_id, so a resumed run retries them.
+    """
+
+    def __init__(self, path, force):
+        self.path = path
+        self.force = force
+        self.last_id = 0
+        self.done = set()
+        self.failed = set()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        if data.get('force') != self.force:
+            raise CommandError(f'{self.path} is from a run with force={data.get("force")}; use --restart to discard it')
+        self.last_id = data.get('last_id', 0)
+        self.failed = set(data.get('failed', []))
+        # Older checkpoints also listed failed ids as done
+        self.done = set(data.get('done', [])) - self.failed
+        return True
+
+    def mark(self, video_id, failed=False):
+        if failed:
+            self.failed.add(video_id)
+        else:
+            self.done.add(video_id)
+            self.failed.discard(video_id)
+
+    def advance(self, in_flight):
+        """Move last_id up to just below the oldest video still being processed"""
+        limit = min(in_flight) if in_flight else None
+        for video_id in sorted(self.done | self.failed):
+            if limit is not None and video_id >= limit:
+                break
+            self.last_id = max(self.last_id, video_id)
+            self.done.discard(video_id)
+
+    def save(self):
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({
+                'force': self.force,
+                'last_id': self.last_id,
+                'done': sorted(self.done),
+                'failed': sorted(self.failed)
+            }, f)
+        os.replace(temp_path, self.path)
+
+    def delete(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def _format_seconds(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f'{seconds // 3600}h{seconds % 3600 // 60:02d}m'
+    if seconds >= 60:
+        return f'{seconds // 60}m{seconds % 60:02d}s'
+    return f'{seconds}s'
+
+
 class Command(BaseCommand):
     help = 'Regenerates thumbnails for all videos or a specific video ID'
 
     def add_arguments(self, parser):
         parser.add_argument('--video_id', type=int, help='Specific video ID to regenerate thumbnail for')
         parser.add_argument('--force', action='store_true', help='Force regeneration even if thumbnail exists')
-        
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker processes (1 runs in this process)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Video IDs fetched from the database per query')
+        parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='File recording progress, for resuming an interrupted run')
+        parser.add_argument('--ranged-min-size', type=int, default=RANGED_MIN_SIZE, help='Read frames in place with range requests for videos of at least this many bytes')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start from the beginning')
+
     def handle(self, *args, **options):
+        # Imported here so that spawned workers can import this module before setting up Django
+        from api.models import Video
+        from api.thumbnail_queue import PENDING_THUMBNAIL_PREFIX, is_pending_thumbnail
+        
         video_id = options.get('video_id')
         force = options.get('force', False)
-        
+
         if video_id:
             # Regenerate for specific video
             try:
                 video = Video.objects.get(Video_id=video_id)
-                self.regenerate_thumbnail(video, force)
             except Video.DoesNotExist:
                 raise CommandError(f'Video with ID {video_id} does not exist')
-        else:
-            # Regenerate for all videos
-            videos = Video.objects.all().order_by('-Uploaded_at')
-            
-            if not videos:
-                self.stdout.write(self.style.WARNING('No videos found in the database.'))
+            # The pending placeholder is not a thumbnail yet
+            if video.Thumbnail and not is_pending_thumbnail(video.Thumbnail.name) and not force:
+                self.stdout.write(f'Video {video_id} already has a thumbnail. Use --force to regenerate.')
                 return
-                
-            self.stdout.write(f'Found {videos.count()} videos. Starting thumbnail regeneration...')
-            
-            success_count = 0
-            failure_count = 0
-            skipped_count = 0
-            
-            for i, video in enumerate(videos):
-                self.stdout.write(f'Processing video {i+1}/{videos.count()} (ID: {video.Video_id})...')
-                
-                # Skip if thumbnail exists and force is False
-                if video.Thumbnail and not force:
-                    self.stdout.write(self.style.SUCCESS(f'  - Skipping video {video.Video_id}, thumbnail already exists'))
-                    skipped_count += 1
-                    continue
-                
-                result = self.regenerate_thumbnail(video, force)
-                if result:
-                    success_count += 1
-                else:
-                    failure_count += 1
-                
-                # Pause briefly to avoid overloading the system
-                time.sleep(0.5)
-            
-            self.stdout.write(self.style.SUCCESS(f'Thumbnail regeneration complete:'))
-            self.stdout.write(f'  - Successful: {success_count}')
-            self.stdout.write(f'  - Failed: {failure_count}')
-            self.stdout.write(f'  - Skipped: {skipped_count}')
-            
-    def regenerate_thumbnail(self, video, force=False):
-        """Regenerate thumbnail for a specific video"""
+            self.report(*regenerate(video_id, options['verbosity'] < 2, options['ranged_min_size']))
+            return
+
+        checkpoint = Checkpoint(options['checkpoint'], force)
+        if options.get('restart'):
+            checkpoint.delete()
+        elif checkpoint.load():
+            self.stdout.write(f'Resuming from {checkpoint.path} after video {checkpoint.last_id}')
+            if checkpoint.failed:
+                self.stdout.write(f'Retrying {len(checkpoint.failed)} videos that failed before')
+
+        # Skip videos that already have a thumbnail unless force is set; ones still
+        # on the pending placeholder (e.g. their task died with its worker) need one
+        videos = Video.objects.filter(Q(Video_id__gt=checkpoint.last_id) | Q(Video_id__in=checkpoint.failed)).order_by('Video_id')
+        if not force:
+            videos = videos.filter(
+                Q(Thumbnail__isnull=True) | Q(Thumbnail='') | Q(Thumbnail__startswith=PENDING_THUMBNAIL_PREFIX)
+            )
+        if checkpoint.done:
+            videos = videos.exclude(Video_id__in=checkpoint.done)
+
+        total = videos.count()
+        if not total:
+            self.stdout.write(self.style.WARNING('No videos need a thumbnail.'))
+            checkpoint.delete()
+            return
+
+        workers = max(1, options.get('workers') or 1)
+        self.stdout.write(f'Found {total} videos. Starting thumbnail regeneration with {workers} workers...')
+
+        video_ids = videos.values_list('Video_id', flat=True).iterator(chunk_size=options['chunk_size'])
+        counts = {'ok': 0, 'placeholder': 0, 'error': 0}
+        started = time.monotonic()
+
         try:
-            if video.Thumbnail and not force:
-                self.stdout.write(f'Video {video.Video_id} already has a thumbnail. Use --force to regenerate.')
-                return True
-                
-            self.stdout.write(f'Regenerating thumbnail for video {video.Video_id}...')
-            
-            # Clear existing thumbnail if force is True
-            if video.Thumbnail and force:
-                self.stdout.write('Clearing existing thumbnail...')
-                video.Thumbnail = None
-                video.save(update_fields=['Thumbnail'])
-            
-            # Generate new thumbnail
-            with transaction.atomic():
-                result = video.generate_thumbnail()
-                video.save(update_fields=['Thumbnail'])
-                
-                if result:
-                    self.stdout.write(self.style.SUCCESS(f'Successfully regenerated thumbnail for video {video.Video_id}'))
-                    return True
-                else:
-                    self.stdout.write(self.style.WARNING(f'Generated placeholder for video {video.Video_id} (no valid frame found)'))
-                    return False
-                    
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error regenerating thumbnail for video {video.Video_id}: {str(e)}'))
-            return False 
\ No newline at end of file
+            if workers == 1:
+                for current in video_ids:
+                    result = regenerate(current, options['verbosity'] < 2, options['ranged_min_size'])
+                    self.finish(result, checkpoint, set(), counts, total, started)
+            else:
+                self.run_pool(video_ids, workers, checkpoint, counts, total, started, options['verbosity'] < 2, options['ranged_min_size'])
+        except KeyboardInterrupt:
+            checkpoint.save()
+            self.stdout.write(self.style.WARNING(f'Interrupted; rerun the command to resume from {checkpoint.path}'))
+            return
+
+        elapsed = time.monotonic() - started
+        processed = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(f'Thumbnail regeneration complete:'))
+        self.stdout.write(f'  - Successful: {counts["ok"]}')
+        self.stdout.write(f'  - Placeholders: {counts["placeholder"]}')
+        self.stdout.write(f'  - Failed: {counts["error"]}')
+        self.stdout.write(f'  - Took {_format_seconds(elapsed)} ({processed / elapsed if elapsed else 0:.2f} videos/s)')
+        if checkpoint.failed:
+            self.stdout.write(f'  - Failed video IDs: {", ".join(str(i) for i in sorted(checkpoint.failed))}')
+        checkpoint.delete()
+
+    def run_pool(self, video_ids, workers, checkpoint, counts, total, started, quiet, ranged_min_size):
+        """Keep `workers` processes busy, with a bounded number of videos queued"""
+        # Spawned workers import Django afresh instead of sharing this process's database connections
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+            futures = {}
+            exhausted = False
+            while True:
+                while not exhausted and len(futures) < workers * 2:
+                    try:
+                        current = next(video_ids)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    futures[pool.submit(regenerate, current, quiet, ranged_min_size)] = current
+                if not futures:
+                    break
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    current = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        # A worker died (e.g. killed for memory); the videos it had are retried on resume
+                        checkpoint.save()
+                        raise CommandError(f'A worker process died; rerun the command to resume from {checkpoint.path}')
+                    except Exception as e:
+                        result = (current, 'error', f'worker failed: {e}')
+                    self.finish(result, checkpoint, set(futures.values()), counts, total, started)
+
+    def finish(self, result, checkpoint, in_flight, counts, total, started):
+        """Record one finished video and report progress"""
+        video_id, status, message = result
+        counts[status] += 1
+        checkpoint.mark(video_id, failed=status == 'error')
+        checkpoint.advance(in_flight)
+        checkpoint.save()
+
+        processed = sum(counts.values())
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0
+        eta = _format_seconds((total - processed) / rate) if rate else '?'
+        self.stdout.write(f'[{processed}/{total}] {rate:.2f} videos/s, ETA {eta}')
+        self.report(video_id, status, message)
+
+    def report(self, video_id, status, message):
+        if status == 'ok':
+            self.stdout.write(self.style.SUCCESS(f'  - Regenerated thumbnail for video {video_id}'))
+        elif status == 'placeholder':
+            self.stdout.write(self.style.WARNING(f'  - Generated placeholder for video {video_id} ({message})'))
+        else:
+            self.stdout.write(self.style.ERROR(f'  - Error regenerating thumbnail for video {video_id}: {message}'))
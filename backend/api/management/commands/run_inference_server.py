@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+
+class Command(BaseCommand):
+    help = 'Runs the inference server that holds the face detector and deepfake model for all web workers on this host'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', type=str, default=None,
+                            help='Unix socket path (defaults to settings.INFERENCE_SOCKET)')
+
+    def handle(self, *args, **options):
+        from api.detector import _load_face_net, _load_deepfake_model
+        from api.inference import InferenceServer
+
+        socket_path = options.get('socket') or getattr(settings, 'INFERENCE_SOCKET', '')
+        if not socket_path:
+            raise CommandError('No socket path given. Use --socket or set INFERENCE_SOCKET.')
+
+        self.stdout.write('Loading models...')
+        try:
+            face_net = _load_face_net()
+            deepfake_model = _load_deepfake_model()
+        except Exception as e:
+            raise CommandError(f'Failed to load models: {e}')
+
+        server = InferenceServer(
+            socket_path, face_net, deepfake_model,
+            max_batch_size=getattr(settings, 'DETECTOR_MICROBATCH_MAX_SIZE', 16),
+            max_wait=getattr(settings, 'DETECTOR_MICROBATCH_MAX_WAIT_MS', 10) / 1000,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Inference server listening on {socket_path}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('Shutting down inference server...')
+        finally:
+            server.server_close()
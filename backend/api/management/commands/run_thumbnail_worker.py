@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+import time
+
+class Command(BaseCommand):
+    help = 'Processes pending background thumbnail tasks, e.g. those left behind by a restart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the pending tasks once and exit')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls for new tasks')
+
+    def handle(self, *args, **options):
+        from api.thumbnail_queue import pending_task_ids, requeue_stale_tasks, run_thumbnail_task
+
+        once = options.get('once', False)
+        interval = options.get('interval', 5.0)
+
+        self.stdout.write('Thumbnail worker started')
+        try:
+            while True:
+                requeued = requeue_stale_tasks()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale thumbnail tasks'))
+
+                task_ids = pending_task_ids()
+                for task_id in task_ids:
+                    result = run_thumbnail_task(task_id)
+                    if result:
+                        self.stdout.write(self.style.SUCCESS(f'Thumbnail task {task_id} done'))
+                    elif result is None:
+                        self.stdout.write(self.style.WARNING(f'Thumbnail task {task_id} failed, will retry'))
+
+                if once:
+                    break
+                if not task_ids:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write('Shutting down thumbnail worker...')
@@ -0,0 +1,172 @@
+"""
+Video metadata service.
+
+probe_video() reads duration, resolution, frame rate, codec and frame count
+from the container header in Python (see api.containers) and only spawns
+ffprobe for files it cannot parse. Results are memoised in the Django cache
+by the SHA-256 of the video, so the upload views, the upload handler and
+thumbnail generation share one probe per video.
+"""
+import json
+import logging
+import subprocess
+
+from django.core.cache import cache
+
+from .containers import ContainerProbe
+from .spooling import SPOOL_CHUNK_SIZE, spool_to_tempfile
+from .toolchain import get_tool
+
+logger = logging.getLogger(__name__)
+
+# Memoised results live this long (seconds)
+CACHE_TIMEOUT = 24 * 60 * 60
+
+# Returned by get_video_metadata when neither parser could read the video
+DEFAULT_METADATA = {
+    'format': None,
+    'duration': 10,
+    'width': 640,
+    'height': 480,
+    'resolution': '640x480',
+    'fps': 30,
+    'codec': None,
+    'frame_count': 300,
+    'source': 'default'
+}
+
+
+def _cache_key(sha256):
+    return f"video-metadata:{sha256}"
+
+
+def _finish(details, source):
+    details = dict(details)
+    details['resolution'] = f"{details['width']}x{details['height']}"
+    details['source'] = source
+    return details
+
+
+def cache_metadata(sha256, details, source='container'):
+    """Remember `details` (as from ContainerProbe.details()) for the video with this hash"""
+    metadata = _finish(details, source)
+    cache.set(_cache_key(sha256), metadata, CACHE_TIMEOUT)
+    return metadata
+
+
+def cached_metadata(sha256):
+    return cache.get(_cache_key(sha256)) if sha256 else None
+
+
+def _probe_container(path):
+    """Parse the container header of a local file, seeking over media data"""
+    probe = ContainerProbe()
+    offset = 0
+    with open(path, 'rb') as f:
+        while not probe.done:
+            f.seek(offset)
+            chunk = f.read(SPOOL_CHUNK_SIZE)
+            if not chunk:
+                break
+            probe.feed_at(chunk, offset)
+            offset = probe.next_offset()
+    return probe.details()
+
+
+def _parse_rate(rate):
+    if not rate or rate == '0/0':
+        return None
+    if '/' in rate:
+        num, den = rate.split('/')
+        return float(num) / float(den) if float(den) else None
+    return float(rate)
+
+
+def _probe_ffprobe(path):
+    """Run ffprobe on a local file"""
+    ffprobe = get_tool('ffprobe', detect=False)
+    if not ffprobe.available:
+        return None
+    cmd = [
+        ffprobe.path,
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=codec_name,width,height,r_frame_rate,avg_frame_rate,duration,nb_frames:format=format_name,duration',
+        '-of', 'json',
+        path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=60)
+        probe_data = json.loads(result.stdout)
+    except (OSError, subprocess.SubprocessError, json.JSONDecodeError) as e:
+        logger.warning(f"ffprobe failed for {path}: {e}")
+        return None
+
+    streams = probe_data.get('streams') or []
+    if not streams:
+        return None
+    stream = streams[0]
+    container = probe_data.get('format') or {}
+    try:
+        duration = float(stream.get('duration') or container.get('duration') or 0)
+        fps = _parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate'))
+    except ValueError:
+        return None
+    if not duration or not fps or not stream.get('width') or not stream.get('height'):
+        return None
+    nb_frames = stream.get('nb_frames')
+    return {
+        'format': (container.get('format_name') or '').split(',')[0] or None,
+        'duration': duration,
+        'width': int(stream['width']),
+        'height': int(stream['height']),
+        'fps': fps,
+        'codec': stream.get('codec_name'),
+        'frame_count': int(nb_frames) if nb_frames and nb_frames.isdigit() else int(round(duration * fps))
+    }
+
+
+def probe_video(path, sha256=None):
+    """
+    Metadata of the video at local `path`: format, duration and fps (full
+    precision), width, height, resolution, codec, frame_count and the
+    `source` it came from. Returns None if the video cannot be read.
+    """
+    metadata = cached_metadata(sha256)
+    if metadata is not None:
+        return metadata
+
+    details = None
+    source = 'container'
+    try:
+        details = _probe_container(path)
+    except OSError as e:
+        logger.warning(f"Could not read {path}: {e}")
+    if details is None:
+        source = 'ffprobe'
+        details = _probe_ffprobe(path)
+    if details is None:
+        return None
+
+    if sha256:
+        return cache_metadata(sha256, details, source)
+    return _finish(details, source)
+
+
+def get_video_metadata(video_file, sha256=None):
+    """
+    Metadata of an uploaded or stored video. With the SHA-256 already known
+    (e.g. from the upload handler) a memoised result avoids touching the
+    file at all. Falls back to DEFAULT_METADATA if the video cannot be read.
+    """
+    metadata = cached_metadata(sha256)
+    if metadata is None:
+        try:
+            with spool_to_tempfile(video_file) as spooled:
+                metadata = probe_video(spooled.path, spooled.sha256)
+        except Exception as e:
+            logger.error(f"Error in metadata extraction: {e}")
+    if metadata is None:
+        logger.warning("Could not read video metadata, using defaults")
+        return dict(DEFAULT_METADATA)
+    return metadata
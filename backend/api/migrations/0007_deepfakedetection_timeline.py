@@ -0,0 +1,22 @@
+# Generated by Django 4.2.18 on 2026-10-19 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_alter_customuser_email"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="deepfakedetection",
+            name="timeline",
+            field=models.BinaryField(
+                blank=True,
+                help_text="Packed per-frame probabilities (see api.timeline)",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.18 on 2026-10-19 14:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_deepfakedetection_timeline"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ThumbnailTask",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        db_index=True,
+                        default="pending",
+                        max_length=16,
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                (
+                    "source_path",
+                    models.TextField(
+                        blank=True,
+                        default="",
+                        help_text="Local copy of the upload, if it is still on this host",
+                    ),
+                ),
+                ("last_error", models.TextField(blank=True, default="")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "video",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="thumbnail_task",
+                        to="api.video",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.18 on 2026-10-19 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_thumbnailtask"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="Thumbnail_renditions",
+            field=models.TextField(
+                blank=True,
+                default="",
+                help_text="JSON list of the resized WebP/JPEG copies of the thumbnail",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.18 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_video_thumbnail_renditions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="Thumbnail_preview",
+            field=models.TextField(
+                blank=True,
+                default="",
+                help_text="Tiny inline WebP data URI shown while the thumbnail loads",
+            ),
+        ),
+    ]
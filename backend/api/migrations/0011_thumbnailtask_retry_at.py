@@ -0,0 +1,22 @@
+# Generated by Django 4.2.18 on 2026-10-19 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_video_thumbnail_preview"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="thumbnailtask",
+            name="retry_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Earliest time a failed task may be retried",
+                null=True,
+            ),
+        ),
+    ]
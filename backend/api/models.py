@@ -1,5 +1,5 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 import json
 from django.utils import timezone
 import random
@@ -12,100 +12,25 @@ from django.core.files.base import ContentFile
 from PIL import Image
 import io
 from PIL import ImageEnhance
-from PIL import ImageDraw
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 import logging
+from .spooling import ranged_source, spool_to_tempfile
+from .metadata import probe_video
+from .thumbnails import best_thumbnail_frame, frame_to_image, preview_data_uri, store_renditions
+from .thumbnail_queue import enqueue_thumbnail, failed_thumbnail_name, pending_thumbnail_name
+from . import toolchain
 
 # Get a logger for this file
 logger = logging.getLogger(__name__)
 
-# Add this function to get the ffmpeg executable path
 def get_ffmpeg_path():
-    """Get the path to the ffmpeg executable based on the project structure."""
-    # Check if we're running on Heroku
-    on_heroku = os.environ.get('DYNO') is not None
-    
-    if on_heroku:
-        # Heroku-specific paths - try these first when on Heroku
-        possible_paths = [
-            # Heroku buildpack location - most reliable for Heroku
-            '/app/vendor/ffmpeg/bin/ffmpeg',
-            # Standard Heroku paths
-            '/app/vendor/ffmpeg/ffmpeg',
-            '/usr/bin/ffmpeg',
-            # Fallback to system PATH
-            'ffmpeg',
-        ]
-    else:
-        # Local development paths
-        possible_paths = [
-            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin', 'ffmpeg-6.1.1-essentials_build', 'bin', 'ffmpeg.exe'),
-            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin', 'ffmpeg-6.1.1-essentials_build', 'bin', 'ffmpeg'),
-            # Fallback to system PATH
-            'ffmpeg',
-        ]
-    
-    # Check if any of the paths exist
-    for path in possible_paths:
-        if os.path.exists(path):
-            print(f"Found ffmpeg at: {path}")
-            # Check if the file is executable
-            if on_heroku and not os.access(path, os.X_OK):
-                print(f"Warning: FFmpeg found at {path} but it's not executable")
-                try:
-                    os.chmod(path, 0o755)  # Try to make it executable
-                    print(f"Made FFmpeg at {path} executable")
-                except Exception as e:
-                    print(f"Failed to make FFmpeg executable: {e}")
-            return path
-    
-    # Fallback to system PATH
-    print("Using ffmpeg from system PATH")
-    return 'ffmpeg'
+    """Path of the ffmpeg executable (see api.toolchain)"""
+    return toolchain.ffmpeg_path()
 
 def get_ffprobe_path():
-    """Get the path to the ffprobe executable based on the project structure."""
-    # Check if we're running on Heroku
-    on_heroku = os.environ.get('DYNO') is not None
-    
-    if on_heroku:
-        # Heroku-specific paths - try these first when on Heroku
-        possible_paths = [
-            # Heroku buildpack location - most reliable for Heroku
-            '/app/vendor/ffmpeg/bin/ffprobe',
-            # Standard Heroku paths
-            '/app/vendor/ffmpeg/ffprobe',
-            '/usr/bin/ffprobe',
-            # Fallback to system PATH
-            'ffprobe',
-        ]
-    else:
-        # Local development paths
-        possible_paths = [
-            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin', 'ffmpeg-6.1.1-essentials_build', 'bin', 'ffprobe.exe'),
-            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin', 'ffmpeg-6.1.1-essentials_build', 'bin', 'ffprobe'),
-            # Fallback to system PATH
-            'ffprobe',
-        ]
-    
-    # Check if any of the paths exist
-    for path in possible_paths:
-        if os.path.exists(path):
-            print(f"Found ffprobe at: {path}")
-            # Check if the file is executable
-            if on_heroku and not os.access(path, os.X_OK):
-                print(f"Warning: FFprobe found at {path} but it's not executable")
-                try:
-                    os.chmod(path, 0o755)  # Try to make it executable
-                    print(f"Made FFprobe at {path} executable")
-                except Exception as e:
-                    print(f"Failed to make FFprobe executable: {e}")
-            return path
-    
-    # Fallback to system PATH
-    print("Using ffprobe from system PATH")
-    return 'ffprobe'
+    """Path of the ffprobe executable (see api.toolchain)"""
+    return toolchain.ffprobe_path()
 
 class S3MediaStorage(S3Boto3Storage):
     """Custom S3 storage for media files"""
@@ -162,6 +87,8 @@ class Video(models.Model):
     Video_File = models.FileField(storage=S3MediaStorage(), upload_to='videos/', null=True)
     Video_Path = models.TextField(help_text="S3 path to the video file")
     Thumbnail = models.ImageField(storage=S3MediaStorage(), upload_to='thumbnails/', null=True, blank=True, help_text="Representative frame of the video")
+    Thumbnail_renditions = models.TextField(blank=True, default='', help_text="JSON list of the resized WebP/JPEG copies of the thumbnail")
+    Thumbnail_preview = models.TextField(blank=True, default='', help_text="Tiny inline WebP data URI shown while the thumbnail loads")
     isAnalyzed = models.BooleanField(default=False)
     size = models.BigIntegerField()
     Length = models.IntegerField()
@@ -173,6 +100,10 @@ class Video(models.Model):
         """Override save to update Video_Path from Video_File and generate thumbnail"""
         is_new = self.pk is None
         
+        # A new upload: the thumbnail is generated in the background
+        if is_new and self.Video_File and not self.Video_File._committed and not self.Thumbnail:
+            return self._save_new_upload(*args, **kwargs)
+        
         # First save to get the file path
         super().save(*args, **kwargs)
         
@@ -184,200 +115,132 @@ class Video(models.Model):
         # Generate thumbnail if this is a new video and we don't have a thumbnail yet
         if is_new and self.Video_File and not self.Thumbnail:
             self.generate_thumbnail()
-            super().save(update_fields=['Thumbnail'])
+            super().save(update_fields=['Thumbnail', 'Thumbnail_renditions', 'Thumbnail_preview'])
+    
+    def set_thumbnail_renditions(self, value):
+        self.Thumbnail_renditions = json.dumps(value) if value else ''
+    
+    def get_thumbnail_renditions(self):
+        try:
+            return json.loads(self.Thumbnail_renditions) if self.Thumbnail_renditions else []
+        except ValueError:
+            return []
     
-    def generate_thumbnail(self):
-        """Generate a thumbnail from the video"""
-        print(f"Starting thumbnail generation for video ID {self.Video_id}")
+    def _save_new_upload(self, *args, **kwargs):
+        """
+        Save a new video whose file is still an upload. The thumbnail is left
+        to a background task (see api.thumbnail_queue) working from a local
+        copy of the upload; until it is ready the video shows a placeholder.
+        The storage uploads happen before the transaction opens, so it only
+        spans the row and its task.
+        """
+        spooled = spool_to_tempfile(self.Video_File.file, copy=True)
+        try:
+            self.Thumbnail = pending_thumbnail_name()
+            # Upload now, as pre_save would, so the row can be written with its final path
+            self.Video_File.save(self.Video_File.name, self.Video_File.file, save=False)
+            self.Video_Path = self.Video_File.url
+        except Exception:
+            spooled.close()
+            raise
+        
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                enqueue_thumbnail(self, spooled)
+        except Exception:
+            spooled.close()
+            # Nothing refers to the uploaded file without the row
+            self.Video_File.delete(save=False)
+            raise
+    
+    def generate_thumbnail(self, spooled=None, ranged=False):
+        """
+        Generate a thumbnail from the video. `spooled` is a local copy of the
+        video (see api.spooling) to use instead of fetching Video_File. With
+        ranged=True the candidate frames are first read straight from storage
+        with range requests, and the video is only downloaded if that fails.
+        """
+        logger.info(f"Starting thumbnail generation for video ID {self.Video_id}")
+        owns_spool = spooled is None
+        temp_thumb_path = None
         try:
             # Create a temporary file
             with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_thumb:
                 temp_thumb_path = temp_thumb.name
-            print(f"Created temporary thumbnail file: {temp_thumb_path}")
+            logger.debug(f"Created temporary thumbnail file: {temp_thumb_path}")
             
             # Make sure the file doesn't already exist (could cause issues with ffmpeg -y flag)
             try:
                 if os.path.exists(temp_thumb_path):
                     os.unlink(temp_thumb_path)
-                    print(f"Removed existing temporary thumbnail file")
+                    logger.debug("Removed existing temporary thumbnail file")
             except Exception as e:
-                print(f"Error removing existing thumbnail file: {str(e)}")
+                logger.warning(f"Error removing existing thumbnail file: {str(e)}")
             
-            # Save the video to a temporary file if using S3
-            if hasattr(self.Video_File, 'url'):
-                with tempfile.NamedTemporaryFile(suffix=os.path.splitext(self.Video_File.name)[1], delete=False) as temp_video:
-                    temp_video_path = temp_video.name
-                    print(f"Created temporary video file: {temp_video_path}")
-                    # Download the file from S3
-                    try:
-                        video_data = self.Video_File.read()
-                        print(f"Read {len(video_data)} bytes from S3")
-                        
-                        # Check the first few bytes to determine if it's really a video file
-                        if len(video_data) > 16:
-                            magic_bytes = video_data[:16].hex()
-                            print(f"File magic bytes: {magic_bytes}")
-                            
-                            # Check for common video signatures
-                            is_mp4 = magic_bytes.startswith('00000020667479706d703432') or magic_bytes.startswith('000000186674797033677035') or magic_bytes.startswith('0000001c667479704d534e56')
-                            is_avi = magic_bytes.startswith('52494646') and 'AVI' in video_data[:32].decode('utf-8', errors='ignore')
-                            is_mov = magic_bytes.startswith('0000001466747970') or magic_bytes.startswith('6d6f6f76')
-                            is_webm = magic_bytes.startswith('1a45dfa3')
-                            
-                            if is_mp4:
-                                print("Detected MP4 video format")
-                            elif is_avi:
-                                print("Detected AVI video format")
-                            elif is_mov:
-                                print("Detected MOV/QuickTime video format")
-                            elif is_webm:
-                                print("Detected WebM video format")
-                            else:
-                                print("Unknown or non-video file format. This might not be a valid video file.")
-                        
-                        temp_video.write(video_data)
-                        print(f"Successfully wrote video data to temp file")
-                    except Exception as e:
-                        print(f"Error reading from S3: {str(e)}")
-                        raise
-            else:
-                # The file is local
-                temp_video_path = self.Video_File.path
-                print(f"Using local video path: {temp_video_path}")
+            # Seek to the candidate frames in place instead of downloading the whole video
+            best = None
+            if ranged and owns_spool:
+                source = ranged_source(self.Video_File)
+                if source is not None:
+                    best = best_thumbnail_frame(source, duration=self.Length or None)
+                if best is None:
+                    logger.info("Could not read frames in place, downloading the video")
             
-            # Use ffmpeg to extract a frame from the middle of the video
-            # Try different timestamps to avoid black frames
-            timestamps = ['00:00:01', '00:00:03', '00:00:05', '00:00:10', '00:00:15', '00:00:20', '00:00:30']
-            success = False
+            # Make the video available locally, streaming it instead of reading it into memory
+            if best is None:
+                if owns_spool:
+                    spooled = spool_to_tempfile(self.Video_File)
+                temp_video_path = spooled.path
+                logger.debug(f"Video available at {temp_video_path} ({spooled.size} bytes)")
             
-            for timestamp in timestamps:
-                try:
-                    print(f"Attempting thumbnail extraction at timestamp {timestamp}")
-                    # Try this timestamp
-                    cmd = [
-                        get_ffmpeg_path(),
-                        '-i', temp_video_path,
-                        '-ss', timestamp,  # timestamp into the video
-                        '-vframes', '1',
-                        '-q:v', '2',  # Higher quality setting
-                        '-f', 'image2',
-                        '-y',  # Force overwrite if file exists
-                        temp_thumb_path
-                    ]
-                    print(f"Running FFmpeg command: {' '.join(cmd)}")
-                    
-                    # Use subprocess without check=True to capture error output
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    
-                    # Print ffmpeg output regardless of success/failure
-                    print(f"FFmpeg stdout: {result.stdout}")
-                    print(f"FFmpeg stderr: {result.stderr}")
-                    print(f"FFmpeg exit code: {result.returncode}")
-                    
-                    # Check temp file directory permissions
-                    temp_dir = os.path.dirname(temp_thumb_path)
-                    print(f"Temp directory permissions for {temp_dir}: {oct(os.stat(temp_dir).st_mode)[-3:]}")
-                    print(f"Temp directory writeable: {os.access(temp_dir, os.W_OK)}")
-                    
-                    # Check if the file was created and has content
-                    if os.path.exists(temp_thumb_path) and os.path.getsize(temp_thumb_path) > 100:
-                        print(f"Thumbnail file created successfully: {os.path.getsize(temp_thumb_path)} bytes")
-                        
-                        # Check if the image is not just black
-                        img = Image.open(temp_thumb_path)
-                        extrema = img.convert("L").getextrema()
-                        print(f"Image extrema (min/max): {extrema}")
-                        
-                        # If min and max are too similar, the image is likely just one color (black)
-                        if extrema[1] - extrema[0] > 30:
-                            success = True
-                            print(f"Generated valid thumbnail at timestamp {timestamp}")
-                            break
-                        else:
-                            print(f"Thumbnail at {timestamp} is too dark/uniform, trying next timestamp...")
-                    else:
-                        print(f"Thumbnail file is missing or too small: {os.path.exists(temp_thumb_path)}, {os.path.getsize(temp_thumb_path) if os.path.exists(temp_thumb_path) else 0}")
-                except subprocess.CalledProcessError as e:
-                    print(f"Error generating thumbnail at {timestamp}: {e}")
-                    print(f"FFMPEG stderr: {e.stderr}")
-                    print(f"FFMPEG stdout: {e.stdout}")
-                    continue
-                except Exception as e:
-                    print(f"Unexpected error during thumbnail generation at {timestamp}: {str(e)}")
-                    continue
-            
-            if not success:
-                print("All thumbnail attempts with timestamps failed, trying alternative approaches")
+            # Check the first few bytes to determine if it's really a video file
+            if spooled is not None and spooled.size > 16:
+                magic_bytes = spooled.head[:16].hex()
+                logger.debug(f"File magic bytes: {magic_bytes}")
                 
-                # Try a different approach - seek to 10% of video duration
-                try:
-                    print("Trying to determine video duration...")
-                    # Get video duration
-                    duration_cmd = [
-                        get_ffprobe_path(),
-                        '-v', 'error',
-                        '-show_entries', 'format=duration',
-                        '-of', 'default=noprint_wrappers=1:nokey=1',
-                        temp_video_path
-                    ]
-                    # Run without check=True to capture errors
-                    duration_result = subprocess.run(duration_cmd, capture_output=True, text=True)
-                    
-                    # Print ffprobe output regardless of success/failure
-                    print(f"FFprobe stdout: {duration_result.stdout}")
-                    print(f"FFprobe stderr: {duration_result.stderr}")
-                    print(f"FFprobe exit code: {duration_result.returncode}")
-                    
-                    # Only proceed if successful
-                    if duration_result.returncode == 0 and duration_result.stdout.strip():
-                        duration = float(duration_result.stdout.strip())
-                        print(f"Video duration: {duration} seconds")
-                        
-                        # Try 10% into the video
-                        ten_percent = max(1, int(duration * 0.1))
-                        seek_timestamp = f"00:00:{ten_percent}"
-                        print(f"Trying to extract thumbnail at {seek_timestamp} (10% of duration)")
-                        
-                        seek_cmd = [
-                            get_ffmpeg_path(),
-                            '-i', temp_video_path,
-                            '-ss', seek_timestamp,
-                            '-vframes', '1',
-                            '-q:v', '2',
-                            '-f', 'image2',
-                            '-y',  # Force overwrite if file exists
-                            temp_thumb_path
-                        ]
-                        # Run without check=True
-                        seek_result = subprocess.run(seek_cmd, capture_output=True, text=True)
-                        
-                        # Print output
-                        print(f"FFmpeg seek stdout: {seek_result.stdout}")
-                        print(f"FFmpeg seek stderr: {seek_result.stderr}")
-                        print(f"FFmpeg seek exit code: {seek_result.returncode}")
-                        
-                        # Check if the image is valid
-                        if os.path.exists(temp_thumb_path) and os.path.getsize(temp_thumb_path) > 100:
-                            img = Image.open(temp_thumb_path)
-                            extrema = img.convert("L").getextrema()
-                            if extrema[1] - extrema[0] > 30:
-                                success = True
-                                print(f"Generated valid thumbnail at 10% of duration")
-                            else:
-                                print("Thumbnail at 10% is too dark/uniform")
-                        else:
-                            print("Failed to create thumbnail at 10% of duration")
-                    else:
-                        print(f"Failed to get duration: {duration_result.stderr}")
-                except Exception as e:
-                    print(f"Error with duration-based approach: {str(e)}")
+                # Check for common video signatures
+                is_mp4 = magic_bytes.startswith('00000020667479706d703432') or magic_bytes.startswith('000000186674797033677035') or magic_bytes.startswith('0000001c667479704d534e56')
+                is_avi = magic_bytes.startswith('52494646') and 'AVI' in spooled.head[:32].decode('utf-8', errors='ignore')
+                is_mov = magic_bytes.startswith('0000001466747970') or magic_bytes.startswith('6d6f6f76')
+                is_webm = magic_bytes.startswith('1a45dfa3')
+                
+                if is_mp4:
+                    logger.debug("Detected MP4 video format")
+                elif is_avi:
+                    logger.debug("Detected AVI video format")
+                elif is_mov:
+                    logger.debug("Detected MOV/QuickTime video format")
+                elif is_webm:
+                    logger.debug("Detected WebM video format")
+                else:
+                    logger.warning(f"Video {self.Video_id} is in an unknown or non-video format")
+            
+            # Decode all candidate frames in one OpenCV pass, score them in memory
+            # and keep the best one; only the winner gets encoded
+            if best is None:
+                video_metadata = probe_video(temp_video_path, spooled.sha256)
+                duration = video_metadata['duration'] if video_metadata is not None else None
+                best = best_thumbnail_frame(temp_video_path, duration=duration)
+            thumb_image = None
+            success = best is not None
+            if success:
+                frame, timestamp, score = best
+                thumb_image = frame_to_image(frame)
+                logger.info(f"Selected thumbnail frame for video {self.Video_id} at {timestamp}s (score {score:.2f})")
+            
+            ffmpeg = toolchain.get_tool('ffmpeg') if not success else None
+            if ffmpeg is not None and not ffmpeg.available:
+                logger.warning(f"No usable frame from OpenCV for video {self.Video_id} and ffmpeg is not available")
+            elif not success:
+                logger.info(f"No usable frame from OpenCV for video {self.Video_id}, trying ffmpeg")
                 
                 # If still not successful, try the thumbnail filter
-                if not success:
-                    print("Using thumbnail filter as fallback")
+                if not success and ffmpeg.has_filter('thumbnail'):
+                    logger.info("Using thumbnail filter as fallback")
                     # Fallback to a simpler approach
                     cmd = [
-                        get_ffmpeg_path(),
+                        ffmpeg.path,
                         '-i', temp_video_path,
                         '-vf', 'thumbnail,scale=480:320',  # Use thumbnail filter
                         '-frames:v', '1',
@@ -388,23 +251,22 @@ class Video(models.Model):
                         # Run without check=True
                         thumb_result = subprocess.run(cmd, capture_output=True, text=True)
                         
-                        # Print output
-                        print(f"FFmpeg thumbnail filter stdout: {thumb_result.stdout}")
-                        print(f"FFmpeg thumbnail filter stderr: {thumb_result.stderr}")
-                        print(f"FFmpeg thumbnail filter exit code: {thumb_result.returncode}")
+                        # Log output
+                        logger.debug(f"FFmpeg thumbnail filter stdout: {thumb_result.stdout}")
+                        logger.debug(f"FFmpeg thumbnail filter stderr: {thumb_result.stderr}")
+                        logger.debug(f"FFmpeg thumbnail filter exit code: {thumb_result.returncode}")
                         
-                        print("Thumbnail filter completed")
                         success = os.path.exists(temp_thumb_path) and os.path.getsize(temp_thumb_path) > 100
-                        print(f"Thumbnail filter result: {success}, {os.path.getsize(temp_thumb_path) if os.path.exists(temp_thumb_path) else 0} bytes")
+                        logger.info(f"Thumbnail filter result: {success}, {os.path.getsize(temp_thumb_path) if os.path.exists(temp_thumb_path) else 0} bytes")
                     except Exception as e:
-                        print(f"Error using thumbnail filter: {str(e)}")
+                        logger.warning(f"Error using thumbnail filter: {str(e)}")
                         
                 # If still not successful, try with direct file sizes
                 if not success:
-                    print("Trying with direct file output approach")
+                    logger.info("Trying with direct file output approach")
                     output_jpg = f"/tmp/direct_output_{self.Video_id}.jpg"
                     cmd = [
-                        get_ffmpeg_path(),
+                        ffmpeg.path,
                         '-i', temp_video_path,
                         '-f', 'mjpeg',  # Force MJPEG output
                         '-frames:v', '1',
@@ -413,11 +275,11 @@ class Video(models.Model):
                     ]
                     try:
                         direct_result = subprocess.run(cmd, capture_output=True, text=True)
-                        print(f"Direct FFmpeg command exit code: {direct_result.returncode}")
-                        print(f"Direct FFmpeg stderr: {direct_result.stderr}")
+                        logger.debug(f"Direct FFmpeg command exit code: {direct_result.returncode}")
+                        logger.debug(f"Direct FFmpeg stderr: {direct_result.stderr}")
                         
                         if os.path.exists(output_jpg) and os.path.getsize(output_jpg) > 100:
-                            print(f"Successfully created direct output at {output_jpg} with size {os.path.getsize(output_jpg)}")
+                            logger.debug(f"Created direct output at {output_jpg} with size {os.path.getsize(output_jpg)}")
                             
                             # Copy the direct output to our temp thumb path
                             import shutil
@@ -428,32 +290,32 @@ class Video(models.Model):
                             extrema = img.convert("L").getextrema()
                             if extrema[1] - extrema[0] > 30:
                                 success = True
-                                print("Direct output approach succeeded")
+                                logger.info("Direct output approach succeeded")
                             else:
-                                print("Direct output is too dark/uniform")
+                                logger.info("Direct output is too dark/uniform")
                         else:
-                            print(f"Direct output failed, file exists: {os.path.exists(output_jpg)}, size: {os.path.getsize(output_jpg) if os.path.exists(output_jpg) else 0}")
+                            logger.info(f"Direct output failed, file exists: {os.path.exists(output_jpg)}, size: {os.path.getsize(output_jpg) if os.path.exists(output_jpg) else 0}")
                     except Exception as e:
-                        print(f"Error with direct output approach: {str(e)}")
+                        logger.warning(f"Error with direct output approach: {str(e)}")
             
-            # Process the thumbnail if we have one
-            if success:
-                print("Opening generated thumbnail")
-            # Open the generated thumbnail
-            with open(temp_thumb_path, 'rb') as f:
-                thumb_data = f.read()
+            # Use the selected frame, or open the thumbnail an ffmpeg fallback wrote
+            if thumb_image is not None:
+                img = thumb_image
+            else:
+                with open(temp_thumb_path, 'rb') as f:
+                    thumb_data = f.read()
+                img = Image.open(io.BytesIO(thumb_data))
             
             # Resize if needed
-            img = Image.open(io.BytesIO(thumb_data))
-            print(f"Thumbnail dimensions: {img.width}x{img.height}, mode: {img.mode}")
+            logger.debug(f"Thumbnail dimensions: {img.width}x{img.height}, mode: {img.mode}")
             # Keep aspect ratio but limit to 480px max dimension
             img.thumbnail((480, 480))
-            print(f"Resized to: {img.width}x{img.height}")
+            logger.debug(f"Resized to: {img.width}x{img.height}")
             
             # Ensure image is RGB (in case it's grayscale/RGBA)
             if img.mode != 'RGB':
                 img = img.convert('RGB')
-            print(f"Converted image to RGB mode")
+                logger.debug("Converted image to RGB mode")
             
             # Increase brightness and contrast slightly if the image is dark
             enhancer = ImageEnhance.Brightness(img)
@@ -461,102 +323,68 @@ class Video(models.Model):
             
             enhancer = ImageEnhance.Contrast(img)
             img = enhancer.enhance(1.2)  # Increase contrast by 20%
-            print("Applied brightness and contrast enhancements")
+            logger.debug("Applied brightness and contrast enhancements")
             
             # Save to in-memory buffer
             buffer = io.BytesIO()
             img.save(buffer, format='JPEG', quality=95)
             buffer.seek(0)
-            print("Saved enhanced image to buffer")
+            logger.debug("Saved enhanced image to buffer")
             
             # Set the thumbnail field
             file_name = f"thumbnail_{self.Video_id}.jpg"
             self.Thumbnail.save(file_name, ContentFile(buffer.read()), save=False)
-            print(f"Successfully saved thumbnail as {file_name}")
+            logger.info(f"Saved thumbnail for video {self.Video_id} as {self.Thumbnail.name}")
+            
+            # Inline preview for the dashboard to show before any thumbnail request completes
+            try:
+                self.Thumbnail_preview = preview_data_uri(img)
+                logger.debug(f"Created {len(self.Thumbnail_preview)} byte inline preview")
+            except Exception as e:
+                logger.warning(f"Error creating inline preview for video {self.Video_id}: {e}")
+                self.Thumbnail_preview = ''
+            
+            # Store the smaller WebP/JPEG renditions from the same decoded image
+            try:
+                storage = self._meta.get_field('Thumbnail').storage
+                self.set_thumbnail_renditions(
+                    store_renditions(storage, self.Video_id, img, previous=self.get_thumbnail_renditions())
+                )
+                logger.debug(f"Stored {len(self.get_thumbnail_renditions())} thumbnail renditions")
+            except Exception as e:
+                logger.warning(f"Error storing thumbnail renditions for video {self.Video_id}: {e}")
+                self.set_thumbnail_renditions(None)
             
             # Clean up temp files
             try:
-                os.unlink(temp_thumb_path)
-                if hasattr(self.Video_File, 'url'):
-                    os.unlink(temp_video_path)
-                print("Cleaned up temporary files")
+                if os.path.exists(temp_thumb_path):
+                    os.unlink(temp_thumb_path)
+                if owns_spool and spooled is not None:
+                    spooled.close()
+                logger.debug("Cleaned up temporary files")
             except Exception as e:
-                print(f"Error cleaning up: {str(e)}")
+                logger.warning(f"Error cleaning up: {str(e)}")
             
             return True
         except Exception as e:
-            print(f"Error in thumbnail generation process: {e}")
-            # If all else fails, create a colored placeholder
+            logger.error(f"Error in thumbnail generation process for video {self.Video_id}: {e}")
+            self.set_thumbnail_renditions(None)
+            self.Thumbnail_preview = ''
+            if owns_spool and spooled is not None:
+                spooled.close()
             try:
-                # Create a colored placeholder image
-                print("Creating colored placeholder image")
-                
-                # Make absolutely sure this doesn't fail
-                try:
-                    img = Image.new('RGB', (480, 320), color=(32, 127, 77))  # Green color
-                    draw = ImageDraw.Draw(img)
-                    
-                    # Try to add text, but don't fail if it doesn't work
-                    try:
-                        draw.text((240, 160), "True Vision", fill=(255, 255, 255), anchor="mm")
-                    except Exception as text_error:
-                        print(f"Could not add text to placeholder: {text_error}")
-                        # Continue without text
-                    
-                    # Save to buffer
-                    buffer = io.BytesIO()
-                    img.save(buffer, format='JPEG')
-                    buffer.seek(0)
-                    
-                    # Save placeholder as thumbnail
-                    file_name = f"placeholder_{self.Video_id}.jpg"
-                    self.Thumbnail.save(file_name, ContentFile(buffer.read()), save=False)
-                    print(f"Created placeholder thumbnail: {file_name}")
-                    return False
-                except Exception as img_error:
-                    print(f"Error creating image: {img_error}")
-                    
-                    # Even more basic fallback - create a 1x1 pixel image if PIL fails
-                    try:
-                        print("Attempting ultra-basic 1x1 pixel fallback")
-                        # Create a 1x1 green pixel as JPG
-                        one_pixel = bytes([
-                            0xFF, 0xD8,  # JPEG SOI marker
-                            0xFF, 0xE0, 0x00, 0x10, 0x4A, 0x46, 0x49, 0x46, 0x00, 0x01, 0x01, 0x01, 0x00, 0x48, 0x00, 0x48, 0x00, 0x00,  # JFIF header
-                            0xFF, 0xDB, 0x00, 0x43, 0x00, 0x10, 0x0B, 0x0C, 0x0E, 0x0C, 0x0A, 0x10, 0x0E, 0x0D, 0x0E, 0x12, 0x11, 0x10, 0x13, 0x18, 0x28, 0x1A, 0x18, 0x16, 0x16, 0x18, 0x31, 0x23, 0x25, 0x1D, 0x28, 0x3A, 0x33, 0x3D, 0x3C, 0x39, 0x33, 0x38, 0x37, 0x40, 0x48, 0x5C, 0x4E, 0x40, 0x44, 0x57, 0x45, 0x37, 0x38, 0x50, 0x6D, 0x51, 0x57, 0x5F, 0x62, 0x67, 0x68, 0x67, 0x3E, 0x4D, 0x71, 0x79, 0x70, 0x64, 0x78, 0x5C, 0x65, 0x67, 0x63,  # DQT
-                            0xFF, 0xC0, 0x00, 0x0B, 0x08, 0x00, 0x01, 0x00, 0x01, 0x01, 0x01, 0x11, 0x00,  # SOF
-                            0xFF, 0xC4, 0x00, 0x1F, 0x00, 0x00, 0x01, 0x05, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x08, 0x09, 0x0A, 0x0B,  # DHT
-                            0xFF, 0xC4, 0x00, 0xB5, 0x10, 0x00, 0x02, 0x01, 0x03, 0x03, 0x02, 0x04, 0x03, 0x05, 0x05, 0x04, 0x04, 0x00, 0x00, 0x01, 0x7D, 0x01, 0x02, 0x03, 0x00, 0x04, 0x11, 0x05, 0x12, 0x21, 0x31, 0x41, 0x06, 0x13, 0x51, 0x61, 0x07, 0x22, 0x71, 0x14, 0x32, 0x81, 0x91, 0xA1, 0x08, 0x23, 0x42, 0xB1, 0xC1, 0x15, 0x52, 0xD1, 0xF0, 0x24, 0x33, 0x62, 0x72, 0x82, 0x09, 0x0A, 0x16, 0x17, 0x18, 0x19, 0x1A, 0x25, 0x26, 0x27, 0x28, 0x29, 0x2A, 0x34, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3A, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48, 0x49, 0x4A, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5A, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68, 0x69, 0x6A, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7A, 0x83, 0x84, 0x85, 0x86, 0x87, 0x88, 0x89, 0x8A, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9A, 0xA2, 0xA3, 0xA4, 0xA5, 0xA6, 0xA7, 0xA8, 0xA9, 0xAA, 0xB2, 0xB3, 0xB4, 0xB5, 0xB6, 0xB7, 0xB8, 0xB9, 0xBA, 0xC2, 0xC3, 0xC4, 0xC5, 0xC6, 0xC7, 0xC8, 0xC9, 0xCA, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8, 0xD9, 0xDA, 0xE1, 0xE2, 0xE3, 0xE4, 0xE5, 0xE6, 0xE7, 0xE8, 0xE9, 0xEA, 0xF1, 0xF2, 0xF3, 0xF4, 0xF5, 0xF6, 0xF7, 0xF8, 0xF9, 0xFA,  # DHT (continued)
-                            0xFF, 0xDA, 0x00, 0x08, 0x01, 0x01, 0x00, 0x00, 0x3F, 0x00, 0x37, 0x7F, 0xFF, 0xD9  # SOS + EOI
-                        ])
-                        
-                        buffer = io.BytesIO(one_pixel)
-                        file_name = f"placeholder_{self.Video_id}.jpg"
-                        self.Thumbnail.save(file_name, ContentFile(buffer.read()), save=False)
-                        print(f"Created 1x1 pixel fallback thumbnail: {file_name}")
-                        return False
-                    except Exception as pixel_error:
-                        print(f"Even 1x1 pixel creation failed: {pixel_error}")
-                        
-                        # Absolute last resort - use a pre-defined base64 encoded green pixel
-                        try:
-                            print("Attempting base64 encoded fallback")
-                            import base64
-                            # This is a base64 encoded 1x1 green pixel JPG
-                            base64_jpg = '/9j/4AAQSkZJRgABAQEASABIAAD/2wBDAAEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQH/2wBDAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQH/wAARCAABAAEDAREAAhEBAxEB/8QAFAABAAAAAAAAAAAAAAAAAAAACv/EABQQAQAAAAAAAAAAAAAAAAAAAAD/xAAUAQEAAAAAAAAAAAAAAAAAAAAA/8QAFBEBAAAAAAAAAAAAAAAAAAAAAP/aAAwDAQACEQMRAD8AN/8A/9k='
-                            binary_data = base64.b64decode(base64_jpg)
-                            buffer = io.BytesIO(binary_data)
-                            file_name = f"placeholder_{self.Video_id}.jpg"
-                            self.Thumbnail.save(file_name, ContentFile(buffer.read()), save=False)
-                            print(f"Created base64 fallback thumbnail: {file_name}")
-                            return False
-                        except Exception as base64_error:
-                            print(f"Even base64 fallback failed: {base64_error}")
-                            # At this point, there's nothing more we can do
-                            return False
+                if temp_thumb_path and os.path.exists(temp_thumb_path):
+                    os.unlink(temp_thumb_path)
+            except Exception as cleanup_error:
+                logger.warning(f"Error cleaning up: {cleanup_error}")
+            # Point at the placeholder shared by all videos without a usable frame,
+            # rather than uploading a copy of it for every video and every retry
+            try:
+                self.Thumbnail.name = failed_thumbnail_name()
+                logger.info(f"Using placeholder thumbnail {self.Thumbnail.name} for video {self.Video_id}")
             except Exception as e2:
-                print(f"Even placeholder creation failed: {e2}")
-                return False
+                logger.error(f"Even placeholder creation failed for video {self.Video_id}: {e2}")
+            return False
 
 class Detection(models.Model):
     """Detection results from video analysis"""
@@ -583,6 +411,29 @@ class DeepFakeDetection(models.Model):
     detection_method = models.CharField(max_length=255, default='dnn_face')
     model_version = models.CharField(max_length=50, default='1.0')
     created_at = models.DateTimeField(auto_now_add=True)
+    timeline = models.BinaryField(null=True, blank=True, help_text="Packed per-frame probabilities (see api.timeline)")
+
+class ThumbnailTask(models.Model):
+    """Durable record of a video's background thumbnail generation (see api.thumbnail_queue)"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, related_name='thumbnail_task')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.IntegerField(default=0)
+    source_path = models.TextField(blank=True, default='', help_text="Local copy of the upload, if it is still on this host")
+    last_error = models.TextField(blank=True, default='')
+    retry_at = models.DateTimeField(null=True, blank=True, help_text="Earliest time a failed task may be retried")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
 class Analysis(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
@@ -0,0 +1,112 @@
+"""
+Presigned URL service.
+
+A presigned URL normally changes on every call, so a browser or CDN can
+never reuse a cached thumbnail. Here time is split into fixed windows
+(PRESIGN_WINDOW seconds) and every URL signed during a window expires at
+the same instant: the end of the window plus PRESIGN_GRACE, so that a URL
+handed out just before the window ends stays valid for at least the grace
+period. URLs are cached per key until the window ends, so within a window
+every response carries byte-identical URLs. With the default (query
+string, expiry-timestamp) signatures, processes that do not share the
+cache normally produce the same URLs too.
+
+presign_many() signs a whole page of keys with one cache round trip.
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .s3 import bucket_name, get_s3_client
+
+logger = logging.getLogger(__name__)
+
+
+def _window():
+    return max(60, int(getattr(settings, 'PRESIGN_WINDOW', 3600)))
+
+
+def _grace():
+    return max(0, int(getattr(settings, 'PRESIGN_GRACE', 3600)))
+
+
+def window_bounds(now=None):
+    """(start, expiry) of the window containing `now`, as Unix timestamps"""
+    now = int(now if now is not None else time.time())
+    window = _window()
+    start = now - now % window
+    return start, start + window + _grace()
+
+
+def storage_key(storage, name):
+    """The S3 object key of a stored file name, including the storage's location prefix"""
+    if hasattr(storage, '_normalize_name'):
+        from storages.utils import clean_name
+        return storage._normalize_name(clean_name(name))
+    return name
+
+
+def _cache_key(bucket, key, start):
+    digest = hashlib.sha1(f"{bucket}/{key}".encode('utf-8')).hexdigest()
+    return f"presign:{start}:{digest}"
+
+
+def _sign(client, bucket, key, expires_at):
+    # ExpiresIn is relative; counting it back from the shared expiry makes the
+    # absolute Expires (and so the signature) the same for every call in the window
+    expires_in = max(1, expires_at - int(time.time()))
+    return client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': bucket, 'Key': key},
+        ExpiresIn=expires_in
+    )
+
+
+def presign_many(keys, bucket=None):
+    """
+    Signed GET URLs for many S3 keys at once, as {key: url}. Cached URLs are
+    fetched with one get_many; the rest are signed locally (no request to
+    S3) and stored with one set_many. Keys that fail to sign are left out.
+    """
+    keys = [key for key in dict.fromkeys(keys) if key]
+    if not keys:
+        return {}
+    bucket = bucket or bucket_name()
+    start, expires_at = window_bounds()
+    cache_keys = {key: _cache_key(bucket, key, start) for key in keys}
+
+    cached = cache.get_many(list(cache_keys.values()))
+    urls = {}
+    missing = {}
+    for key, cache_key in cache_keys.items():
+        if cache_key in cached:
+            urls[key] = cached[cache_key]
+        else:
+            missing[key] = cache_key
+
+    if missing:
+        client = get_s3_client()
+        signed = {}
+        for key, cache_key in missing.items():
+            try:
+                urls[key] = signed[cache_key] = _sign(client, bucket, key, expires_at)
+            except Exception as e:
+                logger.warning(f"Could not presign {key}: {e}")
+        if signed:
+            # Keep each URL only until its window ends, when a new one is due
+            cache.set_many(signed, timeout=max(1, start + _window() - int(time.time())))
+    return urls
+
+
+def presign(key, bucket=None):
+    """Signed GET URL for one S3 key, stable within the current window; None on failure"""
+    return presign_many([key], bucket).get(key)
+
+
+def expires_in(now=None):
+    """Seconds until URLs signed now expire"""
+    now = int(now if now is not None else time.time())
+    return window_bounds(now)[1] - now
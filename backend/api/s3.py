@@ -0,0 +1,95 @@
+"""
+Process-wide S3 clients.
+
+Building a boto3 session or client resolves credentials, loads the service
+model and starts a new connection pool, so doing it per request (or per
+serialized video) pays for all of that plus a TLS handshake every time.
+get_s3_client() builds one client per process, with a connection pool
+sized for the web server's threads, TCP keep-alive, standard retries and
+bounded timeouts, and every view and serializer shares it. boto3 clients
+are thread-safe; a forked process gets its own client.
+
+http_session() does the same for plain HTTP fetches of signed URLs (the
+image proxy).
+"""
+import logging
+import os
+import threading
+
+import boto3
+import requests
+from botocore.config import Config
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_pid = None
+_http = None
+_http_pid = None
+_lock = threading.Lock()
+
+
+def client_config():
+    """botocore Config for the shared client, from the AWS_S3_* pool, timeout and retry settings"""
+    return Config(
+        max_pool_connections=getattr(settings, 'AWS_S3_MAX_POOL_CONNECTIONS', 50),
+        connect_timeout=getattr(settings, 'AWS_S3_CONNECT_TIMEOUT', 5),
+        read_timeout=getattr(settings, 'AWS_S3_READ_TIMEOUT', 30),
+        retries={
+            'max_attempts': getattr(settings, 'AWS_S3_MAX_ATTEMPTS', 3),
+            'mode': 'standard'
+        },
+        tcp_keepalive=True
+    )
+
+
+def region_name():
+    return getattr(settings, 'AWS_S3_REGION_NAME', None) or os.environ.get('AWS_S3_REGION_NAME', 'us-west-2')
+
+
+def bucket_name():
+    return getattr(settings, 'AWS_STORAGE_BUCKET_NAME', None) or os.environ.get('AWS_STORAGE_BUCKET_NAME', 'true-vision')
+
+
+def get_s3_client():
+    """The shared S3 client, created on first use in each process"""
+    global _client, _client_pid
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            session = boto3.session.Session(
+                aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+                aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
+                region_name=region_name()
+            )
+            _client = session.client(
+                's3',
+                endpoint_url=getattr(settings, 'AWS_S3_CLIENT_ENDPOINT_URL', None),
+                config=client_config()
+            )
+            _client_pid = os.getpid()
+            logger.info(f"Created shared S3 client for {region_name()}")
+        return _client
+
+
+def http_session():
+    """A shared requests session with a pooled, keep-alive connection adapter"""
+    global _http, _http_pid
+    with _lock:
+        if _http is None or _http_pid != os.getpid():
+            pool_size = getattr(settings, 'AWS_S3_MAX_POOL_CONNECTIONS', 50)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            _http = requests.Session()
+            _http.mount('https://', adapter)
+            _http.mount('http://', adapter)
+            _http_pid = os.getpid()
+        return _http
+
+
+def reset():
+    """Drop the shared clients, e.g. after changing credentials"""
+    global _client, _http
+    with _lock:
+        _client = None
+        _http = None
@@ -125,6 +125,13 @@ class AnalysisSerializer(serializers.ModelSerializer):
 from rest_framework import serializers
 from .models import Analysis,CustomUser, Video
 import json
+from .thumbnail_queue import is_pending_thumbnail
+from .thumbnails import pick_rendition
+from .presign import presign, presign_many, storage_key
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
 
 class AnalysisSerializer(serializers.ModelSerializer):
     result_data = serializers.SerializerMethodField()
@@ -153,61 +160,42 @@ class CustomUserSerializer(serializers.ModelSerializer):
         )
         return user
 
+class VideoListSerializer(serializers.ListSerializer):
+    """Signs the URLs of a whole page of videos in one batch (see api.presign)"""
+    
+    def to_representation(self, data):
+        videos = list(data.all() if hasattr(data, 'all') else data)
+        self.child.presigned = presign_many(key for video in videos for key in self.child.url_keys(video))
+        return super().to_representation(videos)
+
 class VideoSerializer(serializers.ModelSerializer):
     thumbnail_url = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
+    thumbnail_preview = serializers.SerializerMethodField()
+    thumbnail_pending = serializers.SerializerMethodField()
     video_url = serializers.SerializerMethodField()
     user = serializers.SerializerMethodField()
     upload_date = serializers.SerializerMethodField()
     
     class Meta:
         model = Video
-        fields = ['Video_id', 'user', 'video_url', 'thumbnail_url', 'Resolution', 
+        fields = ['Video_id', 'user', 'video_url', 'thumbnail_url', 'thumbnail_srcset', 'thumbnail_preview', 'thumbnail_pending', 'Resolution', 
                   'Length', 'size', 'upload_date', 'isAnalyzed', 'Frame_per_Second']
+        list_serializer_class = VideoListSerializer
     
     def get_thumbnail_url(self, obj):
         if obj.Thumbnail:
             # Get the full URL path including domain
             request = self.context.get('request')
-            thumbnail_url = None
             
-            # First try to get a pre-signed URL for S3
-            try:
-                import boto3
-                from botocore.exceptions import ClientError
-                import os
-                from django.conf import settings
-                
-                # Extract the key from the Thumbnail URL
-                thumbnail_key = obj.Thumbnail.name
-                print(f"Thumbnail key for video {obj.Video_id}: {thumbnail_key}")
-                
-                # Create a boto3 session
-                session = boto3.session.Session(
-                    aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-                    aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-                    region_name=os.environ.get('AWS_S3_REGION_NAME', 'us-west-2')
-                )
-                
-                s3_client = session.client('s3')
-                
-                # Get the bucket name
-                bucket_name = os.environ.get('AWS_STORAGE_BUCKET_NAME', 'true-vision')
-                
-                # Generate a signed URL that lasts for 3600 seconds (1 hour)
-                signed_url = s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={
-                        'Bucket': bucket_name,
-                        'Key': thumbnail_key
-                    },
-                    ExpiresIn=3600
-                )
-                
-                thumbnail_url = signed_url
-                print(f"Generated signed URL for thumbnail {obj.Video_id}: {thumbnail_url}")
-                
-            except Exception as e:
-                print(f"Error generating signed URL for thumbnail {obj.Video_id}: {str(e)}")
+            # The smallest adequate rendition, or the full thumbnail for older videos
+            thumbnail_key = self._thumbnail_key(obj)
+            logger.debug(f"Thumbnail key for video {obj.Video_id}: {thumbnail_key}")
+            
+            # First try a pre-signed URL for S3, stable for the current window (see api.presign)
+            thumbnail_url = self._signed_url(thumbnail_key)
+            if thumbnail_url is None:
+                logger.warning(f"Error generating signed URL for thumbnail {obj.Video_id}")
                 # Fall back to regular URL if signed URL generation fails
                 if request is not None and not obj.Thumbnail.url.startswith(('http://', 'https://')):
                     thumbnail_url = request.build_absolute_uri(obj.Thumbnail.url)
@@ -217,50 +205,83 @@ class VideoSerializer(serializers.ModelSerializer):
             return thumbnail_url
         return None
     
+    def _thumbnail_width(self):
+        """Display width the client asked for with ?thumb_width=, in pixels"""
+        request = self.context.get('request')
+        try:
+            return int(request.query_params.get('thumb_width'))
+        except (AttributeError, TypeError, ValueError):
+            return getattr(settings, 'THUMBNAIL_DEFAULT_WIDTH', 240)
+    
+    def _thumbnail_format(self):
+        """WebP unless the client asked for ?thumb_format=jpg"""
+        request = self.context.get('request')
+        requested = getattr(request, 'query_params', {}).get('thumb_format') if request is not None else None
+        return 'jpg' if requested in ('jpg', 'jpeg') else 'webp'
+    
+    def _thumbnail_key(self, obj):
+        renditions = obj.get_thumbnail_renditions()
+        name = pick_rendition(renditions, self._thumbnail_width(), self._thumbnail_format()) or obj.Thumbnail.name
+        return storage_key(obj.Thumbnail.storage, name)
+    
+    def _srcset_keys(self, obj):
+        """(width, S3 key) of each rendition in the requested format"""
+        if not obj.Thumbnail or is_pending_thumbnail(obj.Thumbnail.name):
+            return []
+        ext = self._thumbnail_format()
+        return [
+            (r['width'], storage_key(obj.Thumbnail.storage, r[ext]))
+            for r in obj.get_thumbnail_renditions() if r.get(ext)
+        ]
+    
+    def url_keys(self, obj):
+        """Every S3 key this video's representation needs signed"""
+        keys = []
+        if obj.Thumbnail:
+            keys.append(self._thumbnail_key(obj))
+            keys.extend(key for _, key in self._srcset_keys(obj))
+        if obj.Video_File:
+            keys.append(storage_key(obj.Video_File.storage, obj.Video_File.name))
+        return keys
+    
+    def _signed_url(self, key):
+        """URL from the batch VideoListSerializer signed for the page, else signed now"""
+        presigned = getattr(self, 'presigned', None)
+        if presigned is not None and key in presigned:
+            return presigned[key]
+        return presign(key)
+    
+    def get_thumbnail_srcset(self, obj):
+        """`srcset` of signed rendition URLs, so an <img> can pick its own size"""
+        entries = []
+        for width, key in self._srcset_keys(obj):
+            url = self._signed_url(key)
+            if url is None:
+                return None
+            entries.append(f"{url} {width}w")
+        return ', '.join(entries) or None
+    
+    def get_thumbnail_preview(self, obj):
+        """Inline data URI to show until thumbnail_url has loaded; costs no extra request"""
+        return obj.Thumbnail_preview or None
+    
+    def get_thumbnail_pending(self, obj):
+        """True while the thumbnail is still being generated in the background"""
+        return is_pending_thumbnail(obj.Thumbnail.name if obj.Thumbnail else None)
+    
     def get_video_url(self, obj):
         if obj.Video_File:
             # Get the full URL path
             request = self.context.get('request')
-            video_url = None
             
-            # First try to get a pre-signed URL for S3
-            try:
-                import boto3
-                from botocore.exceptions import ClientError
-                import os
-                from django.conf import settings
-                
-                # Extract the key from the Video File URL
-                video_key = obj.Video_File.name
-                print(f"Video key for video {obj.Video_id}: {video_key}")
-                
-                # Create a boto3 session
-                session = boto3.session.Session(
-                    aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-                    aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-                    region_name=os.environ.get('AWS_S3_REGION_NAME', 'us-west-2')
-                )
-                
-                s3_client = session.client('s3')
-                
-                # Get the bucket name
-                bucket_name = os.environ.get('AWS_STORAGE_BUCKET_NAME', 'true-vision')
-                
-                # Generate a signed URL that lasts for 3600 seconds (1 hour)
-                signed_url = s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={
-                        'Bucket': bucket_name,
-                        'Key': video_key
-                    },
-                    ExpiresIn=3600
-                )
-                
-                video_url = signed_url
-                print(f"Generated signed URL for video {obj.Video_id}: {video_url}")
-                
-            except Exception as e:
-                print(f"Error generating signed URL for video {obj.Video_id}: {str(e)}")
+            # Extract the key from the Video File URL
+            video_key = storage_key(obj.Video_File.storage, obj.Video_File.name)
+            logger.debug(f"Video key for video {obj.Video_id}: {video_key}")
+            
+            # First try a pre-signed URL for S3, stable for the current window (see api.presign)
+            video_url = self._signed_url(video_key)
+            if video_url is None:
+                logger.warning(f"Error generating signed URL for video {obj.Video_id}")
                 # Fall back to regular URL if signed URL generation fails
                 if request is not None and not obj.Video_File.url.startswith(('http://', 'https://')):
                     video_url = request.build_absolute_uri(obj.Video_File.url)
@@ -0,0 +1,209 @@
+"""
+Bounded-memory spooling of video files to local disk.
+
+ffprobe, ffmpeg and OpenCV need a local path, while videos live in S3 or
+arrive as Django uploads. spool_to_tempfile copies a file to a temporary
+file one fixed-size chunk at a time, hashing it on the way, so memory use
+does not depend on the size of the video. Uploads Django already spooled
+to disk are used in place instead of being copied.
+
+Readers that only need a few frames can skip the copy altogether:
+ranged_source gives OpenCV/ffmpeg a path or a signed S3 URL, which they
+read with HTTP range requests.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+
+from django.core.files.uploadedfile import UploadedFile
+
+logger = logging.getLogger(__name__)
+
+# Bytes held in memory at a time while copying or hashing
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+# Leading bytes kept for file type sniffing
+HEAD_SIZE = 64
+
+
+class SpooledVideo:
+    """
+    A video available at a local `path`, with its `size`, `sha256` hex digest
+    and first HEAD_SIZE bytes. close() removes the file if it was created by
+    spool_to_tempfile; use it as a context manager to do that automatically.
+    """
+
+    def __init__(self, path, size, sha256, head, owned):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.head = head
+        self.owned = owned
+
+    def close(self):
+        if self.owned and self.path and os.path.exists(self.path):
+            try:
+                os.unlink(self.path)
+            except OSError as e:
+                logger.warning(f"Failed to remove spooled file {self.path}: {e}")
+        self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _local_path(django_file):
+    """Path of a file that is already on local disk, or None"""
+    # TemporaryUploadedFile (possibly still wrapped by an unsaved FieldFile):
+    # Django spooled the upload to disk already
+    for candidate in (django_file, getattr(django_file, '_file', None)):
+        if hasattr(candidate, 'temporary_file_path'):
+            return candidate.temporary_file_path()
+    # FieldFile on FileSystemStorage
+    try:
+        path = django_file.path
+    except (AttributeError, NotImplementedError, ValueError):
+        return None
+    return path if os.path.exists(path) else None
+
+
+def _s3_chunks(django_file, chunk_size):
+    """
+    Stream a FieldFile stored in S3 straight from the object body. Reading
+    through the storage's file object would first buffer the whole object.
+    Returns None when the file is not in an S3 storage or is still an upload.
+    """
+    storage = getattr(django_file, 'storage', None)
+    if storage is None or not hasattr(storage, 'bucket') or not getattr(django_file, '_committed', True):
+        return None
+    try:
+        from storages.utils import clean_name
+        key = storage._normalize_name(clean_name(django_file.name))
+        body = storage.bucket.Object(key).get()['Body']
+    except Exception as e:
+        logger.warning(f"Could not stream {django_file.name} from S3, falling back to the storage file: {e}")
+        return None
+    return body.iter_chunks(chunk_size)
+
+
+def ranged_source(django_file, expires=3600):
+    """
+    Something OpenCV or ffmpeg can open without the whole file being copied
+    first: the local path of a stored file, or a signed URL of an S3 object
+    (read with HTTP range requests). Returns None for anything else.
+    """
+    path = _local_path(django_file)
+    if path is not None:
+        return path
+    storage = getattr(django_file, 'storage', None)
+    if storage is None or not hasattr(storage, 'bucket') or not getattr(django_file, '_committed', True):
+        return None
+    try:
+        from storages.utils import clean_name
+        key = storage._normalize_name(clean_name(django_file.name))
+        return storage.bucket.meta.client.generate_presigned_url(
+            'get_object', Params={'Bucket': storage.bucket.name, 'Key': key}, ExpiresIn=expires
+        )
+    except Exception as e:
+        logger.warning(f"Could not sign a URL for {django_file.name}: {e}")
+        return None
+
+
+def _hash_file(path, chunk_size):
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            if size < HEAD_SIZE:
+                head += chunk[:HEAD_SIZE - size]
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest(), head
+
+
+def spool_to_tempfile(django_file, suffix=None, chunk_size=SPOOL_CHUNK_SIZE, copy=False):
+    """
+    Make `django_file` (an upload or a FieldFile) available as a local file
+    and return a SpooledVideo. At most `chunk_size` bytes are held in memory.
+    With copy=True files already on local disk are copied too, so the result
+    always owns its file and may outlive the upload.
+    """
+    if suffix is None:
+        suffix = os.path.splitext(django_file.name or '')[1]
+
+    path = None if copy else _local_path(django_file)
+    if path is not None:
+        size, sha256, head = _hash_file(path, chunk_size)
+        logger.info(f"Using local file {path} ({size} bytes)")
+        return SpooledVideo(path, size, sha256, head, owned=False)
+
+    chunks = _s3_chunks(django_file, chunk_size)
+    if chunks is None:
+        chunks = django_file.chunks(chunk_size)
+
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+        try:
+            for chunk in chunks:
+                if size < HEAD_SIZE:
+                    head += chunk[:HEAD_SIZE - size]
+                digest.update(chunk)
+                temp_file.write(chunk)
+                size += len(chunk)
+        except Exception:
+            temp_file.close()
+            os.unlink(temp_file.name)
+            raise
+    logger.info(f"Spooled {django_file.name} to {temp_file.name} ({size} bytes)")
+
+    # Leave uploads readable from the start for whoever stores them next
+    if hasattr(django_file, 'seek'):
+        try:
+            django_file.seek(0)
+        except Exception:
+            pass
+    return SpooledVideo(temp_file.name, size, digest.hexdigest(), head, owned=True)
+
+
+def adopt_tempfile(path, chunk_size=SPOOL_CHUNK_SIZE):
+    """
+    SpooledVideo owning a file that an earlier spool_to_tempfile(copy=True)
+    left on disk, e.g. for a background task. Returns None if it is gone.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    size, sha256, head = _hash_file(path, chunk_size)
+    return SpooledVideo(path, size, sha256, head, owned=True)
+
+
+class SpooledUpload(UploadedFile):
+    """
+    An upload backed by a SpooledVideo, for work that outlives the request
+    (Django deletes its own temporary upload files when the request ends).
+    Like TemporaryUploadedFile it exposes temporary_file_path(), so the file
+    is used in place instead of being spooled again. close() removes it.
+    """
+
+    def __init__(self, spooled, name, content_type=None):
+        super().__init__(open(spooled.path, 'rb'), name, content_type, spooled.size)
+        self.spooled = spooled
+
+    def temporary_file_path(self):
+        return self.spooled.path
+
+    def close(self):
+        try:
+            self.file.close()
+        finally:
+            self.spooled.close()
@@ -0,0 +1,186 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.admission import BULK, INTERACTIVE, AdmissionRejected, DetectionGovernor, _FairQueue, _Waiter
+from api.models import CustomUser
+from api.views import DeepFakeDetectionView, acquire_detection_slot, admission_rejected_response
+
+
+class RetryAfterTests(SimpleTestCase):
+
+    def test_full_queue_is_rejected_with_429(self):
+        governor = DetectionGovernor(process_slots=1, max_queue=0)
+        with governor.acquire(user=1):
+            with self.assertRaises(AdmissionRejected) as cm:
+                governor.acquire(user=2)
+        self.assertEqual(cm.exception.status_code, 429)
+        # One average detection (30s before any has finished) ahead of the caller
+        self.assertEqual(cm.exception.retry_after, 30)
+        self.assertEqual(governor.stats()['rejected_queue_full'], 1)
+
+    def test_queue_timeout_is_rejected_with_503(self):
+        governor = DetectionGovernor(process_slots=1, max_queue=4, queue_timeout=0.05)
+        with governor.acquire(user=1):
+            with self.assertRaises(AdmissionRejected) as cm:
+                governor.acquire(user=2)
+        self.assertEqual(cm.exception.status_code, 503)
+        self.assertGreaterEqual(cm.exception.retry_after, 1)
+        stats = governor.stats()
+        self.assertEqual((stats['rejected_timeout'], stats['queue_depth']), (1, 0))
+
+    def test_retry_after_scales_with_the_queue(self):
+        governor = DetectionGovernor(process_slots=2, max_queue=2, queue_timeout=5)
+        tickets = [governor.acquire(user=u) for u in (1, 2)]
+        waiters = [threading.Thread(target=lambda u=u: governor.acquire(user=u).release()) for u in (3, 4)]
+        for t in waiters:
+            t.start()
+        while governor.stats()['queue_depth'] < 2:
+            time.sleep(0.001)
+        with self.assertRaises(AdmissionRejected) as cm:
+            governor.acquire(user=5)
+        # Two waiting plus the caller, over two slots
+        self.assertEqual(cm.exception.retry_after, 45)
+        for ticket in tickets:
+            ticket.release()
+        for t in waiters:
+            t.join(5)
+
+    def test_retry_after_follows_detection_times(self):
+        governor = DetectionGovernor(process_slots=1, max_queue=0)
+        governor.acquire(user=1).release()
+        with governor.acquire(user=1):
+            with self.assertRaises(AdmissionRejected) as cm:
+                governor.acquire(user=2)
+        # The moving average moved a fifth of the way towards the near-zero run time
+        self.assertIn(cm.exception.retry_after, (24, 25))
+
+    def test_response_carries_the_header(self):
+        response = admission_rejected_response(AdmissionRejected("busy", 503, 12))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '12')
+        self.assertEqual(response.data, {'success': False, 'error': 'busy', 'retry_after': 12})
+
+    def test_acquire_detection_slot(self):
+        governor = DetectionGovernor(process_slots=1, max_queue=0)
+        request = mock.Mock(user=mock.Mock(pk=7))
+        with mock.patch('api.views.get_detection_governor', return_value=governor):
+            ticket, rejected = acquire_detection_slot(request)
+            self.assertIsNone(rejected)
+            self.assertEqual(ticket.user, 7)
+            other, rejected = acquire_detection_slot(mock.Mock(user=mock.Mock(pk=8)))
+            self.assertIsNone(other)
+            self.assertEqual(rejected.status_code, 429)
+            self.assertEqual(rejected['Retry-After'], '30')
+            ticket.release()
+
+
+class DetectionRequestValidationTests(SimpleTestCase):
+
+    def post(self, data):
+        request = APIRequestFactory().post('/api/detect/', data, format='multipart')
+        force_authenticate(request, user=CustomUser(pk=1, username='alice'))
+        return DeepFakeDetectionView.as_view()(request)
+
+    def test_non_integer_video_id_is_a_400(self):
+        with mock.patch('api.views.get_detection_governor') as governor:
+            response = self.post({'video_id': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'video_id must be an integer'})
+        # Rejected before taking a detection slot
+        governor.assert_not_called()
+
+    def test_missing_video_is_a_400(self):
+        response = self.post({})
+        self.assertEqual(response.status_code, 400)
+
+
+class FairQueueTests(SimpleTestCase):
+
+    def drain(self, queue, eligible=lambda user: True):
+        order = []
+        while True:
+            waiter = queue.pop(eligible)
+            if waiter is None:
+                return order
+            order.append(waiter.user)
+
+    def queue(self, requests, quantum=30):
+        queue = _FairQueue(quantum)
+        for user, cost in requests:
+            queue.push(_Waiter(user, INTERACTIVE, cost))
+        return queue
+
+    def test_equal_costs_alternate_between_users(self):
+        queue = self.queue([('a', 30)] * 3 + [('b', 30)])
+        self.assertEqual(self.drain(queue), ['a', 'b', 'a', 'a'])
+        self.assertEqual(queue.size, 0)
+
+    def test_long_videos_wait_for_more_rounds(self):
+        queue = self.queue([('a', 90)] + [('b', 30)] * 3)
+        self.assertEqual(self.drain(queue), ['b', 'b', 'a', 'b'])
+
+    def test_ineligible_users_are_skipped(self):
+        queue = self.queue([('a', 30), ('b', 30), ('a', 30)])
+        self.assertEqual(self.drain(queue, eligible=lambda user: user != 'a'), ['b'])
+        self.assertEqual(self.drain(queue), ['a', 'a'])
+
+    def test_idle_users_do_not_bank_credit(self):
+        queue = self.queue([('a', 10)])
+        self.drain(queue)
+        self.assertNotIn('a', queue.deficits)
+
+    def test_remove(self):
+        waiter = _Waiter('a', INTERACTIVE, 30)
+        queue = self.queue([('b', 30)])
+        queue.push(waiter)
+        queue.remove(waiter)
+        queue.remove(waiter)
+        self.assertEqual((queue.size, list(queue.queues)), (1, ['b']))
+
+
+class GovernorOrderingTests(SimpleTestCase):
+
+    def grant_order(self, requests, **kwargs):
+        """Queue `requests` (user, priority, cost) behind a running detection, return the order they run in"""
+        governor = DetectionGovernor(process_slots=1, max_queue=len(requests), queue_timeout=5, **kwargs)
+        running = governor.acquire(user='holder')
+        order = []
+        lock = threading.Lock()
+
+        def run(user, priority, cost):
+            with governor.acquire(user=user, priority=priority, cost=cost):
+                with lock:
+                    order.append(user)
+
+        threads = []
+        for request in requests:
+            threads.append(threading.Thread(target=run, args=request))
+            threads[-1].start()
+            # Enqueue in a known order
+            while governor.stats()['queue_depth'] < len(threads):
+                time.sleep(0.001)
+        running.release()
+        for t in threads:
+            t.join(5)
+        return order
+
+    def test_uploads_run_before_reanalysis(self):
+        order = self.grant_order([('a', BULK, 30), ('b', BULK, 30), ('c', INTERACTIVE, 30)])
+        self.assertEqual(order, ['c', 'a', 'b'])
+
+    def test_users_share_slots_fairly(self):
+        order = self.grant_order([('a', INTERACTIVE, 30)] * 3 + [('b', INTERACTIVE, 30)])
+        self.assertEqual(order, ['a', 'b', 'a', 'a'])
+
+    def test_user_slots(self):
+        governor = DetectionGovernor(process_slots=2, user_slots=1, max_queue=1, queue_timeout=0.05)
+        with governor.acquire(user='a'):
+            # A slot is free, but user a is already running a detection
+            with self.assertRaises(AdmissionRejected):
+                governor.acquire(user='a')
+            with governor.acquire(user='b'):
+                self.assertEqual(governor.stats()['active_users'], 2)
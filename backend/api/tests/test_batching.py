@@ -0,0 +1,128 @@
+import threading
+import time
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from api.batching import MicroBatcher
+
+
+class Recorder:
+    """Batch function that doubles its items and remembers every batch"""
+
+    def __init__(self, fail=False, gate=None):
+        self.batches = []
+        self.fail = fail
+        self.gate = gate
+
+    def __call__(self, items):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(list(items))
+        if self.fail:
+            raise RuntimeError("model failed")
+        return [item * 2 for item in items]
+
+
+class MicroBatcherTests(SimpleTestCase):
+
+    def test_results_are_split_per_request(self):
+        fn = Recorder()
+        batcher = MicroBatcher(fn, max_batch_size=8, max_wait=0.2)
+        futures = [batcher.submit([1, 2]), batcher.submit([3]), batcher.submit([4, 5])]
+        self.assertEqual([f.result(5) for f in futures], [[2, 4], [6], [8, 10]])
+        self.assertEqual(fn.batches, [[1, 2, 3, 4, 5]])
+
+    def test_flushes_when_full_without_waiting(self):
+        fn = Recorder()
+        batcher = MicroBatcher(fn, max_batch_size=4, max_wait=10)
+        started = time.monotonic()
+        futures = [batcher.submit([i, i]) for i in range(2)]
+        self.assertEqual([f.result(5) for f in futures], [[0, 0], [2, 2]])
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(fn.batches, [[0, 0, 1, 1]])
+
+    def test_flushes_a_partial_batch_after_max_wait(self):
+        fn = Recorder()
+        batcher = MicroBatcher(fn, max_batch_size=16, max_wait=0.05)
+        started = time.monotonic()
+        self.assertEqual(batcher([7]), [14])
+        waited = time.monotonic() - started
+        self.assertGreaterEqual(waited, 0.04)
+        self.assertLess(waited, 2)
+        stats = batcher.stats()
+        self.assertEqual((stats['batches'], stats['items'], stats['largest_batch']), (1, 1, 1))
+        self.assertAlmostEqual(stats['fill_rate'], 1 / 16)
+
+    def test_batch_never_exceeds_max_size(self):
+        gate = threading.Event()
+        fn = Recorder(gate=gate)
+        batcher = MicroBatcher(fn, max_batch_size=4, max_wait=0.05)
+        # The first batch holds the worker so the rest queue up behind it
+        first = batcher.submit([0])
+        time.sleep(0.1)
+        futures = [batcher.submit([i] * 3) for i in range(1, 4)]
+        gate.set()
+        first.result(5)
+        self.assertEqual([f.result(5) for f in futures], [[2] * 3, [4] * 3, [6] * 3])
+        self.assertTrue(all(len(batch) <= 4 for batch in fn.batches))
+
+    def test_oversized_request_runs_on_its_own(self):
+        fn = Recorder()
+        batcher = MicroBatcher(fn, max_batch_size=2, max_wait=0)
+        self.assertEqual(batcher([1, 2, 3]), [2, 4, 6])
+        self.assertEqual(fn.batches, [[1, 2, 3]])
+
+    def test_only_same_shape_items_share_a_batch(self):
+        seen = []
+
+        def fn(items):
+            seen.append({item.shape for item in items})
+            return [0.5] * len(items)
+
+        batcher = MicroBatcher(fn, max_batch_size=8, max_wait=0.1)
+        futures = [
+            batcher.submit([np.zeros((3, 4, 4))]),
+            batcher.submit([np.zeros((3, 2, 2))]),
+            batcher.submit([np.zeros((3, 4, 4))]),
+        ]
+        for f in futures:
+            f.result(5)
+        self.assertTrue(all(len(shapes) == 1 for shapes in seen))
+        self.assertEqual(len(seen), 2)
+
+    def test_errors_reach_every_caller_in_the_batch(self):
+        batcher = MicroBatcher(Recorder(fail=True), max_batch_size=2, max_wait=1)
+        futures = [batcher.submit([1]), batcher.submit([2])]
+        for f in futures:
+            with self.assertRaisesRegex(RuntimeError, 'model failed'):
+                f.result(5)
+        # The worker survives a failed batch
+        batcher.fn = Recorder()
+        self.assertEqual(batcher([3]), [6])
+
+    def test_wrong_result_count_is_an_error(self):
+        batcher = MicroBatcher(lambda items: [0.5], max_batch_size=2, max_wait=0)
+        with self.assertRaisesRegex(RuntimeError, '1 results for 2 items'):
+            batcher([1, 2])
+
+    def test_empty_request_resolves_immediately(self):
+        fn = Recorder()
+        batcher = MicroBatcher(fn)
+        self.assertEqual(batcher([]), [])
+        self.assertEqual(fn.batches, [])
+
+    def test_concurrent_callers(self):
+        batcher = MicroBatcher(Recorder(), max_batch_size=8, max_wait=0.01)
+        results = {}
+
+        def call(i):
+            results[i] = batcher([i, i + 100])
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(results, {i: [2 * i, 2 * (i + 100)] for i in range(20)})
+        self.assertEqual(batcher.stats()['items'], 40)
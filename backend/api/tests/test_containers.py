@@ -0,0 +1,234 @@
+import os
+import shutil
+import struct
+import tempfile
+
+import cv2
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.containers import ContainerProbe
+from api.models import CustomUser
+from api.views import VideoPreflightView
+
+
+def box(box_type, body=b''):
+    return struct.pack('>I4s', 8 + len(body), box_type) + body
+
+
+def full_box(box_type, body, version=0):
+    return box(box_type, bytes([version, 0, 0, 0]) + body)
+
+
+def mp4(width=640, height=360, timescale=600, duration=6000, samples=300, fourcc=b'avc1',
+        moov_last=False, mdat_size=64 * 1024, mdat=None):
+    """A minimal MP4: ftyp, a moov with one video track, and an mdat of zeros"""
+    mvhd = full_box(b'mvhd', struct.pack('>IIII', 0, 0, timescale, duration) + bytes(80))
+    tkhd = full_box(b'tkhd', bytes(72) + struct.pack('>II', width << 16, height << 16))
+    mdhd = full_box(b'mdhd', struct.pack('>IIII', 0, 0, timescale, duration) + bytes(4))
+    hdlr = full_box(b'hdlr', bytes(4) + b'vide' + bytes(12) + b'\x00')
+    stsd = full_box(b'stsd', struct.pack('>I', 1) + box(fourcc, bytes(78)))
+    stts = full_box(b'stts', struct.pack('>III', 1, samples, duration // samples))
+    stbl = box(b'stbl', stsd + stts)
+    mdia = box(b'mdia', mdhd + hdlr + box(b'minf', stbl))
+    moov = box(b'moov', mvhd + box(b'trak', tkhd + mdia))
+    ftyp = box(b'ftyp', b'isom' + bytes(4) + b'isomavc1')
+    mdat = mdat if mdat is not None else box(b'mdat', bytes(mdat_size))
+    return ftyp + (mdat + moov if moov_last else moov + mdat)
+
+
+def ebml(element_id, body):
+    """EBML element with an 8-byte size"""
+    return element_id + b'\x01' + len(body).to_bytes(7, 'big') + body
+
+
+UNKNOWN_SIZE = b'\x01\xff\xff\xff\xff\xff\xff\xff'
+
+
+def webm(width=1280, height=720, duration_ms=12500.0, frame_ns=33333333, codec=b'V_VP9', live=False):
+    """A minimal WebM: EBML header, Segment with Info, Tracks and a Cluster"""
+    header = ebml(b'\x1a\x45\xdf\xa3', ebml(b'\x42\x82', b'webm'))
+    info_body = ebml(b'\x2a\xd7\xb1', (1000000).to_bytes(3, 'big'))
+    if duration_ms is not None:
+        info_body += ebml(b'\x44\x89', struct.pack('>d', duration_ms))
+    video = ebml(b'\xe0', ebml(b'\xb0', width.to_bytes(2, 'big')) + ebml(b'\xba', height.to_bytes(2, 'big')))
+    entry = ebml(b'\x83', b'\x01') + ebml(b'\x86', codec) + ebml(b'\x23\xe3\x83', frame_ns.to_bytes(4, 'big')) + video
+    # An audio track first, which the probe must skip
+    audio = ebml(b'\xae', ebml(b'\x83', b'\x02') + ebml(b'\x86', b'A_OPUS'))
+    segment_body = (ebml(b'\x15\x49\xa9\x66', info_body)
+                    + ebml(b'\x16\x54\xae\x6b', audio + ebml(b'\xae', entry))
+                    + ebml(b'\x1f\x43\xb6\x75', bytes(4096)))
+    if live:
+        return header + b'\x18\x53\x80\x67' + UNKNOWN_SIZE + segment_body
+    return header + ebml(b'\x18\x53\x80\x67', segment_body)
+
+
+def probe(data, chunk=None):
+    p = ContainerProbe()
+    chunk = chunk or len(data)
+    for i in range(0, len(data), chunk):
+        p.feed(data[i:i + chunk])
+    return p
+
+
+class Mp4ProbeTests(SimpleTestCase):
+
+    def test_moov_before_mdat(self):
+        p = probe(mp4())
+        self.assertTrue(p.done)
+        self.assertEqual(p.details(), {
+            'format': 'mp4', 'duration': 10.0, 'width': 640, 'height': 360,
+            'fps': 30.0, 'codec': 'h264', 'frame_count': 300,
+        })
+
+    def test_byte_at_a_time(self):
+        self.assertEqual(probe(mp4(), chunk=1).details(), probe(mp4()).details())
+
+    def test_moov_after_mdat_is_found_by_streaming(self):
+        data = mp4(moov_last=True)
+        p = probe(data, chunk=4096)
+        self.assertEqual((p.duration, p.width, p.fps), (10.0, 640, 30.0))
+
+    def test_moov_after_mdat_is_found_in_the_tail(self):
+        data = mp4(moov_last=True, mdat_size=1024 * 1024)
+        p = ContainerProbe()
+        p.feed(data[:4096])
+        self.assertFalse(p.done)
+        # The rest of mdat can be skipped, parsing resumes at the moov box
+        self.assertEqual(p.next_offset(), data.index(b'moov') - 4)
+        tail = data[-8192:]
+        self.assertTrue(p.feed_at(tail, len(data) - len(tail)))
+        self.assertTrue(p.done)
+        self.assertEqual(p.details()['frame_count'], 300)
+
+    def test_tail_that_misses_the_moov(self):
+        data = mp4(moov_last=True, mdat_size=1024 * 1024)
+        p = ContainerProbe()
+        p.feed(data[:4096])
+        self.assertFalse(p.feed_at(data[-16:], len(data) - 16))
+        self.assertIsNone(p.details())
+
+    def test_unknown_codec_keeps_its_fourcc(self):
+        self.assertEqual(probe(mp4(fourcc=b'xyz ')).codec, 'xyz')
+
+    def test_64_bit_box_size(self):
+        mdat = struct.pack('>I4sQ', 1, b'mdat', 16 + 100) + bytes(100)
+        p = probe(mp4(moov_last=True, mdat=mdat), chunk=3)
+        self.assertEqual((p.width, p.frame_count), (640, 300))
+
+    def test_oversized_moov_is_not_buffered(self):
+        p = ContainerProbe(max_header_bytes=100)
+        p.feed(mp4())
+        self.assertTrue(p.done)
+        self.assertIsNone(p.details())
+
+    def test_corrupt_moov_gives_up(self):
+        data = bytearray(mp4())
+        # Claim the mvhd box is larger than the moov around it
+        mvhd = data.index(b'mvhd') - 4
+        data[mvhd:mvhd + 4] = struct.pack('>I', 10 ** 6)
+        p = probe(bytes(data))
+        self.assertTrue(p.done)
+        self.assertIsNone(p.details())
+
+    def test_unknown_container(self):
+        p = probe(b'RIFF\x00\x00\x00\x00AVI LIST' + bytes(100))
+        self.assertTrue(p.done)
+        self.assertIsNone(p.format)
+
+
+class EbmlProbeTests(SimpleTestCase):
+
+    def test_webm(self):
+        p = probe(webm(), chunk=7)
+        self.assertTrue(p.done)
+        details = p.details()
+        self.assertEqual(details['format'], 'webm')
+        self.assertEqual((details['width'], details['height'], details['codec']), (1280, 720, 'vp9'))
+        self.assertAlmostEqual(details['duration'], 12.5)
+        self.assertAlmostEqual(details['fps'], 30.0, places=3)
+        self.assertEqual(details['frame_count'], 375)
+
+    def test_live_recording_with_unknown_segment_size(self):
+        p = probe(webm(live=True))
+        self.assertEqual((p.width, p.height), (1280, 720))
+
+    def test_recording_without_duration(self):
+        p = probe(webm(duration_ms=None))
+        self.assertTrue(p.done)
+        self.assertIsNone(p.duration)
+        self.assertIsNone(p.details())
+
+    def test_matroska_codec_ids(self):
+        self.assertEqual(probe(webm(codec=b'V_MPEG4/ISO/AVC')).codec, 'h264')
+        self.assertEqual(probe(webm(codec=b'V_THEORA')).codec, 'V_THEORA')
+
+    def test_incomplete_header_waits_for_more(self):
+        data = webm()
+        p = probe(data[:60])
+        self.assertFalse(p.done)
+        self.assertIsNone(p.details())
+
+
+class EncodedVideoProbeTests(SimpleTestCase):
+    """The probe agrees with what OpenCV wrote"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.dir = tempfile.mkdtemp(prefix='probe-test-')
+        path = os.path.join(cls.dir, 'clip.mp4')
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 15, (320, 240))
+        for i in range(45):
+            writer.write(np.full((240, 320, 3), i * 5, dtype=np.uint8))
+        writer.release()
+        with open(path, 'rb') as f:
+            cls.data = f.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_opencv_mp4(self):
+        details = probe(self.data, chunk=1000).details()
+        self.assertEqual((details['width'], details['height']), (320, 240))
+        self.assertEqual((details['codec'], details['frame_count']), ('mpeg4', 45))
+        self.assertAlmostEqual(details['fps'], 15.0)
+        self.assertAlmostEqual(details['duration'], 3.0)
+
+
+@override_settings(VIDEO_MAX_UPLOAD_SIZE=5 * 1024 * 1024, VIDEO_MAX_DURATION=30)
+class PreflightViewTests(SimpleTestCase):
+
+    def post(self, size, **samples):
+        data = {'size': size}
+        for name, content in samples.items():
+            data[name] = SimpleUploadedFile(f'{name}.bin', content)
+        request = APIRequestFactory().post('/api/test/upload/preflight/', data, format='multipart')
+        force_authenticate(request, user=CustomUser(pk=1, username='alice'))
+        return VideoPreflightView.as_view()(request).data
+
+    def test_accepts_a_short_video_from_its_head(self):
+        data = mp4()
+        result = self.post(len(data), head=data[:4096])
+        self.assertEqual((result['accepted'], result['checked']), (True, True))
+        self.assertEqual((result['resolution'], result['duration']), ('640x360', 10.0))
+
+    def test_rejects_a_long_video_from_its_tail(self):
+        data = mp4(duration=60000, moov_last=True, mdat_size=512 * 1024)
+        result = self.post(len(data), head=data[:4096], tail=data[-8192:])
+        self.assertFalse(result['accepted'])
+        self.assertIn('too long', result['reasons'][0])
+
+    def test_rejects_a_large_file_without_samples(self):
+        result = self.post(6 * 1024 * 1024)
+        self.assertFalse(result['accepted'])
+        self.assertFalse(result['checked'])
+        self.assertIn('too large', result['reasons'][0])
+
+    def test_unreadable_header_is_left_to_ffprobe(self):
+        result = self.post(1000, head=b'not a video at all')
+        self.assertEqual((result['accepted'], result['checked']), (True, False))
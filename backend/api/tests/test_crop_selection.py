@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from api.detector import CropSelector, _analyse_video
+
+FRAME = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+
+
+def face(track_id, x=0, side=100, conf=0.9):
+    return (track_id, (x, 0, x + side, side), conf)
+
+
+class CropSelectorTests(SimpleTestCase):
+
+    def test_keeps_the_best_faces_per_frame(self):
+        selector = CropSelector(max_faces_per_frame=2)
+        faces = [face(0, 0, conf=0.5), face(1, 100, conf=0.95), face(2, 200, conf=0.7)]
+        chosen = selector.select(FRAME, faces)
+        self.assertEqual([track_id for track_id, _, _ in chosen], [1, 2])
+        self.assertEqual((selector.selected, selector.skipped), (2, 1))
+
+    def test_drops_small_faces(self):
+        selector = CropSelector(min_face_size=40)
+        chosen = selector.select(FRAME, [face(0, side=39), face(1, 100, side=40)])
+        self.assertEqual([track_id for track_id, _, _ in chosen], [1])
+
+    def test_per_track_cap(self):
+        selector = CropSelector(max_crops_per_track=3)
+        picks = [len(selector.select(FRAME, [face(0)], sample_no=n)) for n in range(5)]
+        self.assertEqual(picks, [1, 1, 1, 0, 0])
+        # Another track has its own budget
+        self.assertEqual(len(selector.select(FRAME, [face(1)], sample_no=5)), 1)
+
+    def test_track_picks_are_spread_over_the_video(self):
+        selector = CropSelector(max_crops_per_track=4, expected_samples=40)
+        self.assertEqual(selector.track_stride, 10)
+        picked = [n for n in range(40) if selector.select(FRAME, [face(7)], sample_no=n)]
+        self.assertEqual(picked, [0, 10, 20, 30])
+
+    def test_stride_counts_from_the_first_appearance(self):
+        selector = CropSelector(max_crops_per_track=2, expected_samples=20)
+        picked = [n for n in range(5, 20) if selector.select(FRAME, [face(3)], sample_no=n)]
+        self.assertEqual(picked, [5, 15])
+
+    def test_total_budget_is_paced(self):
+        selector = CropSelector(max_faces_per_frame=4, max_crops_per_track=100, max_crops_total=10, expected_samples=100)
+        selected = []
+        for n in range(100):
+            selector.select(FRAME, [face(i, 150 * i) for i in range(4)], sample_no=n)
+            selected.append(selector.selected)
+            # By sample n at most ceil(10 * (n + 1) / 100) crops
+            self.assertLessEqual(selector.selected, -(-10 * (n + 1) // 100))
+        self.assertEqual(selected[-1], 10)
+        self.assertEqual(selector.skipped, 400 - 10)
+
+    def test_total_budget_without_pacing(self):
+        selector = CropSelector(max_faces_per_frame=4, max_crops_per_track=100, max_crops_total=5)
+        counts = [len(selector.select(FRAME, [face(i, 150 * i) for i in range(4)], sample_no=n)) for n in range(3)]
+        self.assertEqual(counts, [4, 1, 0])
+
+
+class StubBackend:
+    """Two faces in every frame, each classified as 0.75"""
+
+    def __init__(self):
+        self.classified = 0
+
+    def detect_faces(self, frame, conf_thresh=0.6):
+        return [((40, 40, 140, 140), 0.9), ((200, 40, 300, 140), 0.8)]
+
+    def classify(self, tensors):
+        self.classified += len(tensors)
+        return [0.75] * len(tensors)
+
+
+@override_settings(DETECTOR_MAX_FACES_PER_FRAME=1)
+class AnalyseVideoCropSelectionTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.dir = tempfile.mkdtemp(prefix='crop-test-')
+        cls.path = os.path.join(cls.dir, 'clip.mp4')
+        writer = cv2.VideoWriter(cls.path, cv2.VideoWriter_fourcc(*'mp4v'), 30, (320, 240))
+        rng = np.random.default_rng(1)
+        for _ in range(12):
+            writer.write(rng.integers(0, 256, (240, 320, 3), dtype=np.uint8))
+        writer.release()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_every_face_is_classified_by_default(self):
+        backend = StubBackend()
+        stats = _analyse_video(self.path, backend)
+        self.assertEqual(stats['faces'], 8)
+        self.assertEqual(backend.classified, 8)
+        self.assertIsNone(stats['crop_selection'])
+        self.assertNotIn('skipped', [r[2] for r in stats['results'] if len(r) == 4])
+
+    def test_selection_records_skipped_faces(self):
+        backend = StubBackend()
+        stats = _analyse_video(self.path, backend, select_crops=True)
+        self.assertEqual(stats['faces'], 4)
+        self.assertEqual(backend.classified, 4)
+        skipped = [r for r in stats['results'] if r[2] == 'skipped']
+        self.assertEqual(len(skipped), 4)
+        self.assertTrue(all(prob is None for _, _, _, prob in skipped))
+        self.assertEqual(stats['crop_selection']['skipped'], 4)
@@ -0,0 +1,88 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from api.detector import FaceTracker
+from api.timeline import NO_FACE, pack_timeline, unpack_timeline
+
+WIDTH, HEIGHT, SIDE = 320, 240, 60
+PATCH = np.random.default_rng(0).integers(0, 256, (SIDE, SIDE, 3), dtype=np.uint8)
+
+
+def frame_with_face(x, y):
+    """Flat grey frame with a textured square at (x, y)"""
+    frame = np.full((HEIGHT, WIDTH, 3), 128, dtype=np.uint8)
+    if x is not None:
+        frame[y:y + SIDE, x:x + SIDE] = PATCH
+    return frame
+
+
+class StubDetector:
+    """Finds the square wherever the test put it, counting its calls"""
+
+    def __init__(self):
+        self.position = None
+        self.calls = 0
+
+    def __call__(self, frame):
+        self.calls += 1
+        if self.position is None:
+            return []
+        x, y = self.position
+        return [((x, y, x + SIDE, y + SIDE), 0.9)]
+
+
+class FaceTrackerTests(SimpleTestCase):
+
+    def track(self, positions, keyframe_interval=3):
+        detector = StubDetector()
+        tracker = FaceTracker(detector, keyframe_interval=keyframe_interval)
+        outputs = []
+        for position in positions:
+            detector.position = position
+            outputs.append(tracker.update(frame_with_face(*(position or (None, None)))))
+        return tracker, detector, outputs
+
+    def test_detector_runs_on_keyframes_only(self):
+        tracker, detector, outputs = self.track([(100, 80)] * 7)
+        # Sampled frames 0, 3 and 6 are keyframes
+        self.assertEqual(detector.calls, 3)
+        stats = tracker.stats()
+        self.assertEqual(stats['detector_calls'], 3)
+        self.assertEqual(stats['propagated_frames'], 4)
+        self.assertEqual(stats['redetections'], 0)
+        self.assertTrue(all(len(faces) == 1 for faces in outputs))
+
+    def test_propagation_follows_the_face(self):
+        positions = [(100 + 4 * i, 80 + 2 * i) for i in range(3)]
+        _, detector, outputs = self.track(positions)
+        self.assertEqual(detector.calls, 1)
+        for (x, y), faces in zip(positions, outputs):
+            track_id, box, _conf = faces[0]
+            self.assertEqual(track_id, 0)
+            self.assertLessEqual(abs(box[0] - x), 1)
+            self.assertLessEqual(abs(box[1] - y), 1)
+            self.assertEqual((box[2] - box[0], box[3] - box[1]), (SIDE, SIDE))
+
+    def test_lost_track_forces_a_keyframe(self):
+        tracker, detector, outputs = self.track([(100, 80), None, None])
+        self.assertEqual(tracker.stats()['redetections'], 1)
+        self.assertEqual(detector.calls, 2)
+        self.assertEqual(outputs[1], [])
+
+    def test_track_keeps_its_id_across_keyframes(self):
+        _, _, outputs = self.track([(100, 80)] * 3 + [(104, 80)] * 3, keyframe_interval=2)
+        self.assertEqual({faces[0][0] for faces in outputs}, {0})
+
+    def test_track_ids_stay_distinct_past_the_timeline_range(self):
+        # A face that jumps to a non-overlapping spot on every keyframe starts a new track each time
+        positions = [(10 + (i % 2) * 200, 80) for i in range(300)]
+        tracker, _, outputs = self.track(positions, keyframe_interval=1)
+        ids = [faces[0][0] for faces in outputs]
+        self.assertEqual(ids, list(range(300)))
+        self.assertEqual(tracker.stats()['tracks'], 300)
+
+    def test_timeline_wraps_track_ids(self):
+        results = [(frame_no, track_id, 'real', 0.1) for frame_no, track_id in enumerate((0, 254, 255, 300))]
+        faces = unpack_timeline(pack_timeline(results))['face'].tolist()
+        self.assertEqual(faces, [0, 254, 0, 300 % NO_FACE])
+        self.assertNotIn(NO_FACE, faces)
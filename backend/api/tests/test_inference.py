@@ -0,0 +1,134 @@
+import os
+import socket
+import tempfile
+import threading
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from api.inference import (
+    CLASSIFY_HEADER, HEADER, OP_CLASSIFY, OP_DETECT_FACES, OP_ERROR, OP_OK, OP_STATS,
+    InferenceClient, InferenceError, InferenceServer, recv_message, send_message,
+)
+
+
+class FramingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.a, self.b = socket.socketpair()
+        self.addCleanup(self.a.close)
+        self.addCleanup(self.b.close)
+
+    def test_round_trip(self):
+        send_message(self.a, OP_CLASSIFY, b'payload')
+        send_message(self.a, OP_STATS)
+        self.assertEqual(recv_message(self.b), (OP_CLASSIFY, bytearray(b'payload')))
+        self.assertEqual(recv_message(self.b), (OP_STATS, bytearray()))
+
+    def test_header_is_op_and_length_in_network_order(self):
+        send_message(self.a, OP_ERROR, b'abc')
+        self.assertEqual(self.b.recv(HEADER.size), b'\xff\x00\x00\x00\x03')
+
+    def test_message_split_across_reads(self):
+        payload = bytes(range(256)) * 4
+        message = HEADER.pack(OP_DETECT_FACES, len(payload)) + payload
+
+        def trickle():
+            for i in range(0, len(message), 7):
+                self.a.sendall(message[i:i + 7])
+
+        sender = threading.Thread(target=trickle)
+        sender.start()
+        self.assertEqual(recv_message(self.b), (OP_DETECT_FACES, bytearray(payload)))
+        sender.join()
+
+    def test_truncated_message_raises(self):
+        self.a.sendall(HEADER.pack(OP_CLASSIFY, 10) + b'short')
+        self.a.close()
+        with self.assertRaises(ConnectionError):
+            recv_message(self.b)
+
+
+class StubFaceNet:
+    """cv2.dnn-shaped output: one face above and one below the threshold"""
+
+    def setInput(self, blob):
+        self.blob = blob
+
+    def forward(self):
+        dets = np.zeros((1, 1, 2, 7), dtype=np.float32)
+        dets[0, 0, 0, 2:7] = (0.9, 0.25, 0.25, 0.75, 0.75)
+        dets[0, 0, 1, 2:7] = (0.3, 0.0, 0.0, 0.5, 0.5)
+        return dets
+
+
+class StubServer(InferenceServer):
+    """Classifies a face as the mean of its pixels"""
+
+    def _classify(self, faces):
+        return [float(face.mean()) for face in faces]
+
+
+class ServerTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.mkdtemp(prefix='inference-test-')
+        self.socket_path = os.path.join(tmp, 'inference.sock')
+        self.server = StubServer(self.socket_path, StubFaceNet(), None, max_wait=0.001)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.client = InferenceClient(self.socket_path, timeout=5)
+
+        def stop():
+            self.client.close()
+            self.server.shutdown()
+            self.server.server_close()
+            thread.join()
+            os.rmdir(tmp)
+        self.addCleanup(stop)
+
+    def test_detect_faces(self):
+        frame = np.zeros((240, 320, 3), dtype=np.uint8)
+        # Boxes come back in the caller's frame size, below-threshold rows are dropped
+        [(box, conf)] = self.client.detect_faces(frame, conf_thresh=0.5)
+        self.assertEqual(box, (80, 60, 240, 180))
+        self.assertAlmostEqual(conf, 0.9, places=6)
+
+    def test_classify_sends_float16_faces(self):
+        faces = [np.full((3, 8, 8), value, dtype=np.float32) for value in (0.25, 0.5, 0.75)]
+        self.assertEqual(self.client.classify(faces), [0.25, 0.5, 0.75])
+        self.assertEqual(self.client.classify([]), [])
+
+    def test_stats(self):
+        self.client.classify([np.zeros((3, 4, 4), dtype=np.float32)] * 2)
+        stats = self.client.stats()
+        self.assertEqual(stats['classify_requests'], 1)
+        self.assertEqual(stats['faces_classified'], 2)
+        self.assertTrue(self.client.ping())
+
+    def test_server_error_keeps_the_connection(self):
+        # The header announces more pixels than the payload carries
+        bad = CLASSIFY_HEADER.pack(2, 2, 2) + b'\x00'
+        payload = CLASSIFY_HEADER.pack(1, 3, 3) + np.zeros((1, 3, 3, 3), dtype=np.float16).tobytes()
+        with self.assertRaises(InferenceError):
+            self.client._call(OP_CLASSIFY, bad)
+        self.assertEqual(self.client._call(OP_CLASSIFY, payload), bytearray(np.float32(0).tobytes()))
+        self.assertEqual(self.server.stats()['errors'], 1)
+
+    def test_unknown_op(self):
+        with self.assertRaisesRegex(InferenceError, 'Unknown inference op 42'):
+            self.client._call(42)
+
+    def test_client_reconnects_after_a_restart(self):
+        self.assertTrue(self.client.ping())
+        # Break the client's connection, as a server restart would
+        self.client._local.sock.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(self.client.stats()['errors'], 0)
+
+    def test_raw_protocol(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.socket_path)
+            send_message(sock, OP_STATS)
+            status, reply = recv_message(sock)
+        self.assertEqual(status, OP_OK)
+        self.assertIn(b'"uptime"', reply)
@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from api.metadata import DEFAULT_METADATA, _parse_rate, cache_metadata, get_video_metadata, probe_video
+from api.tests.test_containers import mp4
+
+FFPROBE = SimpleNamespace(available=True, path='ffprobe')
+FFPROBE_OUTPUT = {
+    'streams': [{'codec_name': 'theora', 'width': 320, 'height': 240, 'avg_frame_rate': '25/1',
+                 'r_frame_rate': '25/1', 'duration': '4.0', 'nb_frames': '100'}],
+    'format': {'format_name': 'ogg', 'duration': '4.0'},
+}
+
+
+class MetadataTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.dir = tempfile.mkdtemp(prefix='metadata-test-')
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_parse_rate(self):
+        self.assertEqual(_parse_rate('30000/1001'), 30000 / 1001)
+        self.assertEqual(_parse_rate('25'), 25.0)
+        self.assertIsNone(_parse_rate('0/0'))
+        self.assertIsNone(_parse_rate('30/0'))
+        self.assertIsNone(_parse_rate(None))
+
+    def test_container_header_is_read_without_ffprobe(self):
+        # moov after 8 MB of media data, which the probe seeks over
+        path = self.write('clip.mp4', mp4(moov_last=True, mdat_size=8 * 1024 * 1024))
+        with mock.patch('api.metadata.subprocess.run') as run:
+            metadata = probe_video(path)
+        run.assert_not_called()
+        self.assertEqual(metadata['source'], 'container')
+        self.assertEqual((metadata['resolution'], metadata['duration'], metadata['fps']), ('640x360', 10.0, 30.0))
+
+    def test_results_are_memoised_by_hash(self):
+        path = self.write('clip.mp4', mp4())
+        first = probe_video(path, sha256='abc')
+        os.remove(path)
+        self.assertEqual(probe_video(path, sha256='abc'), first)
+        self.assertIsNone(probe_video(path))
+
+    def test_ffprobe_fallback(self):
+        path = self.write('clip.ogv', b'OggS' + bytes(100))
+        completed = subprocess.CompletedProcess([], 0, stdout=json.dumps(FFPROBE_OUTPUT))
+        with mock.patch('api.metadata.get_tool', return_value=FFPROBE), \
+                mock.patch('api.metadata.subprocess.run', return_value=completed) as run:
+            metadata = probe_video(path)
+        self.assertEqual(run.call_args[0][0][0], 'ffprobe')
+        self.assertEqual(metadata, {
+            'format': 'ogg', 'duration': 4.0, 'width': 320, 'height': 240, 'fps': 25.0,
+            'codec': 'theora', 'frame_count': 100, 'resolution': '320x240', 'source': 'ffprobe',
+        })
+
+    def test_ffprobe_failure(self):
+        path = self.write('clip.ogv', b'OggS' + bytes(100))
+        error = subprocess.CalledProcessError(1, 'ffprobe')
+        with mock.patch('api.metadata.get_tool', return_value=FFPROBE), \
+                mock.patch('api.metadata.subprocess.run', side_effect=error):
+            self.assertIsNone(probe_video(path))
+
+    def test_get_video_metadata_uses_the_upload_hash(self):
+        cache_metadata('f00d', {'format': 'mp4', 'duration': 3.0, 'width': 10, 'height': 20,
+                                'fps': 15.0, 'codec': 'h264', 'frame_count': 45})
+        upload = mock.Mock()
+        metadata = get_video_metadata(upload, sha256='f00d')
+        # Answered from the cache without reading the file
+        self.assertEqual(upload.method_calls, [])
+        self.assertEqual((metadata['resolution'], metadata['source']), ('10x20', 'container'))
+
+    def test_get_video_metadata_spools_an_upload(self):
+        metadata = get_video_metadata(SimpleUploadedFile('clip.mp4', mp4()))
+        self.assertEqual(metadata['frame_count'], 300)
+
+    def test_unreadable_video_gets_defaults(self):
+        with mock.patch('api.metadata.get_tool', return_value=SimpleNamespace(available=False)):
+            metadata = get_video_metadata(SimpleUploadedFile('clip.bin', b'garbage'))
+        self.assertEqual(metadata, DEFAULT_METADATA)
+        self.assertIsNot(metadata, DEFAULT_METADATA)
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from api.detector import CropProbabilityCache, _analyse_video, dhash, hamming
+
+IMAGE = np.random.default_rng(0).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+
+
+class DHashTests(SimpleTestCase):
+
+    def test_hash_is_64_bits(self):
+        value = dhash(IMAGE)
+        self.assertIsInstance(value, int)
+        self.assertLess(value, 1 << 64)
+        self.assertLess(dhash(IMAGE, hash_size=4), 1 << 16)
+
+    def test_colour_and_grayscale_agree(self):
+        self.assertEqual(dhash(IMAGE), dhash(cv2.cvtColor(IMAGE, cv2.COLOR_BGR2GRAY)))
+
+    def test_near_duplicates_are_close(self):
+        brighter = cv2.add(IMAGE, 10)
+        resized = cv2.resize(IMAGE, (320, 240))
+        self.assertLessEqual(hamming(dhash(IMAGE), dhash(brighter)), 3)
+        self.assertLessEqual(hamming(dhash(IMAGE), dhash(resized)), 3)
+
+    def test_different_images_are_far_apart(self):
+        other = np.random.default_rng(1).integers(0, 256, IMAGE.shape, dtype=np.uint8)
+        self.assertGreater(hamming(dhash(IMAGE), dhash(other)), 10)
+
+    def test_hamming(self):
+        self.assertEqual(hamming(0, 0), 0)
+        self.assertEqual(hamming(0b1011, 0b0001), 2)
+        self.assertEqual(hamming(0, (1 << 64) - 1), 64)
+
+
+class CropProbabilityCacheTests(SimpleTestCase):
+
+    def test_reuses_within_threshold_only(self):
+        cache = CropProbabilityCache(threshold=2)
+        cache.add(0, 0b0000, 0.8)
+        self.assertEqual(cache.lookup(0, 0b0011), 0.8)
+        self.assertIsNone(cache.lookup(0, 0b0111))
+        self.assertEqual(cache.hits, 1)
+
+    def test_entries_belong_to_a_track(self):
+        cache = CropProbabilityCache()
+        cache.add(0, 42, 0.8)
+        self.assertIsNone(cache.lookup(1, 42))
+        self.assertEqual(cache.hits, 0)
+
+    def test_most_recent_match_wins(self):
+        cache = CropProbabilityCache(threshold=1)
+        cache.add(0, 0b00, 0.2)
+        cache.add(0, 0b01, 0.6)
+        self.assertEqual(cache.lookup(0, 0b00), 0.6)
+
+    def test_oldest_entries_are_evicted(self):
+        cache = CropProbabilityCache(threshold=0, capacity=2)
+        for crop_hash in (1, 2, 3):
+            cache.add(0, crop_hash, crop_hash / 10)
+        self.assertIsNone(cache.lookup(0, 1))
+        self.assertEqual(cache.lookup(0, 3), 0.3)
+        self.assertEqual(len(cache.entries), 2)
+
+
+class StubBackend:
+    """One face in every frame, counting detector and classifier calls"""
+
+    def __init__(self):
+        self.detections = 0
+        self.classified = 0
+
+    def detect_faces(self, frame, conf_thresh=0.6):
+        self.detections += 1
+        return [((40, 40, 140, 140), 0.9)]
+
+    def classify(self, tensors):
+        self.classified += len(tensors)
+        return [0.25] * len(tensors)
+
+
+class AnalyseVideoHashReuseTests(SimpleTestCase):
+    """A still clip: every sampled frame is a near-duplicate of the first"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.dir = tempfile.mkdtemp(prefix='hash-test-')
+        cls.path = os.path.join(cls.dir, 'still.mp4')
+        writer = cv2.VideoWriter(cls.path, cv2.VideoWriter_fourcc(*'mp4v'), 30, (320, 240))
+        still = cv2.GaussianBlur(np.random.default_rng(2).integers(0, 256, (240, 320, 3), dtype=np.uint8), (9, 9), 0)
+        for _ in range(15):
+            writer.write(still)
+        writer.release()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_every_frame_goes_through_the_models_by_default(self):
+        backend = StubBackend()
+        stats = _analyse_video(self.path, backend)
+        self.assertEqual((backend.detections, backend.classified), (5, 5))
+        self.assertEqual(stats['faces'], 5)
+        self.assertIsNone(stats['perceptual_hashing'])
+
+    def test_hash_reuse_skips_near_duplicates(self):
+        backend = StubBackend()
+        stats = _analyse_video(self.path, backend, hash_reuse=True)
+        self.assertEqual((backend.detections, backend.classified), (1, 1))
+        # Reused results still count towards the verdict
+        self.assertEqual(stats['faces'], 5)
+        self.assertAlmostEqual(stats['prob_sum'], 5 * 0.25)
+        self.assertEqual(stats['perceptual_hashing']['frame_hash_hits'], 4)
+        self.assertEqual(stats['perceptual_hashing']['crop_hash_hits'], 4)
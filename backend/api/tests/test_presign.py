@@ -0,0 +1,95 @@
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import boto3
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.test import SimpleTestCase, override_settings
+
+from api import presign
+from api.models import S3MediaStorage
+
+START = 1_800_000_000 - 1_800_000_000 % 600
+
+
+def expires(url):
+    return int(parse_qs(urlparse(url).query)['Expires'][0])
+
+
+@override_settings(PRESIGN_WINDOW=600, PRESIGN_GRACE=300)
+class PresignTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # Signing is local, no request reaches S3
+        self.client = boto3.client('s3', region_name='us-west-2', aws_access_key_id='AKIDEXAMPLE',
+                                   aws_secret_access_key='secret')
+        patcher = mock.patch('api.presign.get_s3_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def at(self, now):
+        # botocore reads the same clock for the absolute Expires
+        return mock.patch('time.time', return_value=now)
+
+    def test_window_bounds(self):
+        self.assertEqual(presign.window_bounds(START + 599), (START, START + 900))
+        self.assertEqual(presign.window_bounds(START + 600), (START + 600, START + 1500))
+        # Signed at the very end of a window, a URL is still good for the grace period
+        self.assertEqual(presign.expires_in(START + 599), 301)
+
+    @override_settings(PRESIGN_WINDOW=5, PRESIGN_GRACE=-10)
+    def test_settings_are_clamped(self):
+        self.assertEqual(presign.window_bounds(START), (START, START + 60))
+
+    def test_same_url_for_the_whole_window(self):
+        with self.at(START + 10):
+            first = presign.presign('media/thumbnails/a.jpg', bucket='true-vision')
+        # A cold cache, as in another process, still gives the same URL
+        cache.clear()
+        with self.at(START + 590):
+            self.assertEqual(presign.presign('media/thumbnails/a.jpg', bucket='true-vision'), first)
+        self.assertEqual(expires(first), START + 900)
+
+        with self.at(START + 610):
+            later = presign.presign('media/thumbnails/a.jpg', bucket='true-vision')
+        self.assertNotEqual(later, first)
+        self.assertEqual(expires(later), START + 1500)
+
+    def test_one_cache_round_trip_per_page(self):
+        keys = ['media/thumbnails/a.jpg', 'media/thumbnails/b.jpg', '', 'media/thumbnails/a.jpg']
+        with self.at(START + 10), \
+                mock.patch.object(self.client, 'generate_presigned_url', wraps=self.client.generate_presigned_url) as sign, \
+                mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            urls = presign.presign_many(keys, bucket='true-vision')
+            self.assertEqual(sorted(urls), ['media/thumbnails/a.jpg', 'media/thumbnails/b.jpg'])
+            self.assertEqual(sign.call_count, 2)
+            set_many.assert_called_once()
+            # Cached until the window ends, not until the URLs expire
+            self.assertEqual(set_many.call_args[1]['timeout'], 590)
+
+            with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+                again = presign.presign_many(keys + ['media/thumbnails/c.jpg'], bucket='true-vision')
+            get_many.assert_called_once()
+            # Only the new key is signed
+            self.assertEqual(sign.call_count, 3)
+        self.assertEqual({key: again[key] for key in urls}, urls)
+
+    def test_keys_that_fail_to_sign_are_left_out(self):
+        real_sign = self.client.generate_presigned_url
+
+        def sign(operation, Params, ExpiresIn):
+            if Params['Key'] == 'bad':
+                raise ValueError('no')
+            return real_sign(operation, Params=Params, ExpiresIn=ExpiresIn)
+
+        with mock.patch.object(self.client, 'generate_presigned_url', side_effect=sign):
+            urls = presign.presign_many(['good', 'bad'], bucket='true-vision')
+            self.assertEqual(list(urls), ['good'])
+            self.assertIsNone(presign.presign('bad', bucket='true-vision'))
+        self.assertEqual(presign.presign_many([]), {})
+
+    def test_storage_key(self):
+        self.assertEqual(presign.storage_key(S3MediaStorage(), 'thumbnails/a.jpg'), 'media/thumbnails/a.jpg')
+        self.assertEqual(presign.storage_key(FileSystemStorage(), 'thumbnails/a.jpg'), 'thumbnails/a.jpg')
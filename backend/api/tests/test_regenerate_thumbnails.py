@@ -0,0 +1,117 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+
+from api.management.commands.regenerate_thumbnails import Checkpoint
+from api.models import CustomUser, Video
+from api.thumbnail_queue import FAILED_THUMBNAIL_NAME, PENDING_THUMBNAIL_NAME
+
+
+class CheckpointTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='checkpoint-test-')
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.path = os.path.join(self.dir, 'checkpoint.json')
+
+    def test_advance_stops_below_the_oldest_in_flight(self):
+        checkpoint = Checkpoint(self.path, force=False)
+        for video_id in (1, 2, 4, 5):
+            checkpoint.mark(video_id)
+        checkpoint.advance(in_flight={3, 6})
+        self.assertEqual(checkpoint.last_id, 2)
+        self.assertEqual(checkpoint.done, {4, 5})
+
+        checkpoint.mark(3)
+        checkpoint.advance(in_flight={6})
+        self.assertEqual((checkpoint.last_id, checkpoint.done), (5, set()))
+
+    def test_failed_ids_survive_advancing(self):
+        checkpoint = Checkpoint(self.path, force=False)
+        checkpoint.mark(1)
+        checkpoint.mark(2, failed=True)
+        checkpoint.advance(in_flight=set())
+        self.assertEqual((checkpoint.last_id, checkpoint.failed), (2, {2}))
+
+        # Succeeding on a retry clears the failure
+        checkpoint.mark(2)
+        self.assertEqual(checkpoint.failed, set())
+
+    def test_save_and_load(self):
+        checkpoint = Checkpoint(self.path, force=True)
+        checkpoint.mark(1)
+        checkpoint.mark(3)
+        checkpoint.mark(4, failed=True)
+        checkpoint.advance(in_flight={2})
+        checkpoint.save()
+        self.assertFalse(os.path.exists(f'{self.path}.tmp'))
+
+        resumed = Checkpoint(self.path, force=True)
+        self.assertTrue(resumed.load())
+        self.assertEqual((resumed.last_id, resumed.done, resumed.failed), (1, {3}, {4}))
+
+        resumed.delete()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(Checkpoint(self.path, force=True).load())
+
+    def test_load_rejects_a_checkpoint_from_another_mode(self):
+        Checkpoint(self.path, force=True).save()
+        with self.assertRaises(CommandError):
+            Checkpoint(self.path, force=False).load()
+
+    def test_older_checkpoints_listed_failed_ids_as_done(self):
+        with open(self.path, 'w') as f:
+            json.dump({'force': False, 'last_id': 10, 'done': [12, 13], 'failed': [13]}, f)
+        checkpoint = Checkpoint(self.path, force=False)
+        checkpoint.load()
+        self.assertEqual((checkpoint.done, checkpoint.failed), ({12}, {13}))
+
+
+class SelectionTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='regenerate-test-')
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        user = CustomUser.objects.create(username='alice', email='alice@example.com')
+        self.ids = {}
+        for thumbnail in ('', PENDING_THUMBNAIL_NAME, 'thumbnails/placeholder_pending_x1y2.jpg',
+                          FAILED_THUMBNAIL_NAME, 'thumbnails/thumbnail_1.jpg'):
+            video = Video.objects.create(
+                User_id=user, Video_File='videos/clip.mp4', Video_Path='videos/clip.mp4',
+                Thumbnail='thumbnails/thumbnail_0.jpg', size=1, Length=1, Resolution='1x1', Frame_per_Second=1
+            )
+            # Set afterwards, saving a new video without a thumbnail would generate one
+            Video.objects.filter(pk=video.pk).update(Thumbnail=thumbnail)
+            self.ids[thumbnail] = video.Video_id
+
+    def run_command(self, *args):
+        done = []
+
+        def regenerate(video_id, quiet=True, ranged_min_size=0):
+            done.append(video_id)
+            return video_id, 'ok', 'thumbnails/new.jpg'
+
+        with mock.patch('api.management.commands.regenerate_thumbnails.regenerate', side_effect=regenerate):
+            call_command('regenerate_thumbnails', '--workers', '1', '--checkpoint',
+                         os.path.join(self.dir, 'checkpoint.json'), *args, stdout=io.StringIO())
+        return done
+
+    def test_pending_placeholder_counts_as_no_thumbnail(self):
+        expected = [self.ids[name] for name in
+                    ('', PENDING_THUMBNAIL_NAME, 'thumbnails/placeholder_pending_x1y2.jpg')]
+        self.assertEqual(self.run_command(), expected)
+
+    def test_force_regenerates_everything(self):
+        self.assertEqual(self.run_command('--force'), sorted(self.ids.values()))
+
+    def test_single_video_on_the_pending_placeholder(self):
+        pending = self.ids[PENDING_THUMBNAIL_NAME]
+        self.assertEqual(self.run_command('--video_id', str(pending)), [pending])
+        self.assertEqual(self.run_command('--video_id', str(self.ids['thumbnails/thumbnail_1.jpg'])), [])
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from api.detector import _analyse_video, _merge_stats, _run_pass
+
+
+class StubBackend:
+    """A face whose probability depends on the frame, so every sampled frame counts"""
+
+    def detect_faces(self, frame, conf_thresh=0.6):
+        return [((20, 20, 120, 120), 0.9)]
+
+    def classify(self, tensors):
+        return [float(np.clip(t.mean() + 0.5, 0, 1)) for t in tensors]
+
+
+class SegmentedAnalysisTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.dir = tempfile.mkdtemp(prefix='segment-test-')
+        cls.path = os.path.join(cls.dir, 'clip.avi')
+        # Intra-only MJPEG, so seeking to any frame is exact
+        writer = cv2.VideoWriter(cls.path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (160, 160))
+        for i in range(30):
+            writer.write(np.full((160, 160, 3), i * 8, dtype=np.uint8))
+        writer.release()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def segments(self, ranges, **options):
+        return _merge_stats([
+            _analyse_video(self.path, StubBackend(), start_frame=start, end_frame=end, **options)
+            for start, end in ranges
+        ])
+
+    def test_segments_match_a_serial_pass_by_default(self):
+        serial = _analyse_video(self.path, StubBackend())
+        merged = self.segments([(0, 10), (10, 20), (20, 30)])
+        for key in ('frames', 'faces', 'deepfake_counts', 'max_prob', 'ssd_invocations'):
+            self.assertEqual(merged[key], serial[key], key)
+        self.assertAlmostEqual(merged['prob_sum'], serial['prob_sum'])
+        self.assertEqual(merged['results'], serial['results'])
+
+    def test_state_restarts_at_each_segment(self):
+        serial = _analyse_video(self.path, StubBackend(), track_faces=True, keyframe_interval=5)
+        merged = self.segments([(0, 10), (10, 20), (20, 30)], track_faces=True, keyframe_interval=5)
+        # Every segment opens with a keyframe, so the detector runs more often than serially
+        self.assertEqual(serial['face_tracking']['detector_calls'], 2)
+        self.assertEqual(merged['face_tracking']['detector_calls'], 3)
+
+    def test_run_pass_is_serial_unless_opted_in(self):
+        with mock.patch('api.detector._analyse_segmented') as segmented:
+            _run_pass(self.path, StubBackend())
+            segmented.assert_not_called()
+            with override_settings(DETECTOR_SEGMENTED=True, DETECTOR_SEGMENT_WORKERS=2), \
+                    mock.patch('api.detector.os.cpu_count', return_value=4):
+                _run_pass(self.path, StubBackend())
+            segmented.assert_called_once_with(self.path, 2)
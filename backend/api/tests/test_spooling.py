@@ -0,0 +1,178 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_clip(path, size, width=1280, height=720, fps=30):
+    """
+    Write an MP4 of at least `size` bytes. Every frame is fresh noise, so
+    nothing compresses away and the file grows by a frame's worth each time.
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    rng = np.random.default_rng(0)
+    frames = 0
+    while True:
+        for _ in range(8):
+            writer.write(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+            frames += 1
+        if os.path.getsize(path) >= size:
+            break
+    writer.release()
+    return frames
+
+
+class IngestMemoryTests(SimpleTestCase):
+    """
+    Uploads are streamed through the probe handler, spooled, decoded by the
+    detector and sampled for a thumbnail a chunk or a frame at a time, so
+    peak memory must not depend on the size of the video. Each case runs a
+    generated clip through those paths in a fresh interpreter, after a
+    warm-up pass over a short clip of the same resolution, and checks that
+    the real run raised peak RSS by less than a fixed cap.
+
+    The clip is small by default. Set SPOOL_TEST_SIZE (bytes), e.g. to
+    3000000000, to run the same checks on a multi-GB video.
+    """
+    SIZE = int(os.environ.get('SPOOL_TEST_SIZE', 16 * 1024 * 1024))
+    # Peak RSS the real run may add on top of the warm-up pass
+    RSS_CAP = 64 * 1024 * 1024
+
+    CHILD = textwrap.dedent('''
+        import json, os, resource, sys, types
+        sys.path.insert(0, {backend!r})
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+        import django
+        django.setup()
+        from django.conf import settings
+        from django.core.files.uploadhandler import TemporaryFileUploadHandler
+        from api.detector import _analyse_video
+        from api.metadata import probe_video
+        from api.spooling import adopt_tempfile, spool_to_tempfile
+        from api.thumbnails import best_thumbnail_frame
+        from api.upload_handlers import VideoProbeUploadHandler
+
+        # No size or duration limit, the point is to push the whole file through
+        settings.VIDEO_MAX_UPLOAD_SIZE = 0
+        settings.VIDEO_MAX_DURATION = 0
+        CHUNK = 64 * 1024
+
+        class StubBackend:
+            """One face in the middle of every frame, a fixed probability"""
+            def detect_faces(self, frame, conf_thresh=0.6):
+                h, w = frame.shape[:2]
+                return [((w // 4, h // 4, w // 2, h // 2), 0.9)]
+
+            def classify(self, tensors):
+                return [0.25] * len(tensors)
+
+        def peak():
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+        def upload(path):
+            """Stream a file through the upload handlers as Django's multipart parser does"""
+            request = types.SimpleNamespace()
+            handlers = [VideoProbeUploadHandler(request), TemporaryFileUploadHandler(request)]
+            size = os.path.getsize(path)
+            for handler in handlers:
+                handler.new_file('video', os.path.basename(path), 'video/mp4', size)
+            with open(path, 'rb') as f:
+                offset = 0
+                while True:
+                    chunk = f.read(CHUNK)
+                    if not chunk:
+                        break
+                    for handler in handlers:
+                        chunk = handler.receive_data_chunk(chunk, offset)
+                        if chunk is None:
+                            break
+                    offset += CHUNK
+            for handler in handlers:
+                uploaded = handler.file_complete(size)
+                if uploaded is not None:
+                    return uploaded, request.video_probe
+
+        def ingest(path, mode):
+            if mode == 'upload':
+                # A new upload: probed while it arrives, then copied for the background thumbnail
+                uploaded, probe = upload(path)
+                spooled = spool_to_tempfile(uploaded, copy=True)
+                uploaded.close()
+                assert spooled.sha256 == probe.sha256
+            else:
+                # A stored file: hashed in place
+                spooled = adopt_tempfile(path)
+                spooled.owned = False
+            try:
+                metadata = probe_video(spooled.path, spooled.sha256)
+                stats = _analyse_video(spooled.path, StubBackend(), max_frames=10 ** 9)
+                best = best_thumbnail_frame(spooled.path, duration=metadata and metadata['duration'])
+                return {{'size': spooled.size, 'frames': stats['frames'], 'faces': stats['faces'],
+                         'thumbnail': best is not None, 'owned_copy': spooled.path != path}}
+            finally:
+                spooled.close()
+
+        warmup, path, mode = sys.argv[1:4]
+        ingest(warmup, mode)
+        before = peak()
+        result = ingest(path, mode)
+        result.update(before=before, after=peak())
+        print(json.dumps(result))
+    ''')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        free = shutil.disk_usage(tempfile.gettempdir()).free
+        # The clip, plus the upload's temporary file and its spooled copy
+        if free < cls.SIZE * 3 + 64 * 1024 * 1024:
+            raise unittest.SkipTest(f"needs {cls.SIZE * 3} bytes free in {tempfile.gettempdir()}")
+        cls.dir = tempfile.mkdtemp(prefix='ingest-test-')
+        cls.warmup = os.path.join(cls.dir, 'warmup.mp4')
+        cls.path = os.path.join(cls.dir, 'clip.mp4')
+        make_clip(cls.warmup, 1)
+        cls.frames = make_clip(cls.path, cls.SIZE)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def ingest(self, mode):
+        child = self.CHILD.format(backend=BACKEND_DIR)
+        result = subprocess.run([sys.executable, '-c', child, self.warmup, self.path, mode],
+                                capture_output=True, text=True, timeout=3600)
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def assertBounded(self, result):
+        growth = result['after'] - result['before']
+        self.assertEqual(result['size'], os.path.getsize(self.path))
+        # Every frame was decoded, every sampled one went through the classifier
+        self.assertEqual(result['frames'], self.frames)
+        self.assertGreater(result['faces'], 0)
+        self.assertTrue(result['thumbnail'])
+        self.assertLessEqual(
+            growth, self.RSS_CAP,
+            f"Ingesting {result['size'] / 1024 ** 2:.0f} MiB raised peak RSS by {growth / 1024 ** 2:.1f} MiB"
+        )
+
+    def test_upload_keeps_rss_bounded(self):
+        result = self.ingest('upload')
+        self.assertTrue(result['owned_copy'])
+        self.assertBounded(result)
+
+    def test_stored_file_keeps_rss_bounded(self):
+        result = self.ingest('stored')
+        self.assertFalse(result['owned_copy'])
+        self.assertBounded(result)
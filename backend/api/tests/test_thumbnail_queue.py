@@ -0,0 +1,135 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api import thumbnail_queue
+from api.models import CustomUser, ThumbnailTask, Video
+from api.spooling import adopt_tempfile
+from api.thumbnail_queue import (
+    FAILED_THUMBNAIL_NAME, PENDING_THUMBNAIL_NAME, failed_thumbnail_name, pending_task_ids,
+    requeue_stale_tasks, retry_delay, run_thumbnail_task,
+)
+
+THUMBNAIL_STORAGE = Video._meta.get_field('Thumbnail').storage
+
+
+def fake_generate(result, name):
+    """Stand-in for Video.generate_thumbnail that points Thumbnail at `name`"""
+    def generate(self, spooled=None, ranged=False):
+        self.Thumbnail.name = name
+        return result
+    return generate
+
+
+@override_settings(THUMBNAIL_RETRY_BACKOFF=10, THUMBNAIL_MAX_ATTEMPTS=3)
+class ThumbnailTaskTests(TestCase):
+
+    def setUp(self):
+        user = CustomUser.objects.create(username='alice', email='alice@example.com')
+        self.video = Video.objects.create(
+            User_id=user, Video_File='videos/clip.mp4', Video_Path='videos/clip.mp4',
+            Thumbnail=PENDING_THUMBNAIL_NAME, size=1, Length=1, Resolution='1x1', Frame_per_Second=1
+        )
+        self.task = ThumbnailTask.objects.create(video=self.video)
+
+    def run_task(self, result, name):
+        with mock.patch.object(Video, 'generate_thumbnail', fake_generate(result, name)):
+            return run_thumbnail_task(self.task.pk)
+
+    def refresh(self):
+        self.task.refresh_from_db()
+        self.video.refresh_from_db()
+
+    def test_retry_delay_doubles(self):
+        self.assertEqual([retry_delay(n) for n in (1, 2, 3, 4)], [10, 20, 40, 80])
+
+    def test_success_swaps_the_placeholder(self):
+        self.assertTrue(self.run_task(True, 'thumbnails/thumbnail_1.jpg'))
+        self.refresh()
+        self.assertEqual((self.task.status, self.task.attempts), (ThumbnailTask.DONE, 1))
+        self.assertEqual(self.video.Thumbnail.name, 'thumbnails/thumbnail_1.jpg')
+
+    def test_failure_backs_off(self):
+        before = timezone.now()
+        self.assertIsNone(self.run_task(False, FAILED_THUMBNAIL_NAME))
+        self.refresh()
+        self.assertEqual((self.task.status, self.task.attempts), (ThumbnailTask.PENDING, 1))
+        self.assertGreaterEqual(self.task.retry_at, before + timedelta(seconds=10))
+        self.assertIn('no usable frame', self.task.last_error)
+        # Still on the pending placeholder while retries remain
+        self.assertEqual(self.video.Thumbnail.name, PENDING_THUMBNAIL_NAME)
+
+        # Not claimable nor listed until the backoff has passed
+        self.assertFalse(self.run_task(True, 'thumbnails/thumbnail_1.jpg'))
+        self.assertEqual(pending_task_ids(), [])
+        ThumbnailTask.objects.filter(pk=self.task.pk).update(retry_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(pending_task_ids(), [self.task.pk])
+
+        self.assertIsNone(self.run_task(False, FAILED_THUMBNAIL_NAME))
+        self.refresh()
+        self.assertEqual(self.task.attempts, 2)
+        self.assertGreaterEqual(self.task.retry_at, timezone.now() + timedelta(seconds=19))
+
+    def test_last_attempt_shows_the_error_placeholder(self):
+        ThumbnailTask.objects.filter(pk=self.task.pk).update(attempts=2)
+        self.assertFalse(self.run_task(False, FAILED_THUMBNAIL_NAME))
+        self.refresh()
+        self.assertEqual(self.task.status, ThumbnailTask.FAILED)
+        self.assertIsNone(self.task.retry_at)
+        self.assertEqual(self.video.Thumbnail.name, FAILED_THUMBNAIL_NAME)
+
+    def test_requeue_stale_tasks(self):
+        stale = timezone.now() - timedelta(hours=1)
+        ThumbnailTask.objects.filter(pk=self.task.pk).update(status=ThumbnailTask.RUNNING, attempts=1, updated_at=stale)
+        self.assertEqual(requeue_stale_tasks(), 1)
+        self.refresh()
+        self.assertEqual(self.task.status, ThumbnailTask.PENDING)
+
+        # Out of attempts: the worker died every time, give up
+        ThumbnailTask.objects.filter(pk=self.task.pk).update(status=ThumbnailTask.RUNNING, attempts=3, updated_at=stale)
+        self.assertEqual(requeue_stale_tasks(), 0)
+        self.refresh()
+        self.assertEqual(self.task.status, ThumbnailTask.FAILED)
+
+
+class FailedPlaceholderTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(thumbnail_queue._placeholder_names, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_uploaded_once_per_process(self):
+        with mock.patch.object(THUMBNAIL_STORAGE, 'exists', return_value=False), \
+                mock.patch.object(THUMBNAIL_STORAGE, 'save', return_value=FAILED_THUMBNAIL_NAME) as save:
+            self.assertEqual(failed_thumbnail_name(), FAILED_THUMBNAIL_NAME)
+            self.assertEqual(failed_thumbnail_name(), FAILED_THUMBNAIL_NAME)
+        save.assert_called_once()
+        self.assertEqual(save.call_args[0][0], FAILED_THUMBNAIL_NAME)
+
+    def test_existing_placeholder_is_reused(self):
+        with mock.patch.object(THUMBNAIL_STORAGE, 'exists', return_value=True), \
+                mock.patch.object(THUMBNAIL_STORAGE, 'save') as save:
+            self.assertEqual(failed_thumbnail_name(), FAILED_THUMBNAIL_NAME)
+        save.assert_not_called()
+
+    def test_failed_generation_points_at_the_shared_placeholder(self):
+        fd, path = tempfile.mkstemp(suffix='.mp4')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'not a video' * 100)
+        self.addCleanup(os.remove, path)
+        video = Video(Video_id=7, Video_File='videos/clip.mp4', Thumbnail_preview='stale')
+        ffmpeg = mock.Mock(available=False)
+        with mock.patch.object(THUMBNAIL_STORAGE, 'exists', return_value=True), \
+                mock.patch.object(THUMBNAIL_STORAGE, 'save') as save, \
+                mock.patch('api.models.toolchain.get_tool', return_value=ffmpeg):
+            for _ in range(3):
+                # Every retry ends on the same name, nothing is uploaded
+                self.assertFalse(video.generate_thumbnail(spooled=adopt_tempfile(path)))
+                self.assertEqual(video.Thumbnail.name, FAILED_THUMBNAIL_NAME)
+        save.assert_not_called()
+        self.assertEqual(video.Thumbnail_preview, '')
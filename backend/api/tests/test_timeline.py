@@ -0,0 +1,58 @@
+import math
+
+from django.test import SimpleTestCase
+
+from api.timeline import NO_FACE, TIMELINE_DTYPE, pack_timeline, slice_timeline, timeline_to_list, unpack_timeline
+
+
+class TimelineTests(SimpleTestCase):
+    RESULTS = [
+        (6, 0, 'real', 0.25),
+        (0, 'no_face'),
+        (3, 1, 'deepfake', 0.75),
+        (3, 0, 'skipped', None),
+        (9, 'no_face'),
+    ]
+
+    def test_pack_sorts_by_frame_and_face(self):
+        records = unpack_timeline(pack_timeline(self.RESULTS))
+        self.assertEqual(records.dtype, TIMELINE_DTYPE)
+        self.assertEqual(records['frame'].tolist(), [0, 3, 3, 6, 9])
+        self.assertEqual(records['face'].tolist(), [NO_FACE, 0, 1, 0, NO_FACE])
+        self.assertEqual(len(pack_timeline(self.RESULTS)), 5 * TIMELINE_DTYPE.itemsize)
+
+    def test_missing_probabilities_are_nan(self):
+        records = unpack_timeline(pack_timeline(self.RESULTS))
+        self.assertTrue(math.isnan(records['prob'][0]))
+        self.assertTrue(math.isnan(records['prob'][1]))
+        self.assertAlmostEqual(float(records['prob'][2]), 0.75, places=3)
+
+    def test_to_list_turns_nan_into_null(self):
+        self.assertEqual(timeline_to_list(pack_timeline(self.RESULTS)), [
+            {'frame': 0, 'face': None, 'prob': None},
+            {'frame': 3, 'face': 0, 'prob': None},
+            {'frame': 3, 'face': 1, 'prob': 0.75},
+            {'frame': 6, 'face': 0, 'prob': 0.25},
+            {'frame': 9, 'face': None, 'prob': None},
+        ])
+
+    def test_slice_is_half_open(self):
+        blob = pack_timeline(self.RESULTS)
+        data, count = slice_timeline(blob, 3, 9)
+        self.assertEqual(count, 3)
+        self.assertEqual([r['frame'] for r in timeline_to_list(data)], [3, 3, 6])
+
+    def test_slice_bounds(self):
+        blob = pack_timeline(self.RESULTS)
+        self.assertEqual(slice_timeline(blob), (blob, 5))
+        self.assertEqual(slice_timeline(blob, start_frame=7)[1], 1)
+        self.assertEqual(slice_timeline(blob, end_frame=1)[1], 1)
+        self.assertEqual(slice_timeline(blob, 100, 200), (b'', 0))
+        # An inverted range is empty rather than an error
+        self.assertEqual(slice_timeline(blob, 9, 3), (b'', 0))
+
+    def test_empty_timeline(self):
+        self.assertEqual(len(unpack_timeline(b'')), 0)
+        self.assertEqual(len(unpack_timeline(None)), 0)
+        self.assertEqual(timeline_to_list(pack_timeline([])), [])
+        self.assertEqual(slice_timeline(b'', 0, 10), (b'', 0))
@@ -0,0 +1,218 @@
+"""
+Background thumbnail generation.
+
+New uploads are saved pointing at a shared placeholder thumbnail, with a
+ThumbnailTask row recording the work still to do. A small in-process thread
+pool picks the task up once the upload has committed; the
+run_thumbnail_worker command finishes tasks left behind by a restart or a
+crash. Failed tasks are retried with an exponential backoff, up to
+THUMBNAIL_MAX_ATTEMPTS attempts. When a task completes, the video's Thumbnail is switched from the
+placeholder to the real image with one conditional UPDATE.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .spooling import adopt_tempfile
+from .thumbnails import placeholder_jpeg
+
+logger = logging.getLogger(__name__)
+
+# Storage names of the shared placeholders shown while a thumbnail is being
+# generated, and for videos without a usable frame
+PENDING_THUMBNAIL_NAME = 'thumbnails/placeholder_pending.jpg'
+FAILED_THUMBNAIL_NAME = 'thumbnails/placeholder_failed.jpg'
+# Storage may have saved the pending placeholder under a suffixed name
+PENDING_THUMBNAIL_PREFIX = PENDING_THUMBNAIL_NAME.rsplit('.', 1)[0]
+
+_placeholder_names = {}
+_placeholder_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def is_pending_thumbnail(name):
+    """Whether a Thumbnail name is the shared pending placeholder"""
+    return bool(name) and name.startswith(PENDING_THUMBNAIL_PREFIX)
+
+
+def _shared_placeholder(name, text):
+    """Storage name of a placeholder shared by all videos, uploaded once per process at most"""
+    with _placeholder_lock:
+        stored = _placeholder_names.get(name)
+        if stored is None:
+            from .models import Video
+            storage = Video._meta.get_field('Thumbnail').storage
+            if storage.exists(name):
+                stored = name
+            else:
+                stored = storage.save(name, ContentFile(placeholder_jpeg(text)))
+                logger.info(f"Uploaded thumbnail placeholder as {stored}")
+            _placeholder_names[name] = stored
+        return stored
+
+
+def pending_thumbnail_name():
+    """Storage name of the shared pending placeholder"""
+    return _shared_placeholder(PENDING_THUMBNAIL_NAME, "Generating thumbnail...")
+
+
+def failed_thumbnail_name():
+    """Storage name of the shared placeholder for videos without a usable frame"""
+    return _shared_placeholder(FAILED_THUMBNAIL_NAME, "True Vision")
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'THUMBNAIL_WORKERS', 2),
+                thread_name_prefix='thumbnails'
+            )
+        return _executor
+
+
+def enqueue_thumbnail(video, spooled=None):
+    """
+    Record a thumbnail task for `video` and start it when the current
+    transaction commits. `spooled` is a local copy of the upload made with
+    spool_to_tempfile(copy=True); the task takes it over.
+    """
+    from .models import ThumbnailTask
+    task, _ = ThumbnailTask.objects.update_or_create(
+        video=video,
+        defaults={
+            'status': ThumbnailTask.PENDING,
+            'source_path': spooled.path if spooled is not None else '',
+            'last_error': '',
+            'retry_at': None
+        }
+    )
+    transaction.on_commit(lambda: submit(task.pk))
+    return task
+
+
+def submit(task_id):
+    """Run a task on the thread pool, or inline when THUMBNAIL_ASYNC is off"""
+    if not getattr(settings, 'THUMBNAIL_ASYNC', True):
+        run_thumbnail_task(task_id)
+        return
+    _get_executor().submit(_run_in_thread, task_id)
+
+
+def _run_in_thread(task_id):
+    from .models import ThumbnailTask
+    retry_at = None
+    try:
+        if run_thumbnail_task(task_id) is None:
+            retry_at = ThumbnailTask.objects.filter(pk=task_id).values_list('retry_at', flat=True).first()
+    except Exception as e:
+        logger.error(f"Thumbnail task {task_id} crashed: {e}", exc_info=True)
+    finally:
+        # This thread opened its own database connection
+        connection.close()
+    if retry_at is not None:
+        # Wait out the backoff on a timer rather than in a pool thread
+        delay = max(0.0, (retry_at - timezone.now()).total_seconds())
+        timer = threading.Timer(delay, lambda: _get_executor().submit(_run_in_thread, task_id))
+        timer.daemon = True
+        timer.start()
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the given number of failed attempts, doubling each time"""
+    return getattr(settings, 'THUMBNAIL_RETRY_BACKOFF', 30) * 2 ** max(0, attempts - 1)
+
+
+def _due():
+    """Filter for tasks that are not waiting out a retry backoff"""
+    return Q(retry_at__isnull=True) | Q(retry_at__lte=timezone.now())
+
+
+def run_thumbnail_task(task_id):
+    """
+    Claim and run one pending task. Returns True once the video has its
+    thumbnail, False if the task was not claimable or failed for good, and
+    None if it failed but will be retried once its retry_at has passed.
+    """
+    from .models import ThumbnailTask, Video
+
+    claimed = ThumbnailTask.objects.filter(_due(), pk=task_id, status=ThumbnailTask.PENDING).update(
+        status=ThumbnailTask.RUNNING, attempts=F('attempts') + 1, updated_at=timezone.now()
+    )
+    if not claimed:
+        return False
+    task = ThumbnailTask.objects.select_related('video').get(pk=task_id)
+    video = task.video
+    placeholder = video.Thumbnail.name
+
+    spooled = adopt_tempfile(task.source_path)
+    try:
+        # Uploads the image and its renditions and points video.Thumbnail at it, without saving the row.
+        # On failure it points video.Thumbnail at the shared error placeholder and returns False
+        if not video.generate_thumbnail(spooled=spooled):
+            raise RuntimeError("no usable frame, generate_thumbnail fell back to a placeholder")
+        # Swap the placeholder for the real thumbnail, unless something else replaced it meanwhile
+        Video.objects.filter(pk=video.pk, Thumbnail=placeholder).update(
+            Thumbnail=video.Thumbnail.name,
+            Thumbnail_renditions=video.Thumbnail_renditions,
+            Thumbnail_preview=video.Thumbnail_preview
+        )
+    except Exception as e:
+        max_attempts = getattr(settings, 'THUMBNAIL_MAX_ATTEMPTS', 3)
+        retry = task.attempts < max_attempts
+        logger.warning(f"Thumbnail task {task_id} for video {video.Video_id} failed (attempt {task.attempts}): {e}")
+        now = timezone.now()
+        ThumbnailTask.objects.filter(pk=task_id).update(
+            status=ThumbnailTask.PENDING if retry else ThumbnailTask.FAILED,
+            last_error=str(e),
+            retry_at=now + timedelta(seconds=retry_delay(task.attempts)) if retry else None,
+            updated_at=now
+        )
+        if not retry:
+            if video.Thumbnail.name != placeholder:
+                # Out of attempts: show the error placeholder rather than "Generating thumbnail..."
+                Video.objects.filter(pk=video.pk, Thumbnail=placeholder).update(Thumbnail=video.Thumbnail.name)
+            if spooled is not None:
+                spooled.close()
+        return None if retry else False
+
+    if spooled is not None:
+        spooled.close()
+    ThumbnailTask.objects.filter(pk=task_id).update(
+        status=ThumbnailTask.DONE, source_path='', last_error='', retry_at=None, updated_at=timezone.now()
+    )
+    logger.info(f"Thumbnail for video {video.Video_id} ready: {video.Thumbnail.name}")
+    return True
+
+
+def requeue_stale_tasks():
+    """
+    Return tasks stuck in `running` (their worker died) to `pending`. A task
+    that has already used all its attempts is marked failed instead, so one
+    that kills its worker every time is not picked up forever.
+    """
+    from .models import ThumbnailTask
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'THUMBNAIL_TASK_TIMEOUT', 300))
+    stale = ThumbnailTask.objects.filter(status=ThumbnailTask.RUNNING, updated_at__lt=cutoff)
+    stale.filter(attempts__gte=getattr(settings, 'THUMBNAIL_MAX_ATTEMPTS', 3)).update(
+        status=ThumbnailTask.FAILED, last_error='Worker died while generating the thumbnail', updated_at=now
+    )
+    return stale.update(status=ThumbnailTask.PENDING, retry_at=None, updated_at=now)
+
+
+def pending_task_ids(limit=50):
+    from .models import ThumbnailTask
+    return list(
+        ThumbnailTask.objects.filter(_due(), status=ThumbnailTask.PENDING)
+        .order_by('created_at').values_list('pk', flat=True)[:limit]
+    )
@@ -0,0 +1,198 @@
+"""
+Thumbnail frame selection.
+
+best_thumbnail_frame opens the video once with OpenCV, seeks to each
+candidate timestamp (decoding from the nearest keyframe rather than from
+the start), scores the decoded frames in memory and returns the best one.
+Only the winning frame is ever encoded, by the caller.
+
+render_renditions then encodes that one decoded image at every rendition
+width in WebP and JPEG, so clients can fetch the smallest adequate copy,
+and preview_data_uri shrinks it to a tiny inline WebP shown while the real
+thumbnail loads.
+"""
+import base64
+import io
+import logging
+
+import cv2
+import numpy as np
+from django.core.files.base import ContentFile
+from PIL import Image, ImageDraw
+
+logger = logging.getLogger(__name__)
+
+# Candidate timestamps in seconds, as tried by the old one-ffmpeg-run-per-timestamp loop
+CANDIDATE_TIMES = (1, 3, 5, 10, 15, 20, 30)
+
+# Frames whose brightness range is this small are black or a flat colour
+MIN_LUMA_RANGE = 30
+
+# Frames are scored at this width, which is plenty for contrast/entropy
+SCORE_WIDTH = 160
+
+# Widths of the stored thumbnail renditions; the largest matches the original thumbnail
+RENDITION_WIDTHS = (96, 240, 480)
+
+# Rendition formats as (extension, PIL format, save options), preferred first
+RENDITION_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+
+# Width and WebP quality of the inline preview; it is shown blurred, so detail does not matter
+PREVIEW_WIDTH = 16
+PREVIEW_QUALITY = 40
+
+
+def candidate_times(duration=None):
+    """Candidate timestamps within the video, including 10% of the way in"""
+    if not duration:
+        return list(CANDIDATE_TIMES)
+    times = {t for t in CANDIDATE_TIMES if t < duration}
+    times.add(round(duration * 0.1, 3))
+    return sorted(times)
+
+
+def score_frame(frame):
+    """
+    Score a BGR frame for use as a thumbnail: the entropy of its luma
+    histogram (in bits) weighted by its contrast. Returns None for frames
+    that are black or a single colour.
+    """
+    h, w = frame.shape[:2]
+    if w > SCORE_WIDTH:
+        frame = cv2.resize(frame, (SCORE_WIDTH, max(1, h * SCORE_WIDTH // w)), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    low, high = int(gray.min()), int(gray.max())
+    if high - low <= MIN_LUMA_RANGE:
+        return None
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    p = hist[hist > 0] / gray.size
+    entropy = float(-(p * np.log2(p)).sum())
+    contrast = float(gray.std()) / 64.0
+    return entropy * min(1.0, contrast)
+
+
+def best_thumbnail_frame(video_path, duration=None):
+    """
+    Decode every candidate frame in one pass and return (frame, seconds,
+    score) for the best scoring one, or None if OpenCV cannot read the video
+    or every candidate is blank.
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            logger.info(f"OpenCV cannot open {video_path} for thumbnails")
+            return None
+
+        best = None
+        for seconds in candidate_times(duration):
+            # Seeks to the keyframe before the timestamp and decodes forward from there
+            cap.set(cv2.CAP_PROP_POS_MSEC, seconds * 1000)
+            ret, frame = cap.read()
+            if not ret:
+                logger.debug(f"No frame at {seconds}s")
+                continue
+            score = score_frame(frame)
+            logger.debug(f"Thumbnail candidate at {seconds}s scored {score}")
+            if score is not None and (best is None or score > best[2]):
+                best = (frame, seconds, score)
+        return best
+    finally:
+        cap.release()
+
+
+def frame_to_image(frame):
+    """PIL RGB image of a BGR frame"""
+    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+
+def placeholder_jpeg(text="True Vision"):
+    """JPEG bytes of the green placeholder shown while a thumbnail is missing or pending"""
+    img = Image.new('RGB', (480, 320), color=(32, 127, 77))
+    try:
+        ImageDraw.Draw(img).text((240, 160), text, fill=(255, 255, 255), anchor="mm")
+    except Exception as e:
+        logger.debug(f"Could not add text to placeholder: {e}")
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def rendition_name(video_id, width, ext):
+    """Deterministic storage name of one rendition"""
+    return f"thumbnails/renditions/{video_id}/{width}.{ext}"
+
+
+def render_renditions(img):
+    """
+    Encode an RGB PIL image at each of RENDITION_WIDTHS (never upscaling) in
+    each of RENDITION_FORMATS. Returns a list of (width, height, {ext: bytes}),
+    smallest first.
+    """
+    renditions = []
+    for width in RENDITION_WIDTHS:
+        if width >= img.width:
+            resized = img
+        else:
+            resized = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        encoded = {}
+        for ext, pil_format, options in RENDITION_FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, format=pil_format, **options)
+            encoded[ext] = buffer.getvalue()
+        renditions.append((resized.width, resized.height, encoded))
+        if resized is img:
+            # Larger widths would only repeat the full-size image
+            break
+    return renditions
+
+
+def store_renditions(storage, video_id, img, previous=None):
+    """
+    Render and save the renditions of `img` for a video, replacing the
+    `previous` ones so that the names stay deterministic. Returns the
+    records to keep on Video.Thumbnail_renditions.
+    """
+    for record in previous or []:
+        for ext, _, _ in RENDITION_FORMATS:
+            name = record.get(ext)
+            if name:
+                try:
+                    storage.delete(name)
+                except Exception as e:
+                    logger.warning(f"Could not delete old rendition {name}: {e}")
+
+    records = []
+    for width, height, encoded in render_renditions(img):
+        record = {'width': width, 'height': height}
+        for ext, data in encoded.items():
+            record[ext] = storage.save(rendition_name(video_id, width, ext), ContentFile(data))
+        records.append(record)
+        logger.debug(f"Stored {width}x{height} renditions: " + ", ".join(f"{ext} {len(data)} bytes" for ext, data in encoded.items()))
+    return records
+
+
+def pick_rendition(records, width, ext='webp'):
+    """
+    Storage name of the smallest rendition at least `width` pixels wide in
+    format `ext` (falling back to the largest one), or None if there are no
+    renditions in that format.
+    """
+    candidates = [r for r in records or [] if r.get(ext)]
+    if not candidates:
+        return None
+    candidates.sort(key=lambda r: r['width'])
+    for record in candidates:
+        if record['width'] >= width:
+            return record[ext]
+    return candidates[-1][ext]
+
+
+def preview_data_uri(img):
+    """A data: URI of a PREVIEW_WIDTH px wide WebP of `img`, a few hundred bytes long"""
+    height = max(1, round(img.height * PREVIEW_WIDTH / img.width))
+    buffer = io.BytesIO()
+    img.resize((PREVIEW_WIDTH, height), Image.BILINEAR).save(buffer, format='WEBP', quality=PREVIEW_QUALITY)
+    return 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
@@ -0,0 +1,69 @@
+"""
+Compact per-frame probability timeline for deepfake detection results
+"""
+import numpy as np
+
+# One record per detected face (or per sampled frame without a face);
+# faces the crop budget left unclassified have a NaN probability:
+# 4 bytes frame index, 1 byte face id, 2 bytes probability -> 7 bytes/record.
+# Face ids (tracker ids, which are unbounded) are stored modulo NO_FACE, so
+# after 255 tracks ids repeat in the timeline but never read as "no face"
+TIMELINE_DTYPE = np.dtype([
+    ('frame', '<u4'),
+    ('face', 'u1'),
+    ('prob', '<f2'),
+])
+
+# Face id used for sampled frames where no face was detected
+NO_FACE = 255
+
+
+def pack_timeline(results):
+    """
+    Pack detector results into the binary timeline format.
+    `results` holds (frame_no, 'no_face') and (frame_no, face_id, label, prob)
+    tuples as produced by detect_deepfake, prob being None for skipped faces.
+    Records are sorted by frame.
+    """
+    records = np.empty(len(results), dtype=TIMELINE_DTYPE)
+    for i, entry in enumerate(results):
+        if len(entry) == 2:
+            records[i] = (entry[0], NO_FACE, np.nan)
+        else:
+            frame_no, face_id, _label, prob = entry
+            records[i] = (frame_no, int(face_id) % NO_FACE, np.nan if prob is None else prob)
+    records.sort(order=['frame', 'face'], kind='stable')
+    return records.tobytes()
+
+
+def unpack_timeline(blob):
+    """Return a read-only structured array view over a packed timeline"""
+    if not blob:
+        return np.empty(0, dtype=TIMELINE_DTYPE)
+    return np.frombuffer(bytes(blob), dtype=TIMELINE_DTYPE)
+
+
+def slice_timeline(blob, start_frame=None, end_frame=None):
+    """
+    Return the packed bytes for records with start_frame <= frame < end_frame.
+    Records are sorted by frame, so this is a binary search plus a byte slice.
+    """
+    records = unpack_timeline(blob)
+    lo = 0 if start_frame is None else int(np.searchsorted(records['frame'], start_frame, side='left'))
+    hi = len(records) if end_frame is None else int(np.searchsorted(records['frame'], end_frame, side='left'))
+    hi = max(lo, hi)
+    size = TIMELINE_DTYPE.itemsize
+    return bytes(blob)[lo * size:hi * size], hi - lo
+
+
+def timeline_to_list(blob):
+    """Decode a packed timeline into a list of dicts (for JSON clients)"""
+    out = []
+    for frame_no, face_id, prob in unpack_timeline(blob).tolist():
+        if face_id == NO_FACE:
+            out.append({'frame': frame_no, 'face': None, 'prob': None})
+        elif np.isnan(prob):
+            out.append({'frame': frame_no, 'face': face_id, 'prob': None})
+        else:
+            out.append({'frame': frame_no, 'face': face_id, 'prob': round(float(prob), 4)})
+    return out
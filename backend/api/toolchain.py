@@ -0,0 +1,170 @@
+"""
+Media toolchain registry.
+
+ffmpeg and ffprobe are looked up once per process, the first time
+something needs them, so commands that never touch media spawn nothing.
+The first existing candidate path wins (FFMPEG_PATH/FFPROBE_PATH settings,
+the Heroku buildpack, the binaries extract_ffmpeg.py unpacks under
+backend/bin, then the system PATH). Each tool's version and filters are
+detected once as well, on first use, and kept with it. Everything that
+spawns ffmpeg or ffprobe asks this module for the binary instead of
+searching the filesystem itself.
+"""
+import glob
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+logger = logging.getLogger(__name__)
+
+TOOL_NAMES = ('ffmpeg', 'ffprobe')
+
+# Where extract_ffmpeg.py (or a manual download of a release) leaves the binaries
+LOCAL_BIN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin')
+
+# Seconds allowed for each version or filter query
+DETECT_TIMEOUT = 10
+
+_tools = {}
+_lock = threading.Lock()
+# Held while querying versions and filters, so that path lookups never wait on a subprocess
+_detect_lock = threading.Lock()
+
+
+class Tool:
+    """A resolved binary with its version and filters"""
+
+    def __init__(self, name, path, available):
+        self.name = name
+        self.path = path
+        self.available = available
+        self.version = None
+        self.filters = set()
+        self.detected = False
+
+    def has_filter(self, name):
+        return name in self.filters
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'path': self.path,
+            'available': self.available,
+            'version': self.version,
+            'filters': len(self.filters)
+        }
+
+
+def _setting(name):
+    """A Django setting, or the environment variable when run outside Django (e.g. find_ffmpeg.py)"""
+    from django.conf import settings
+    return getattr(settings, name, None) if settings.configured else os.environ.get(name)
+
+
+def _candidates(name):
+    exe = f'{name}.exe' if os.name == 'nt' else name
+    candidates = []
+    override = _setting(f'{name.upper()}_PATH')
+    if override:
+        candidates.append(override)
+    if os.environ.get('DYNO') is not None:
+        candidates += [
+            f'/app/vendor/ffmpeg/bin/{name}',
+            f'/app/vendor/ffmpeg/{name}',
+            f'/usr/bin/{name}',
+        ]
+    candidates += sorted(glob.glob(os.path.join(LOCAL_BIN_DIR, '*', 'bin', exe)), reverse=True)
+    candidates.append(os.path.join(LOCAL_BIN_DIR, 'bin', exe))
+    candidates.append(os.path.join(LOCAL_BIN_DIR, exe))
+    return candidates
+
+
+def _resolve(name):
+    """Path of the first existing candidate, made executable if need be"""
+    for path in _candidates(name):
+        if not os.path.exists(path):
+            continue
+        if not os.access(path, os.X_OK):
+            try:
+                os.chmod(path, 0o755)
+                logger.info(f"Made {path} executable")
+            except OSError as e:
+                logger.warning(f"{path} is not executable and could not be made so: {e}")
+                continue
+        return path
+    return shutil.which(name)
+
+
+def _run(path, *args):
+    try:
+        result = subprocess.run([path, '-hide_banner', *args], capture_output=True, text=True, timeout=DETECT_TIMEOUT)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.info(f"{path} {' '.join(args)} failed: {e}")
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def _parse_listing(output, pattern):
+    names = set()
+    for line in (output or '').splitlines():
+        match = re.match(pattern, line)
+        if match:
+            names.add(match.group(1))
+    return names
+
+
+def _detect(tool):
+    """Fill in the version and filters of an available tool"""
+    output = _run(tool.path, '-version')
+    if output is None:
+        tool.available = False
+        return
+    match = re.match(r'\S+ version (\S+)', output)
+    tool.version = match.group(1) if match else output.splitlines()[0] if output else None
+
+    # ffprobe shares ffmpeg's libraries, so ffmpeg's listing is the one that matters
+    if tool.name == 'ffmpeg':
+        # " TSC thumbnail         V->V       Select the most representative frame..."
+        tool.filters = _parse_listing(_run(tool.path, '-filters'), r'^\s[T.][S.][C.]?\s+(\w[\w-]*)\s')
+
+
+def get_tool(name, detect=True):
+    """
+    The registered Tool for `name` ('ffmpeg' or 'ffprobe'), resolving it on
+    first use. With detect=False only the path is resolved, which spawns no
+    process.
+    """
+    with _lock:
+        tool = _tools.get(name)
+        if tool is None:
+            path = _resolve(name)
+            tool = Tool(name, path or name, path is not None)
+            _tools[name] = tool
+            if path:
+                logger.info(f"Using {name} at {path}")
+            else:
+                logger.warning(f"{name} not found; features that need it are disabled")
+    if detect and tool.available and not tool.detected:
+        with _detect_lock:
+            if not tool.detected:
+                _detect(tool)
+                tool.detected = True
+                logger.info(f"{name} {tool.version}: {len(tool.filters)} filters")
+    return tool
+
+
+def ffmpeg_path():
+    return get_tool('ffmpeg', detect=False).path
+
+
+def ffprobe_path():
+    return get_tool('ffprobe', detect=False).path
+
+
+def reset():
+    """Forget every resolved tool, e.g. after installing ffmpeg"""
+    with _lock:
+        _tools.clear()
@@ -0,0 +1,107 @@
+"""
+Upload handler that inspects video uploads while they are still arriving.
+
+VideoProbeUploadHandler sits in front of Django's memory/temporary file
+handlers and passes every chunk on unchanged. On the way it hashes the
+`video` field and feeds it to a ContainerProbe, so the size and duration
+limits are checked as soon as the container header has been received
+rather than after the whole body has been stored and run through ffprobe.
+
+The handler is not installed globally: only the video upload views, which
+enforce these limits anyway, insert it into request.upload_handlers before
+the body is parsed (see ProbedUploadMixin). The view finds the result on
+`request.video_probe` (a VideoProbe), or the reason the upload was refused
+on `request.upload_rejection`.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from .containers import ContainerProbe
+from .metadata import cache_metadata
+
+logger = logging.getLogger(__name__)
+
+
+class VideoProbe:
+    """SHA-256, size and header metadata of an uploaded video"""
+
+    def __init__(self, sha256, size, format, metadata):
+        self.sha256 = sha256
+        self.size = size
+        self.format = format
+        # As returned by api.metadata.probe_video, None if the header could not be read
+        self.metadata = metadata
+
+    def __repr__(self):
+        return f"VideoProbe(sha256={self.sha256[:12]}..., size={self.size}, format={self.format}, metadata={self.metadata})"
+
+
+class VideoProbeUploadHandler(FileUploadHandler):
+    """Hash and probe the `video` upload field as it streams in"""
+    probe_field = 'video'
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.active = field_name == self.probe_field
+        if self.active:
+            self.digest = hashlib.sha256()
+            self.probe = ContainerProbe()
+            self.received = 0
+            self.max_size = getattr(settings, 'VIDEO_MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
+            self.max_duration = getattr(settings, 'VIDEO_MAX_DURATION', 30)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.active:
+            self.received += len(raw_data)
+            if self.max_size and self.received > self.max_size:
+                self._reject(
+                    f'File is too large. Maximum size is {self.max_size / 1024 / 1024:.0f}MB.'
+                )
+            self.digest.update(raw_data)
+            if not self.probe.done:
+                self.probe.feed(raw_data)
+                duration = self.probe.duration
+                if duration is not None and self.max_duration and int(duration) > self.max_duration:
+                    self._reject(
+                        f'Video is too long. Maximum duration is {self.max_duration} seconds. '
+                        f'Your video: {int(duration)} seconds'
+                    )
+        # Hand the chunk on to the handler that stores the file
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.active:
+            sha256 = self.digest.hexdigest()
+            details = self.probe.details()
+            self.request.video_probe = VideoProbe(
+                sha256=sha256,
+                size=file_size,
+                format=self.probe.format,
+                # Memoised so the views and thumbnail generation need not probe again
+                metadata=cache_metadata(sha256, details) if details else None
+            )
+            logger.info(f"Probed upload {self.file_name}: {self.request.video_probe}")
+        # Let the next handler return the file object
+        return None
+
+    def _reject(self, message):
+        logger.warning(f"Rejecting upload {self.file_name} after {self.received} bytes: {message}")
+        self.request.upload_rejection = message
+        # The rest of the body is read and discarded so the client gets the 400 response
+        raise StopUpload(connection_reset=False)
+
+
+class ProbedUploadMixin:
+    """
+    APIView mixin installing VideoProbeUploadHandler in front of the
+    default handlers for this view's requests. DRF views are csrf_exempt
+    and parse the body lazily, so the handler is in place before the body
+    is read.
+    """
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers.insert(0, VideoProbeUploadHandler(request))
+        return super().initialize_request(request, *args, **kwargs)
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CreateUserView, AnalysisViewSet, S3TestView, VideoUploadTestView, VideoViewSet, S3SignedURLView, S3ImageProxyView, S3ObjectExistsView, ChangePasswordView, DeleteAccountView, UserInfoView, DeepFakeDetectionView, ForgotPasswordView, ResetPasswordView, TestEmailView
+from .views import CreateUserView, AnalysisViewSet, S3TestView, VideoUploadTestView, VideoUploadStreamView, VideoPreflightView, VideoViewSet, S3SignedURLView, S3ImageProxyView, S3ObjectExistsView, ChangePasswordView, DeleteAccountView, UserInfoView, DeepFakeDetectionView, DetectionTimelineView, DetectionStatusView, ForgotPasswordView, ResetPasswordView, TestEmailView
 
 router = DefaultRouter()
 router.register(r'analysis', AnalysisViewSet, basename='analysis')
@@ -23,6 +23,8 @@ urlpatterns = [
     # S3 testing routes
     path('test/s3/', S3TestView.as_view(), name='test_s3_connection'),
     path('test/upload/', VideoUploadTestView.as_view(), name='test_video_upload'),
+    path('test/upload/stream/', VideoUploadStreamView.as_view(), name='test_video_upload_stream'),
+    path('test/upload/preflight/', VideoPreflightView.as_view(), name='test_video_upload_preflight'),
     
     # S3 utilities
     path('s3/signed-url/', S3SignedURLView.as_view(), name='s3_signed_url'),
@@ -39,6 +41,12 @@ urlpatterns = [
     
     # Analyze existing video (by ID)
     path('video/<int:video_id>/analyze/', DeepFakeDetectionView.as_view(), name='analyze_video'),
+    
+    # Per-frame probability timeline of the latest detection
+    path('video/<int:video_id>/timeline/', DetectionTimelineView.as_view(), name='video_timeline'),
+    
+    # Detection concurrency, queue depth and rejections
+    path('detection/status/', DetectionStatusView.as_view(), name='detection_status'),
 ]
 
 
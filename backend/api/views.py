@@ -8,19 +8,28 @@ from .models import Analysis, Video, Model, Detection, DetectionModel, CustomUse
 from .serializers import CustomUserSerializer, AnalysisSerializer, VideoSerializer
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import serializers
-import boto3
 from datetime import datetime
 from django.conf import settings
 from botocore.exceptions import ClientError
 import os
 import json
-import tempfile
-import subprocess
-import requests
 from django.http import HttpResponse, StreamingHttpResponse
 import mimetypes
 # Import the deepfake detector
-from .detector import detect_deepfake
+from .detector import detect_deepfake, DetectionCancelled
+from .spooling import spool_to_tempfile, SpooledUpload
+from .upload_handlers import ProbedUploadMixin
+from .timeline import slice_timeline, timeline_to_list, TIMELINE_DTYPE
+from .admission import get_detection_governor, AdmissionRejected, INTERACTIVE, BULK
+from .containers import ContainerProbe
+from .metadata import get_video_metadata
+from .s3 import get_s3_client, http_session
+from .presign import presign, expires_in as presign_expires_in
+from contextlib import nullcontext
+from rest_framework.utils.encoders import JSONEncoder
+from django.db import connection
+import queue
+import threading
 import logging
 from django.core.mail import send_mail
 from django.utils import timezone
@@ -28,6 +37,30 @@ from django.utils import timezone
 # Get the user model (now points to CustomUser)
 User = get_user_model()
 
+def admission_rejected_response(exc):
+    """429/503 response with Retry-After for a detection that was not admitted"""
+    return Response({
+        'success': False,
+        'error': exc.message,
+        'retry_after': exc.retry_after
+    }, status=exc.status_code, headers={'Retry-After': str(exc.retry_after)})
+
+def acquire_detection_slot(request, priority=INTERACTIVE, cost=None):
+    """
+    Reserve a detection slot for the requesting user. Returns (ticket, None),
+    or (None, response) with the 429/503 Retry-After response when the
+    detection was not admitted.
+    """
+    try:
+        return get_detection_governor().acquire(user=request.user.pk, priority=priority, cost=cost), None
+    except AdmissionRejected as e:
+        return None, admission_rejected_response(e)
+
+def upload_sha256(request):
+    """SHA-256 of the `video` upload computed by VideoProbeUploadHandler, if any"""
+    probe = getattr(request, 'video_probe', None)
+    return probe.sha256 if probe is not None else None
+
 class CreateUserView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
@@ -117,15 +150,8 @@ class S3TestView(APIView):
             settings_bucket = getattr(settings, 'AWS_STORAGE_BUCKET_NAME', 'not-set')
             settings_region = getattr(settings, 'AWS_S3_REGION_NAME', 'not-set')
             
-            # Create a boto3 session
-            session = boto3.session.Session(
-                aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-                aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-                region_name=settings_region  # Use settings value
-            )
-            
-            # Create S3 client
-            s3 = session.client('s3')
+            # Shared S3 client
+            s3 = get_s3_client()
             
             # Get bucket details
             bucket_name = settings_bucket  # Use settings value
@@ -179,7 +205,7 @@ class S3TestView(APIView):
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class VideoUploadTestView(APIView):
+class VideoUploadTestView(ProbedUploadMixin, APIView):
     """Test view for uploading videos to S3"""
     permission_classes = [IsAuthenticated]  # Allow only authenticated users
     parser_classes = [MultiPartParser, FormParser]
@@ -192,20 +218,43 @@ class VideoUploadTestView(APIView):
         
         logger.info(f"Video upload request received, detect_deepfake={run_detection}")
         
+        # Refused by VideoProbeUploadHandler while the body was arriving
+        rejection = getattr(request, 'upload_rejection', None)
+        if rejection:
+            return Response({'error': rejection}, status=status.HTTP_400_BAD_REQUEST)
+        
         if not video_file:
             logger.error("No video file provided in request")
             return Response({'error': 'No video file provided'}, 
                            status=status.HTTP_400_BAD_REQUEST)
         
-        # Check file size limit (5MB)
-        max_size = 5 * 1024 * 1024  # 5MB in bytes
+        # Check file size limit (5MB by default)
+        max_size = getattr(settings, 'VIDEO_MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
         if video_file.size > max_size:
             logger.error(f"Video file too large: {video_file.size} bytes (max: {max_size} bytes)")
             return Response(
-                {'error': f'File is too large. Maximum size is 5MB. Your file: {video_file.size/1024/1024:.2f}MB'}, 
+                {'error': f'File is too large. Maximum size is {max_size/1024/1024:.0f}MB. Your file: {video_file.size/1024/1024:.2f}MB'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Reserve a detection slot before doing any heavy work
+        ticket, rejected = acquire_detection_slot(request) if run_detection else (nullcontext(), None)
+        if rejected is not None:
+            return rejected
+        
+        return self._respond(request, ticket, video_file, run_detection)
+    
+    def _respond(self, request, ticket, video_file, run_detection):
+        """Process the upload while holding the admission ticket"""
+        with ticket:
+            return self._process_upload(request, video_file, run_detection)
+    
+    def _process_upload(self, request, video_file, run_detection, progress=None):
+        """
+        Store the video, run detection if requested and record the analysis.
+        `progress` receives the storing and detection progress events.
+        """
+        logger = logging.getLogger(__name__)
         logger.info(f"Got video file: {video_file.name}, size: {video_file.size} bytes")
         
         try:
@@ -213,14 +262,15 @@ class VideoUploadTestView(APIView):
             user = request.user
             logger.info(f"Processing upload for user: {user.username}")
             
-            # Get video metadata using FFprobe
+            # Memoised by the upload handler when it could read the container header
             logger.info("Extracting video metadata...")
-            video_metadata = self.get_video_metadata(video_file)
+            video_metadata = get_video_metadata(video_file, sha256=upload_sha256(request))
             logger.info(f"Video metadata: {video_metadata}")
             
-            # Check video duration limit (30 seconds)
-            max_duration = 30  # seconds
-            duration = video_metadata.get('duration', 0)
+            # Check video duration limit (30 seconds by default)
+            max_duration = getattr(settings, 'VIDEO_MAX_DURATION', 30)
+            # Whole seconds, as stored in Video.Length
+            duration = int(video_metadata.get('duration', 0))
             if duration > max_duration:
                 logger.error(f"Video duration too long: {duration} seconds (max: {max_duration} seconds)")
                 return Response(
@@ -234,15 +284,19 @@ class VideoUploadTestView(APIView):
                 User_id=user,
                 Video_File=video_file,
                 size=video_file.size,
-                Length=video_metadata.get('duration', 0),
+                Length=int(video_metadata.get('duration', 0)),
                 Resolution=video_metadata.get('resolution', '0x0'),
-                Frame_per_Second=video_metadata.get('fps', 0)
+                Frame_per_Second=int(video_metadata.get('fps', 0))
             )
             
             # Save the video (this will trigger the save method that generates thumbnail)
             logger.info("Saving video...")
+            if progress is not None:
+                progress({"stage": "storing", "progress": 0.0})
             video.save()
             logger.info(f"Video saved successfully with ID: {video.Video_id}")
+            if progress is not None:
+                progress({"stage": "stored", "progress": 0.0, "video_id": video.Video_id})
             
             # Store thumbnail URL and video details for response
             thumbnail_url = video.Thumbnail.url if video.Thumbnail else None
@@ -270,7 +324,7 @@ class VideoUploadTestView(APIView):
             if run_detection:
                 try:
                     logger.info("Running deepfake detection...")
-                    detection, is_fake, confidence, metadata = detect_deepfake(video)
+                    detection, is_fake, confidence, metadata = detect_deepfake(video, progress=progress)
                     
                     detection_info = {
                         "is_fake": is_fake,
@@ -283,6 +337,8 @@ class VideoUploadTestView(APIView):
                     }
                     logger.info(f"Detection completed: {detection_info}")
                     
+                except DetectionCancelled:
+                    raise
                 except Exception as e:
                     logger.error(f"Deepfake detection failed: {str(e)}", exc_info=True)
                     # Keep default detection info on error
@@ -338,6 +394,8 @@ class VideoUploadTestView(APIView):
                 'detection_result': detection_info
             }, status=status.HTTP_201_CREATED)
             
+        except DetectionCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error in VideoUploadTestView: {str(e)}", exc_info=True)
             # Clean up video file from memory
@@ -350,104 +408,161 @@ class VideoUploadTestView(APIView):
                 'success': False,
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class VideoUploadStreamView(VideoUploadTestView):
+    """
+    Same upload as VideoUploadTestView, but the response is a Server-Sent
+    Events stream: `progress` events while the video is stored and analysed
+    (stage, overall progress, frames processed, running probability), then a
+    single `result` event with the usual response body and its status code.
+    Uploads refused before processing starts (upload limits, admission) get
+    a single `error` event carrying the status code instead.
     
-    def get_video_metadata(self, video_file):
-        """Extract metadata from video file"""
-        metadata = {
-            'duration': 0,
-            'resolution': '0x0',
-            'fps': 0
-        }
-        
+    The work runs in a thread on a copy of the upload that the thread owns,
+    since Django deletes its temporary upload files when the request ends.
+    If the client disconnects the stream is closed and the detection is
+    cancelled at its next progress event.
+    """
+    # Send a comment line when nothing happened for this long so proxies keep the stream open
+    KEEPALIVE_INTERVAL = 15
+    
+    def post(self, request, *args, **kwargs):
+        response = super().post(request, *args, **kwargs)
+        if isinstance(response, StreamingHttpResponse):
+            return response
+        # Refused before the stream started; the client only reads events
+        events = queue.Queue()
+        events.put(('error', {'status': response.status_code, **response.data}))
+        events.put(None)
+        rejected = self._event_stream(events)
+        if response.has_header('Retry-After'):
+            rejected['Retry-After'] = response['Retry-After']
+        return rejected
+    
+    def _respond(self, request, ticket, video_file, run_detection):
+        logger = logging.getLogger(__name__)
+        events = queue.Queue()
+        cancelled = threading.Event()
         try:
-            # Create a temporary file for FFprobe to analyze
-            temp_file_path = None
-            with tempfile.NamedTemporaryFile(suffix=os.path.splitext(video_file.name)[1], delete=False) as temp_file:
-                # Save the uploaded file to the temporary file in chunks to reduce memory usage
-                temp_file_path = temp_file.name
-                chunk_size = 1024 * 1024  # Process in 1MB chunks
-                for chunk in video_file.chunks(chunk_size):
-                    temp_file.write(chunk)
-                    # Clear chunk from memory
-                    chunk = None
-                    # Periodically collect garbage
-                    if chunk_size % 5 == 0:
-                        import gc
-                        gc.collect()
-                temp_file.flush()
-            
-            # Use FFprobe to extract metadata
-            cmd = [
-                'ffprobe',
-                '-v', 'error',
-                '-select_streams', 'v:0',
-                '-show_entries', 'stream=width,height,r_frame_rate,duration',
-                '-of', 'json',
-                temp_file_path
-            ]
-            
+            upload = SpooledUpload(spool_to_tempfile(video_file, copy=True), video_file.name,
+                                   getattr(video_file, 'content_type', None))
+        except Exception as e:
+            logger.error(f"Could not spool upload {video_file.name}: {str(e)}", exc_info=True)
+            # The thread that would have released the slot never starts
+            ticket.__exit__(None, None, None)
+            return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        def on_progress(event):
+            if cancelled.is_set():
+                raise DetectionCancelled("Client disconnected")
+            events.put(('progress', event))
+        
+        def run():
             try:
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                probe_data = json.loads(result.stdout)
-                
-                # Extract metadata
-                if 'streams' in probe_data and len(probe_data['streams']) > 0:
-                    stream = probe_data['streams'][0]
-                    
-                    # Get resolution
-                    width = stream.get('width', 0)
-                    height = stream.get('height', 0)
-                    metadata['resolution'] = f"{width}x{height}"
-                    
-                    # Get duration
-                    if 'duration' in stream:
-                        metadata['duration'] = int(float(stream['duration']))
-                    
-                    # Get FPS (frame rate)
-                    if 'r_frame_rate' in stream:
-                        frame_rate = stream['r_frame_rate']
-                        if '/' in frame_rate:
-                            num, den = frame_rate.split('/')
-                            metadata['fps'] = int(float(num) / float(den))
-                        else:
-                            metadata['fps'] = int(float(frame_rate))
-            except (subprocess.CalledProcessError, json.JSONDecodeError, ValueError) as e:
-                print(f"Error extracting metadata: {e}")
-                # Use some default values
-                metadata = {
-                    'duration': 10,
-                    'resolution': '640x480',
-                    'fps': 30
-                }
+                with ticket:
+                    response = self._process_upload(request, upload, run_detection, progress=on_progress)
+                events.put(('result', {'status': response.status_code, **response.data}))
+            except DetectionCancelled:
+                logger.info(f"Upload of {upload.name} cancelled, the client disconnected")
+            except Exception as e:
+                logger.error(f"Error in VideoUploadStreamView: {str(e)}", exc_info=True)
+                events.put(('error', {'status': 500, 'success': False, 'error': str(e)}))
             finally:
-                # Clear result variables
-                result = None
-                probe_data = None
-                
-                # Clean up temporary file
-                if temp_file_path and os.path.exists(temp_file_path):
+                upload.close()
+                # This thread opened its own database connection
+                connection.close()
+                events.put(None)
+        
+        threading.Thread(target=run, name='upload-stream', daemon=True).start()
+        return self._event_stream(events, cancelled)
+    
+    def _event_stream(self, events, cancelled=None):
+        """
+        SSE response for the (event, data) items put on `events`, ending at
+        None. `cancelled` is set if the client goes away before the end.
+        """
+        def stream():
+            try:
+                # Send something straight away so the client sees the response headers
+                yield ': stream opened\n\n'
+                while True:
                     try:
-                        os.unlink(temp_file_path)
-                    except Exception as e:
-                        print(f"Error deleting temp file: {e}")
-            
-            # Reset file pointer for further processing
-            video_file.seek(0)
-            
-            # Force garbage collection
-            import gc
-            gc.collect()
-            
-        except Exception as e:
-            print(f"Error in metadata extraction: {e}")
-            # Use default values
-            metadata = {
-                'duration': 10,
-                'resolution': '640x480',
-                'fps': 30
-            }
+                        item = events.get(timeout=self.KEEPALIVE_INTERVAL)
+                    except queue.Empty:
+                        yield ': keepalive\n\n'
+                        continue
+                    if item is None:
+                        return
+                    event, data = item
+                    yield f"event: {event}\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n"
+            except GeneratorExit:
+                # Closed while waiting for the next event: the client went away
+                if cancelled is not None:
+                    cancelled.set()
+                raise
         
-        return metadata
+        response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class VideoPreflightView(APIView):
+    """
+    Check a video against the upload limits before it is uploaded. Takes the
+    declared `size` and optionally the first (`head`) and last (`tail`) few
+    hundred KB of the file, and answers from the container header alone.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+    
+    # Largest head/tail sample accepted
+    MAX_SAMPLE_BYTES = 1024 * 1024
+    
+    def post(self, request, *args, **kwargs):
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            return Response({'error': 'The declared file size is required'}, 
+                           status=status.HTTP_400_BAD_REQUEST)
+        
+        samples = {}
+        for name in ('head', 'tail'):
+            sample = request.FILES.get(name)
+            if sample is None:
+                continue
+            if sample.size > self.MAX_SAMPLE_BYTES or sample.size > size:
+                return Response({'error': f'The {name} sample is too large'}, 
+                               status=status.HTTP_400_BAD_REQUEST)
+            samples[name] = sample.read()
+        
+        max_size = getattr(settings, 'VIDEO_MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
+        max_duration = getattr(settings, 'VIDEO_MAX_DURATION', 30)
+        reasons = []
+        if size > max_size:
+            reasons.append(f'File is too large. Maximum size is {max_size/1024/1024:.0f}MB. Your file: {size/1024/1024:.2f}MB')
+        
+        # Read what the container header tells us; an MP4 index at the end of the file is found in the tail
+        probe = ContainerProbe()
+        if not reasons and 'head' in samples:
+            probe.feed(samples['head'])
+            if not probe.done and 'tail' in samples:
+                probe.feed_at(samples['tail'], size - len(samples['tail']))
+        
+        if probe.duration is not None and int(probe.duration) > max_duration:
+            reasons.append(f'Video is too long. Maximum duration is {max_duration} seconds. Your video: {int(probe.duration)} seconds')
+        
+        return Response({
+            'accepted': not reasons,
+            'reasons': reasons,
+            # False when the header could not be read; the upload is then checked with FFprobe
+            'checked': probe.duration is not None,
+            'format': probe.format,
+            'duration': probe.duration,
+            'resolution': f"{probe.width}x{probe.height}" if probe.width and probe.height else None,
+            'fps': probe.fps,
+            'max_size': max_size,
+            'max_duration': max_duration
+        })
 
 # Add VideoViewSet to show videos in dashboard
 class VideoViewSet(viewsets.ModelViewSet):
@@ -490,31 +605,16 @@ class S3SignedURLView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
             
         try:
-            # Create a boto3 session
-            session = boto3.session.Session(
-                aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-                aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-                region_name=os.environ.get('AWS_S3_REGION_NAME', 'us-west-2')
-            )
-            
-            s3_client = session.client('s3')
-            
-            # Get the bucket name
-            bucket_name = os.environ.get('AWS_STORAGE_BUCKET_NAME', 'true-vision')
-            
-            # Generate a signed URL that lasts for 3600 seconds (1 hour)
-            signed_url = s3_client.generate_presigned_url(
-                'get_object',
-                Params={
-                    'Bucket': bucket_name,
-                    'Key': s3_key
-                },
-                ExpiresIn=3600
-            )
+            # Signed for the current window, so repeated requests get the same cacheable URL
+            signed_url = presign(s3_key)
+            if signed_url is None:
+                return Response({
+                    'error': f'Could not sign a URL for {s3_key}'
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
             return Response({
                 'signed_url': signed_url,
-                'expires_in': 3600,
+                'expires_in': presign_expires_in(),
                 'original_key': s3_key
             })
             
@@ -558,13 +658,8 @@ class S3ImageProxyView(APIView):
             signed_url = None
             if key:
                 try:
-                    # Create S3 client
-                    s3_client = boto3.client(
-                        's3',
-                        aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-                        aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-                        region_name=settings.AWS_S3_REGION_NAME
-                    )
+                    # Shared S3 client
+                    s3_client = get_s3_client()
                     
                     # Check if the object exists
                     try:
@@ -623,7 +718,7 @@ class S3ImageProxyView(APIView):
             url_to_fetch = signed_url if signed_url else url
             
             # Make request to the URL with stream=True to avoid loading entire content into memory
-            response = requests.get(url_to_fetch, stream=True)
+            response = http_session().get(url_to_fetch, stream=True, timeout=30)
             
             # Check if request was successful
             if response.status_code != 200:
@@ -677,7 +772,7 @@ class S3ImageProxyView(APIView):
         try:
             # Try to fetch a placeholder from a public URL
             placeholder_url = "https://placehold.co/600x400?text=No+Image+Found"
-            response = requests.get(placeholder_url, stream=True)
+            response = http_session().get(placeholder_url, stream=True, timeout=30)
             
             if response.status_code == 200:
                 # Use StreamingHttpResponse for the placeholder too
@@ -732,13 +827,8 @@ class S3ObjectExistsView(APIView):
                            status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Create S3 client
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-                aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-                region_name=settings.AWS_S3_REGION_NAME
-            )
+            # Shared S3 client
+            s3_client = get_s3_client()
             
             # Check if the object exists
             exists = True
@@ -825,6 +915,34 @@ class DeepFakeDetectionView(APIView):
                 'error': 'Either video file or video_id must be provided'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        if video_id:
+            try:
+                video_id = int(video_id)
+            except (TypeError, ValueError):
+                logger.error(f"Invalid video_id: {video_id!r}")
+                return Response({
+                    'error': 'video_id must be an integer'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Re-analysing a stored video is bulk work, costed by its length;
+        # uploads are interactive. Reserve a slot before doing any heavy work.
+        if video_id:
+            priority = BULK
+            cost = (Video.objects.filter(Video_id=video_id, User_id=request.user)
+                    .values_list('Length', flat=True).first())
+        else:
+            priority, cost = INTERACTIVE, None
+        ticket, rejected = acquire_detection_slot(request, priority=priority, cost=cost)
+        if rejected is not None:
+            return rejected
+        
+        with ticket:
+            return self._detect(request, video_file, video_id)
+    
+    def _detect(self, request, video_file, video_id):
+        """Store the upload (or load the stored video) and run detection on it"""
+        logger = logging.getLogger(__name__)
+        
         try:
             # Get the video object
             video = None
@@ -845,7 +963,7 @@ class DeepFakeDetectionView(APIView):
                 logger.info(f"Uploading new video for user: {user.username}")
                 
                 # Get video metadata
-                video_metadata = self._get_video_metadata(video_file)
+                video_metadata = get_video_metadata(video_file, sha256=upload_sha256(request))
                 logger.info(f"Video metadata: {video_metadata}")
                 
                 # Create video object
@@ -853,9 +971,9 @@ class DeepFakeDetectionView(APIView):
                     User_id=user,
                     Video_File=video_file,
                     size=video_file.size,
-                    Length=video_metadata.get('duration', 0),
+                    Length=int(video_metadata.get('duration', 0)),
                     Resolution=video_metadata.get('resolution', '0x0'),
-                    Frame_per_Second=video_metadata.get('fps', 0)
+                    Frame_per_Second=int(video_metadata.get('fps', 0))
                 )
                 video.save()
                 logger.info(f"New video created with ID: {video.Video_id}")
@@ -958,104 +1076,63 @@ class DeepFakeDetectionView(APIView):
                 'success': False,
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class DetectionTimelineView(APIView):
+    """Serve slices of the stored per-frame probability timeline for a video"""
+    permission_classes = [IsAuthenticated]
     
-    def _get_video_metadata(self, video_file):
-        """Extract metadata from video file (optimized for memory usage)"""
-        metadata = {
-            'duration': 0,
-            'resolution': '0x0',
-            'fps': 0
-        }
+    def get(self, request, video_id):
+        """
+        Return the timeline of the latest detection for the video.
+        Optional query params: start / end (frame range, end exclusive) and
+        format=json. The default response is the packed binary records.
+        """
+        try:
+            video = Video.objects.get(Video_id=video_id, User_id=request.user)
+        except Video.DoesNotExist:
+            return Response({'error': 'Video not found or access denied'},
+                            status=status.HTTP_404_NOT_FOUND)
+        
+        deepfake_detection = (DeepFakeDetection.objects
+                              .filter(detection__Video_id=video)
+                              .exclude(timeline__isnull=True)
+                              .order_by('-created_at')
+                              .first())
+        if deepfake_detection is None:
+            return Response({'error': 'No timeline stored for this video'},
+                            status=status.HTTP_404_NOT_FOUND)
         
         try:
-            # Create a temporary file for FFprobe to analyze
-            temp_file_path = None
-            with tempfile.NamedTemporaryFile(suffix=os.path.splitext(video_file.name)[1], delete=False) as temp_file:
-                # Save the uploaded file to the temporary file in chunks to reduce memory usage
-                temp_file_path = temp_file.name
-                chunk_size = 1024 * 1024  # Process in 1MB chunks
-                for chunk in video_file.chunks(chunk_size):
-                    temp_file.write(chunk)
-                    # Clear chunk from memory
-                    chunk = None
-                    # Periodically collect garbage
-                    if chunk_size % 5 == 0:
-                        import gc
-                        gc.collect()
-                temp_file.flush()
-            
-            # Use FFprobe to extract metadata
-            cmd = [
-                'ffprobe',
-                '-v', 'error',
-                '-select_streams', 'v:0',
-                '-show_entries', 'stream=width,height,r_frame_rate,duration',
-                '-of', 'json',
-                temp_file_path
-            ]
-            
-            try:
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                probe_data = json.loads(result.stdout)
-                
-                # Extract metadata
-                if 'streams' in probe_data and len(probe_data['streams']) > 0:
-                    stream = probe_data['streams'][0]
-                    
-                    # Get resolution
-                    width = stream.get('width', 0)
-                    height = stream.get('height', 0)
-                    metadata['resolution'] = f"{width}x{height}"
-                    
-                    # Get duration
-                    if 'duration' in stream:
-                        metadata['duration'] = int(float(stream['duration']))
-                    
-                    # Get FPS (frame rate)
-                    if 'r_frame_rate' in stream:
-                        frame_rate = stream['r_frame_rate']
-                        if '/' in frame_rate:
-                            num, den = frame_rate.split('/')
-                            metadata['fps'] = int(float(num) / float(den))
-                        else:
-                            metadata['fps'] = int(float(frame_rate))
-            except (subprocess.CalledProcessError, json.JSONDecodeError, ValueError) as e:
-                print(f"Error extracting metadata: {e}")
-                # Use some default values
-                metadata = {
-                    'duration': 10,
-                    'resolution': '640x480',
-                    'fps': 30
-                }
-            finally:
-                # Clear result variables
-                result = None
-                probe_data = None
-                
-                # Clean up temporary file
-                if temp_file_path and os.path.exists(temp_file_path):
-                    try:
-                        os.unlink(temp_file_path)
-                    except Exception as e:
-                        print(f"Error deleting temp file: {e}")
-                        
-            # Reset file pointer for further processing
-            video_file.seek(0)
-            
-            # Force garbage collection
-            import gc
-            gc.collect()
-            
-        except Exception as e:
-            print(f"Error in metadata extraction: {e}")
-            # Use default values
-            metadata = {
-                'duration': 10,
-                'resolution': '640x480',
-                'fps': 30
-            }
+            start = request.query_params.get('start')
+            end = request.query_params.get('end')
+            start = int(start) if start not in (None, '') else None
+            end = int(end) if end not in (None, '') else None
+        except ValueError:
+            return Response({'error': 'start and end must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        data, count = slice_timeline(deepfake_detection.timeline, start, end)
         
-        return metadata
+        if request.query_params.get('format') == 'json':
+            return Response({
+                'video_id': video.Video_id,
+                'frame_count': deepfake_detection.frame_count,
+                'records': timeline_to_list(data)
+            })
+        
+        response = HttpResponse(data, content_type='application/octet-stream')
+        response['X-Timeline-Dtype'] = 'frame:<u4,face:u1,prob:<f2'
+        response['X-Timeline-Record-Size'] = str(TIMELINE_DTYPE.itemsize)
+        response['X-Timeline-Records'] = str(count)
+        response['X-Timeline-Frame-Count'] = str(deepfake_detection.frame_count)
+        return response
+
+class DetectionStatusView(APIView):
+    """Queue depth and rejection counters of the detection admission governor"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        return Response(get_detection_governor().stats())
 
 # ... existing code ...
 
@@ -180,11 +180,109 @@ if os.environ.get('AWS_ACCESS_KEY_ID'):
     
     AWS_LOCATION = 'media'
     
+    # Spill S3 file objects to disk above this size instead of buffering them in memory
+    AWS_S3_MAX_MEMORY_SIZE = int(os.environ.get('AWS_S3_MAX_MEMORY_SIZE', 1024 * 1024))
+    
     # Enable S3 as the default file storage
     DEFAULT_FILE_STORAGE = 'api.models.S3MediaStorage'
     # For static files, you could also use S3 in production:
     # STATICFILES_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 
+# Uploads larger than this are streamed to a temporary file instead of held in memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get('FILE_UPLOAD_MAX_MEMORY_SIZE', 1024 * 1024))
+# Limits of the video upload views, also checked while the upload streams in (see api.upload_handlers)
+VIDEO_MAX_UPLOAD_SIZE = int(os.environ.get('VIDEO_MAX_UPLOAD_SIZE', 5 * 1024 * 1024))  # bytes
+VIDEO_MAX_DURATION = int(os.environ.get('VIDEO_MAX_DURATION', 30))  # seconds
+# Background thumbnail generation (see api.thumbnail_queue); off runs it inside the upload request
+THUMBNAIL_ASYNC = os.environ.get('THUMBNAIL_ASYNC', 'true').lower() == 'true'
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+THUMBNAIL_MAX_ATTEMPTS = int(os.environ.get('THUMBNAIL_MAX_ATTEMPTS', 3))
+THUMBNAIL_TASK_TIMEOUT = int(os.environ.get('THUMBNAIL_TASK_TIMEOUT', 300))  # seconds before a running task counts as stale
+THUMBNAIL_RETRY_BACKOFF = int(os.environ.get('THUMBNAIL_RETRY_BACKOFF', 30))  # seconds before the first retry, doubled after each failure
+THUMBNAIL_DEFAULT_WIDTH = int(os.environ.get('THUMBNAIL_DEFAULT_WIDTH', 240))  # rendition width handed out when the client does not ask for one
+
+# Shared S3 client (see api.s3): connection pool per process, timeouts in seconds
+AWS_S3_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_S3_MAX_POOL_CONNECTIONS', 50))
+AWS_S3_CONNECT_TIMEOUT = float(os.environ.get('AWS_S3_CONNECT_TIMEOUT', 5))
+AWS_S3_READ_TIMEOUT = float(os.environ.get('AWS_S3_READ_TIMEOUT', 30))
+AWS_S3_MAX_ATTEMPTS = int(os.environ.get('AWS_S3_MAX_ATTEMPTS', 3))
+AWS_S3_CLIENT_ENDPOINT_URL = os.environ.get('AWS_S3_CLIENT_ENDPOINT_URL')  # e.g. a local S3 stand-in
+
+# Presigned URLs (see api.presign): every URL signed in the same PRESIGN_WINDOW
+# seconds is identical and stays valid PRESIGN_GRACE seconds past the window
+PRESIGN_WINDOW = int(os.environ.get('PRESIGN_WINDOW', 3600))
+PRESIGN_GRACE = int(os.environ.get('PRESIGN_GRACE', 3600))
+
+# Media toolchain (see api.toolchain); unset means search the usual locations
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH')
+FFPROBE_PATH = os.environ.get('FFPROBE_PATH')
+
+# Deepfake detector tuning. Every approximation below is off by default, so
+# verdicts match the original detector until a deployment opts in.
+# Run the SSD face detector only on keyframes and track faces in between. Faces
+# between keyframes are template-matched rather than detected, so the crops (and
+# the verdict) can differ from running SSD on every sampled frame.
+DETECTOR_TRACK_FACES = os.environ.get('DETECTOR_TRACK_FACES', 'false').lower() == 'true'
+DETECTOR_KEYFRAME_INTERVAL = int(os.environ.get('DETECTOR_KEYFRAME_INTERVAL', 5))  # in sampled frames
+DETECTOR_TRACK_MIN_CONFIDENCE = float(os.environ.get('DETECTOR_TRACK_MIN_CONFIDENCE', 0.5))
+# Classify only the most informative face crops, within the caps below (see
+# api.detector.CropSelector). Off classifies every detected face as the original
+# detector did; on, the verdict rests on a subset of the crops and can differ.
+DETECTOR_SELECT_CROPS = os.environ.get('DETECTOR_SELECT_CROPS', 'false').lower() == 'true'
+DETECTOR_MAX_FACES_PER_FRAME = int(os.environ.get('DETECTOR_MAX_FACES_PER_FRAME', 4))
+DETECTOR_MAX_CROPS_PER_TRACK = int(os.environ.get('DETECTOR_MAX_CROPS_PER_TRACK', 24))
+DETECTOR_MAX_CROPS_TOTAL = int(os.environ.get('DETECTOR_MAX_CROPS_TOTAL', 200))
+DETECTOR_MIN_FACE_SIZE = int(os.environ.get('DETECTOR_MIN_FACE_SIZE', 40))  # pixels, short side
+# Reuse the faces of a near-duplicate sampled frame and the probability of a
+# near-duplicate face crop instead of running the models again (see api.detector.dhash).
+# Off runs every sampled frame and crop through the models as the original detector
+# did; on, a reused result can differ slightly from what the models would return.
+DETECTOR_HASH_REUSE = os.environ.get('DETECTOR_HASH_REUSE', 'false').lower() == 'true'
+# Max dHash hamming distance for a sampled frame / face crop to count as a near-duplicate
+DETECTOR_FRAME_HASH_THRESHOLD = int(os.environ.get('DETECTOR_FRAME_HASH_THRESHOLD', 2))
+DETECTOR_CROP_HASH_THRESHOLD = int(os.environ.get('DETECTOR_CROP_HASH_THRESHOLD', 3))
+# Frames read per analysis pass (300 frames = 100 sampled frames at interval 3)
+DETECTOR_MAX_FRAMES = int(os.environ.get('DETECTOR_MAX_FRAMES', 300))
+# Cheap-first cascade: a reduced-resolution, sparser pass decides clear-cut videos
+# and only averages within DETECTOR_CASCADE_BAND of 0.5 escalate to the full pass
+DETECTOR_CASCADE = os.environ.get('DETECTOR_CASCADE', 'false').lower() == 'true'
+DETECTOR_CASCADE_INPUT_SIZE = int(os.environ.get('DETECTOR_CASCADE_INPUT_SIZE', 112))
+DETECTOR_CASCADE_SAMPLE_INTERVAL = int(os.environ.get('DETECTOR_CASCADE_SAMPLE_INTERVAL', 9))
+DETECTOR_CASCADE_BAND = float(os.environ.get('DETECTOR_CASCADE_BAND', 0.15))
+# Micro-batch face crops from concurrent detections into shared classifier passes.
+# A batch is flushed when it is full or its oldest request has waited MAX_WAIT_MS.
+DETECTOR_MICROBATCH = os.environ.get('DETECTOR_MICROBATCH', 'true').lower() == 'true'
+DETECTOR_MICROBATCH_MAX_SIZE = int(os.environ.get('DETECTOR_MICROBATCH_MAX_SIZE', 16))
+DETECTOR_MICROBATCH_MAX_WAIT_MS = float(os.environ.get('DETECTOR_MICROBATCH_MAX_WAIT_MS', 10))
+# Segment-parallel analysis, off by default: split each pass at keyframes into ranges
+# analysed in a process pool (one decoder and model per worker, never more workers
+# than CPUs). Without INFERENCE_SOCKET every worker loads its own copy of the models
+# (several hundred MB each) on top of the web process's. Results match a serial pass
+# while DETECTOR_TRACK_FACES, DETECTOR_HASH_REUSE and DETECTOR_SELECT_CROPS are off;
+# with any of them on, state restarts at each segment and the verdict can differ.
+DETECTOR_SEGMENTED = os.environ.get('DETECTOR_SEGMENTED', 'false').lower() == 'true'
+DETECTOR_SEGMENT_WORKERS = int(os.environ.get('DETECTOR_SEGMENT_WORKERS', 2))
+DETECTOR_SEGMENT_MIN_FRAMES = int(os.environ.get('DETECTOR_SEGMENT_MIN_FRAMES', 60))
+# Unix socket of the shared inference server (python manage.py run_inference_server).
+# The server must run on the same host as the web workers; when unset or
+# unreachable each worker loads the models itself.
+INFERENCE_SOCKET = os.environ.get('INFERENCE_SOCKET', '')
+
+# Detection admission control (see api.admission). Detections beyond the slots
+# wait in a bounded queue; a full queue answers 429, a timed-out wait 503. The queue
+# is per process, so the web process needs threaded workers (gunicorn gthread, see
+# the Procfile and GUNICORN_THREADS) for it to see more than one request at a time.
+DETECTION_PROCESS_SLOTS = int(os.environ.get('DETECTION_PROCESS_SLOTS', 1))  # per worker process
+DETECTION_HOST_SLOTS = int(os.environ.get('DETECTION_HOST_SLOTS', 2))  # across workers on a host, 0 disables
+DETECTION_MAX_QUEUE = int(os.environ.get('DETECTION_MAX_QUEUE', 4))
+DETECTION_QUEUE_TIMEOUT = float(os.environ.get('DETECTION_QUEUE_TIMEOUT', 30))  # seconds
+DETECTION_SLOT_DIR = os.environ.get('DETECTION_SLOT_DIR', '')
+# Waiting detections are fair-queued per user (deficit round-robin, costs in seconds
+# of video) with uploads ahead of re-analysis; each user runs at most USER_SLOTS at once
+DETECTION_USER_SLOTS = int(os.environ.get('DETECTION_USER_SLOTS', 1))
+DETECTION_DRR_QUANTUM = float(os.environ.get('DETECTION_DRR_QUANTUM', 30))  # seconds of video per round
+DETECTION_DEFAULT_COST = float(os.environ.get('DETECTION_DEFAULT_COST', 30))  # when the length is unknown
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Benchmark of the detector's decode loop with and without FrameRing.
+
+The baseline decodes every frame with cap.read(), which allocates a new
+array per frame, drops it and runs gc.collect() every 50 frames, as the
+detector used to. The ring loop decodes only the sampled frames into
+reused buffers and grab()s the others, as _analyse_video does now.
+Baseline allocations are one per decoded frame, since cap.read() without an
+output array always returns a new one; the ring's come from FrameRing.stats().
+
+Usage: python bench_frame_ring.py [video] [--sample-interval 3] [--repeat 3]
+Without a video a synthetic 640x480 clip of --frames frames is generated.
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+import django
+django.setup()
+
+from api.detector import FrameRing
+
+
+def make_clip(path, frames, width=640, height=480, fps=30):
+    """Write a synthetic clip of moving noise blocks"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    rng = np.random.default_rng(0)
+    base = (rng.random((height, width, 3)) * 255).astype(np.uint8)
+    for i in range(frames):
+        writer.write(np.roll(base, i * 4, axis=1))
+    writer.release()
+
+
+def baseline(path, sample_interval):
+    """Old loop: a new array for every decoded frame, periodic gc.collect()"""
+    cap = cv2.VideoCapture(path)
+    frames = allocations = 0
+    start = time.perf_counter()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        allocations += 1
+        if frames % sample_interval == 0:
+            frame.mean()  # stand-in for the per-sample work
+        del frame
+        frames += 1
+        if frames % 50 == 0:
+            gc.collect()
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return {"frames": frames, "allocations": allocations, "reuses": 0, "skipped_frames": 0, "seconds": elapsed}
+
+
+def with_ring(path, sample_interval):
+    """New loop: sampled frames decoded into reused buffers, the rest grabbed"""
+    cap = cv2.VideoCapture(path)
+    ring = FrameRing(size=2)
+    frames = 0
+    start = time.perf_counter()
+    while True:
+        if frames % sample_interval == 0:
+            ret, frame = ring.read(cap)
+            if ret:
+                frame.mean()
+        else:
+            ret = ring.skip(cap)
+        if not ret:
+            break
+        frames += 1
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return {"frames": frames, **ring.stats(), "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video', nargs='?', help='Video to decode (default: a generated clip)')
+    parser.add_argument('--frames', type=int, default=900, help='Frames in the generated clip')
+    parser.add_argument('--sample-interval', type=int, default=3, help='Analyse every Nth frame, as DETECTOR sampling does')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per loop; the fastest is reported')
+    args = parser.parse_args()
+
+    path = args.video
+    temp_dir = None
+    if path is None:
+        temp_dir = tempfile.mkdtemp(prefix='bench-frame-ring-')
+        path = os.path.join(temp_dir, 'clip.mp4')
+        make_clip(path, args.frames)
+        print(f"Generated {args.frames}-frame clip at {path}")
+
+    try:
+        results = {}
+        for name, loop in (("baseline", baseline), ("frame ring", with_ring)):
+            runs = [loop(path, args.sample_interval) for _ in range(args.repeat)]
+            results[name] = min(runs, key=lambda r: r["seconds"])
+
+        print(f"\n{'loop':<12} {'frames':>7} {'allocs':>7} {'reuses':>7} {'grabbed':>8} {'seconds':>8} {'ms/frame':>9}")
+        for name, r in results.items():
+            print(f"{name:<12} {r['frames']:>7} {r['allocations']:>7} {r['reuses']:>7} {r['skipped_frames']:>8} "
+                  f"{r['seconds']:>8.3f} {r['seconds'] * 1000 / max(1, r['frames']):>9.3f}")
+
+        old, new = results["baseline"], results["frame ring"]
+        print(f"\nFrame allocations: {old['allocations']} -> {new['allocations']}")
+        print(f"Decode time: {old['seconds']:.3f}s -> {new['seconds']:.3f}s "
+              f"({(1 - new['seconds'] / old['seconds']) * 100:.0f}% saved)")
+    finally:
+        if temp_dir:
+            os.unlink(path)
+            os.rmdir(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
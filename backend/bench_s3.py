@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+"""
+Benchmark of the S3 client per request versus the shared client.
+
+Each simulated request does what the video list does per video: a HEAD of
+the object and a pre-signed GET URL. "per-request" builds a new boto3
+session and client every time, as the views used to; "shared" uses
+api.s3.get_s3_client(). Besides the time per request it counts the TCP
+connections the S3 endpoint accepted, which shows the connection reuse.
+
+The endpoint is a local S3 stand-in, never AWS:
+- --endpoint URL: an S3-compatible server you started (moto_server, MinIO).
+  Connections are not counted then.
+- otherwise moto's ThreadedMotoServer, if moto is installed;
+- otherwise a minimal in-process server that answers PUT, HEAD and GET.
+
+Usage: python bench_s3.py [--endpoint http://127.0.0.1:5000] [--requests 200]
+"""
+
+import argparse
+import http.server
+import logging
+import os
+import sys
+import threading
+import time
+
+import boto3
+
+BUCKET = 'true-vision'
+KEY = 'media/thumbnails/bench.jpg'
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Just enough of S3 for the benchmark: objects kept in memory by path"""
+    protocol_version = 'HTTP/1.1'
+    objects = {}
+    connections = 0
+
+    def setup(self):
+        StandInHandler.connections += 1
+        super().setup()
+
+    def do_PUT(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.objects[self.path.split('?')[0]] = self.rfile.read(length)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _object(self, with_body):
+        body = self.objects.get(self.path.split('?')[0])
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._object(False)
+
+    def do_GET(self):
+        self._object(True)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_endpoint():
+    """Start a local S3 stand-in; returns (endpoint URL, connection counter or None, stop)"""
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{server.server_port}', lambda: StandInHandler.connections, server.shutdown
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    return f'http://{host}:{port}', None, server.stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoint', help='URL of a running S3 stand-in (default: start one locally)')
+    parser.add_argument('--requests', type=int, default=200, help='Simulated requests per client mode')
+    args = parser.parse_args()
+
+    stop = None
+    count_connections = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        endpoint, count_connections, stop = start_endpoint()
+    print(f"S3 endpoint: {endpoint}")
+
+    # Dummy credentials: the stand-in does not check signatures
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    os.environ['AWS_S3_CLIENT_ENDPOINT_URL'] = endpoint
+
+    # Setup Django environment, so the shared client is configured as in the app
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+    logging.getLogger('api.s3').setLevel(logging.WARNING)
+    from api.s3 import get_s3_client, region_name
+
+    def per_request_client():
+        session = boto3.session.Session(
+            aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+            aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
+            region_name=region_name()
+        )
+        return session.client('s3', endpoint_url=endpoint)
+
+    def simulated_request(client):
+        client.head_object(Bucket=BUCKET, Key=KEY)
+        client.generate_presigned_url('get_object', Params={'Bucket': BUCKET, 'Key': KEY}, ExpiresIn=3600)
+
+    try:
+        setup_client = get_s3_client()
+        try:
+            setup_client.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': region_name()})
+        except setup_client.exceptions.BucketAlreadyOwnedByYou:
+            pass
+        setup_client.put_object(Bucket=BUCKET, Key=KEY, Body=b'\xff\xd8bench\xff\xd9')
+
+        results = {}
+        for name, make_client in (('per-request', per_request_client), ('shared', get_s3_client)):
+            simulated_request(make_client())  # warm up
+            before = count_connections() if count_connections else None
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                simulated_request(make_client())
+            elapsed = time.perf_counter() - start
+            connections = count_connections() - before if count_connections else None
+            results[name] = (elapsed * 1000 / args.requests, connections)
+
+        print(f"\n{'client':<12} {'ms/request':>11} {'connections':>12}")
+        for name, (ms, connections) in results.items():
+            print(f"{name:<12} {ms:>11.2f} {connections if connections is not None else '-':>12}")
+        old, new = results['per-request'][0], results['shared'][0]
+        print(f"\nTime per request: {old:.2f}ms -> {new:.2f}ms ({old / new:.0f}x faster)")
+    finally:
+        if stop:
+            stop()
+
+
+if __name__ == "__main__":
+    main()
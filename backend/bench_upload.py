@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""
+Benchmark of upload latency: how long Video.save() keeps an upload request
+waiting, with the thumbnail work done the old way and the current way.
+
+- sequential: the flow before thumbnails were built from the local upload.
+  The video is stored, the row is saved, then generate_thumbnail() fetches
+  the whole video back from storage and the thumbnail is uploaded, all
+  inside the request.
+- inline: Video.save() with THUMBNAIL_ASYNC off. The thumbnail is cut from
+  the local copy of the upload, but still before save() returns.
+- async: Video.save() as deployed. The thumbnail task runs in the
+  background, so the time until it is ready is reported separately.
+
+Storage latency is simulated with a local storage that sleeps --latency
+seconds per PUT and GET, standing in for S3 round trips.
+
+Usage: python bench_upload.py [video] [--latency 0.5] [--repeat 3]
+Without a video a synthetic 640x480 clip of --frames frames is generated.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+import django
+django.setup()
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import models
+from django.test import override_settings
+
+from api import thumbnail_queue
+from api.models import Video, CustomUser
+
+
+class SlowStorage(FileSystemStorage):
+    """Local storage with a fixed delay per write and per read, like S3 round trips"""
+
+    def __init__(self, latency, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def _save(self, name, content):
+        time.sleep(self.latency)
+        return super()._save(name, content)
+
+    def _open(self, name, mode='rb'):
+        time.sleep(self.latency)
+        return super()._open(name, mode)
+
+
+def make_clip(path, frames, width=640, height=480, fps=30):
+    """Write a synthetic clip of moving noise blocks"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    rng = np.random.default_rng(0)
+    base = (rng.random((height, width, 3)) * 255).astype(np.uint8)
+    for i in range(frames):
+        writer.write(np.roll(base, i * 4, axis=1))
+    writer.release()
+
+
+def new_video(user, data, name):
+    return Video(User_id=user, Video_File=SimpleUploadedFile(name, data), size=len(data),
+                 Length=0, Resolution='0x0', Frame_per_Second=0)
+
+
+def sequential_save(video):
+    """The save flow before the thumbnail was built from the local upload"""
+    models.Model.save(video)
+    video.Video_Path = video.Video_File.url
+    models.Model.save(video, update_fields=['Video_Path'])
+    video.generate_thumbnail()
+    models.Model.save(video, update_fields=['Thumbnail', 'Thumbnail_renditions', 'Thumbnail_preview'])
+
+
+def wait_for_thumbnail(video, timeout=60):
+    """Seconds until the background task has replaced the pending placeholder"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        video.refresh_from_db(fields=['Thumbnail'])
+        if not thumbnail_queue.is_pending_thumbnail(video.Thumbnail.name):
+            return time.perf_counter() - start
+        time.sleep(0.02)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video', nargs='?', help='Video to upload (default: a generated clip)')
+    parser.add_argument('--frames', type=int, default=300, help='Frames in the generated clip')
+    parser.add_argument('--latency', type=float, default=0.5, help='Simulated seconds per storage PUT/GET')
+    parser.add_argument('--repeat', type=int, default=3, help='Uploads per mode; the median is reported')
+    args = parser.parse_args()
+
+    media_dir = tempfile.mkdtemp(prefix='bench-upload-')
+    path = args.video
+    if path is None:
+        path = os.path.join(media_dir, 'clip.mp4')
+        make_clip(path, args.frames)
+    with open(path, 'rb') as f:
+        data = f.read()
+    name = os.path.basename(path)
+    user, _ = CustomUser.objects.get_or_create(username='upload-bench', defaults={'email': 'upload-bench@example.com'})
+
+    storage = SlowStorage(args.latency, location=media_dir, base_url='/media/')
+    for field in ('Video_File', 'Thumbnail'):
+        Video._meta.get_field(field).storage = storage
+    print(f"Uploading {name} ({len(data)} bytes), {args.latency}s per storage request, {args.repeat} runs per mode")
+
+    created = []
+    results = {}
+    try:
+        for mode in ('sequential', 'inline', 'async'):
+            latencies, ready = [], []
+            for _ in range(args.repeat):
+                video = new_video(user, data, name)
+                with override_settings(THUMBNAIL_ASYNC=mode == 'async'), contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    if mode == 'sequential':
+                        sequential_save(video)
+                    else:
+                        video.save()
+                    latencies.append(time.perf_counter() - start)
+                    if mode == 'async':
+                        ready.append(wait_for_thumbnail(video))
+                created.append(video.pk)
+            results[mode] = (sorted(latencies)[len(latencies) // 2],
+                             sorted(r for r in ready if r is not None)[len(ready) // 2] if ready and None not in ready else None)
+
+        print(f"\n{'mode':<12} {'save() latency':>15} {'thumbnail ready after':>22}")
+        for mode, (latency, ready) in results.items():
+            ready_text = '-' if mode != 'async' else (f"+{ready:.2f}s" if ready is not None else 'timed out')
+            print(f"{mode:<12} {latency:>14.2f}s {ready_text:>22}")
+        base = results['sequential'][0]
+        print(f"\nUpload request latency: {base:.2f}s -> {results['async'][0]:.2f}s "
+              f"({(1 - results['async'][0] / base) * 100:.0f}% less)")
+    finally:
+        Video.objects.filter(pk__in=created).delete()
+        shutil.rmtree(media_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
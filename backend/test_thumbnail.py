@@ -13,61 +13,13 @@ from PIL import Image, ImageEnhance, ImageDraw
 import io
 from django.core.files.base import ContentFile
 
-# Define ffmpeg path functions
-def get_ffmpeg_path():
-    """Get the path to the ffmpeg executable based on the project structure."""
-    # Check multiple possible locations for ffmpeg
-    possible_paths = [
-        # Local development paths
-        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin', 'ffmpeg-6.1.1-essentials_build', 'bin', 'ffmpeg.exe'),
-        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin', 'ffmpeg-6.1.1-essentials_build', 'bin', 'ffmpeg'),
-        # Standard Heroku paths
-        '/app/vendor/ffmpeg/ffmpeg',
-        '/usr/bin/ffmpeg',
-        # Heroku buildpack location - most reliable for Heroku
-        '/app/vendor/ffmpeg/bin/ffmpeg',
-    ]
-    
-    # Check if any of the paths exist
-    for path in possible_paths:
-        if os.path.exists(path):
-            print(f"Found ffmpeg at: {path}")
-            return path
-    
-    # Fallback to system PATH
-    print("Using ffmpeg from system PATH")
-    return 'ffmpeg'
-
-def get_ffprobe_path():
-    """Get the path to the ffprobe executable based on the project structure."""
-    # Check multiple possible locations for ffprobe
-    possible_paths = [
-        # Local development paths
-        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin', 'ffmpeg-6.1.1-essentials_build', 'bin', 'ffprobe.exe'),
-        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin', 'ffmpeg-6.1.1-essentials_build', 'bin', 'ffprobe'),
-        # Standard Heroku paths
-        '/app/vendor/ffmpeg/ffprobe',
-        '/usr/bin/ffprobe',
-        # Heroku buildpack location - most reliable for Heroku
-        '/app/vendor/ffmpeg/bin/ffprobe',
-    ]
-    
-    # Check if any of the paths exist
-    for path in possible_paths:
-        if os.path.exists(path):
-            print(f"Found ffprobe at: {path}")
-            return path
-    
-    # Fallback to system PATH
-    print("Using ffprobe from system PATH")
-    return 'ffprobe'
-
 # Setup Django environment
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
 django.setup()
 
 from api.models import Video, CustomUser
+from api.toolchain import ffmpeg_path as get_ffmpeg_path
 
 def test_thumbnail_generation(video_path):
     """Test thumbnail generation from a local video file"""
@@ -1,13 +1,22 @@
 import os
+import sys
+import logging
 import zipfile
 import shutil
 from pathlib import Path
 
+# The app's toolchain registry decides where the binaries go and finds them afterwards
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from api import toolchain
+
+logging.basicConfig(level=logging.INFO, stream=sys.stdout, format='%(message)s')
+logger = logging.getLogger('extract_ffmpeg')
+
 # Get the current working directory
 cwd = Path.cwd()
 # Define the paths
 zip_path = cwd / 'ffmpeg-download' / 'ffmpeg.zip'
-bin_dir = cwd / 'backend' / 'bin'
+bin_dir = Path(toolchain.LOCAL_BIN_DIR)
 
 print(f"Current directory: {cwd}")
 print(f"ZIP path: {zip_path}")
@@ -48,5 +57,16 @@ try:
         print(f"  {item}")
     
     print("FFmpeg extraction completed successfully")
+    
+    # Resolve the tools afresh, as the app will, to check it picks up the extracted binaries
+    toolchain.reset()
+    for name in toolchain.TOOL_NAMES:
+        tool = toolchain.get_tool(name)
+        if tool.available and os.path.realpath(tool.path).startswith(os.path.realpath(bin_dir)):
+            logger.info(f"{name} {tool.version} will be used from {tool.path}")
+        elif tool.available:
+            logger.warning(f"{name} in {bin_dir} was not picked up; the app will use {tool.path}")
+        else:
+            logger.error(f"{name} was not found after extraction; features that need it are disabled")
 except Exception as e:
     print(f"Error extracting FFmpeg: {str(e)}") 
\ No newline at end of file
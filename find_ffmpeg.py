@@ -1,12 +1,20 @@
 #!/usr/bin/env python
 """
-Utility script to find ffmpeg in a Heroku environment
+Utility script to find ffmpeg in a Heroku environment.
+
+Starts with what the app itself will use (backend/api/toolchain.py), then
+searches everywhere else for copies it may have missed.
 """
 
 import os
 import subprocess
 import platform
 import glob
+import json
+import logging
+import sys
+
+logger = logging.getLogger('find_ffmpeg')
 
 def run_cmd(cmd):
     """Run a command and return output"""
@@ -58,7 +66,8 @@ def find_executable(name):
         # Try running it
         out, err, rc = run_cmd(f"{out} -version")
         if rc == 0:
-            print(f"Successfully ran version check: {out.split('\n')[0] if out else 'No output'}")
+            first_line = out.split('\n')[0] if out else 'No output'
+            print(f"Successfully ran version check: {first_line}")
         else:
             print(f"Failed to run version check: {err}")
     else:
@@ -74,7 +83,8 @@ def find_executable(name):
                 # Try running it
                 out2, err2, rc2 = run_cmd(f"{path} -version")
                 if rc2 == 0:
-                    print(f"  Successfully ran version check: {out2.split('\n')[0] if out2 else 'No output'}")
+                    first_line = out2.split('\n')[0] if out2 else 'No output'
+                    print(f"  Successfully ran version check: {first_line}")
                 else:
                     print(f"  Failed to run version check: {err2}")
     else:
@@ -145,7 +155,26 @@ def find_executable(name):
         except Exception as e:
             print(f"Error checking {root_dir}: {e}")
 
+def report_toolchain():
+    """Log the binaries, versions and filters the app's toolchain registry resolves"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+    try:
+        from api import toolchain
+    except Exception as e:
+        logger.error(f"Could not load the toolchain registry: {e}")
+        return
+    for name in toolchain.TOOL_NAMES:
+        tool = toolchain.get_tool(name)
+        logger.info(json.dumps(tool.describe(), indent=2))
+        if name == 'ffmpeg' and tool.available:
+            logger.info(f"thumbnail filter available: {tool.has_filter('thumbnail')}")
+
 if __name__ == "__main__":
+    # Registry and toolchain messages go to stdout, in line with the search output
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout, format='%(message)s')
+    print("Toolchain registry:")
+    report_toolchain()
+    print("\n" + "="*50 + "\n")
     print("Starting ffmpeg search...")
     find_executable("ffmpeg")
     print("\n" + "="*50 + "\n")
@@ -54,6 +54,8 @@ interface Analysis {
     video_id?: number;
   };
   thumbnail_url?: string;
+  thumbnail_srcset?: string;
+  thumbnail_preview?: string;
   video_url?: string;
 }
 
@@ -407,6 +409,8 @@ export const Dashboard = (): JSX.Element => {
               created_at: item.created_at,
               result: resultData || { is_fake: false, confidence: 0 },
               thumbnail_url: thumbnailUrl,
+              thumbnail_srcset: thumbnailUrl === matchedVideo?.thumbnail_url ? matchedVideo?.thumbnail_srcset : undefined,
+              thumbnail_preview: matchedVideo?.thumbnail_preview || undefined,
               video_url: matchedVideo ? matchedVideo.video_url : null
             };
           } catch (e) {
@@ -948,10 +952,22 @@ export const Dashboard = (): JSX.Element => {
                 <div className="preview-container">
                   <div className="aspect-video bg-black rounded-lg overflow-hidden relative w-full h-full">
                     <div className="relative w-full h-full">
+                      {(isImageLoading || !selectedImage) && analyses.find(a => a.id === selectedResult)?.thumbnail_preview && (
+                        // Inline preview from the videos list, shown blurred until the thumbnail arrives
+                        <img
+                          src={analyses.find(a => a.id === selectedResult)?.thumbnail_preview}
+                          alt=" "
+                          aria-hidden="true"
+                          className="absolute inset-0 w-full h-full object-contain"
+                          style={{ filter: 'blur(12px)', transform: 'scale(1.05)' }}
+                        />
+                      )}
                       {selectedImage && (
                         <img
                           key={selectedImage}
                           src={selectedImage}
+                          srcSet={analyses.find(a => a.id === selectedResult && a.thumbnail_url === selectedImage)?.thumbnail_srcset}
+                          sizes="(max-width: 768px) 100vw, 60vw"
                           alt=" "
                           className="w-full h-full object-contain"
                           style={{
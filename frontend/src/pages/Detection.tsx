@@ -9,6 +9,77 @@ interface DetectionProps {
   onAnalysisComplete?: () => void;
 }
 
+interface StreamEvent {
+  event: string;
+  data: any;
+}
+
+// Human readable labels for the stages reported by the upload stream
+const STAGE_LABELS: Record<string, string> = {
+  storing: 'Storing video',
+  stored: 'Preparing analysis',
+  download: 'Preparing analysis',
+  analysis: 'Analyzing frames',
+  quick: 'Quick scan',
+  full: 'Detailed analysis',
+  saving: 'Saving results',
+};
+
+// Parse the complete Server-Sent Events in `text` (a trailing partial event is ignored)
+const parseEventStream = (text: string): StreamEvent[] => {
+  const events: StreamEvent[] = [];
+  const blocks = text.split('\n\n');
+  blocks.pop();
+  for (const block of blocks) {
+    let event = 'message';
+    const dataLines: string[] = [];
+    for (const line of block.split('\n')) {
+      if (line.startsWith('event:')) {
+        event = line.slice(6).trim();
+      } else if (line.startsWith('data:')) {
+        dataLines.push(line.slice(5).trim());
+      }
+    }
+    if (dataLines.length > 0) {
+      try {
+        events.push({ event, data: JSON.parse(dataLines.join('\n')) });
+      } catch (err) {
+        console.error('Could not parse stream event:', err);
+      }
+    }
+  }
+  return events;
+};
+
+// Bytes sent from each end of the file for the server's pre-flight check
+const PREFLIGHT_SAMPLE_BYTES = 256 * 1024;
+
+interface PreflightResult {
+  accepted: boolean;
+  reasons: string[];
+}
+
+// Ask the server whether it would accept the video before uploading all of it
+const preflightVideo = async (file: File): Promise<PreflightResult | null> => {
+  const formData = new FormData();
+  formData.append('size', file.size.toString());
+  formData.append('head', file.slice(0, PREFLIGHT_SAMPLE_BYTES), 'head');
+  if (file.size > PREFLIGHT_SAMPLE_BYTES) {
+    formData.append('tail', file.slice(Math.max(PREFLIGHT_SAMPLE_BYTES, file.size - PREFLIGHT_SAMPLE_BYTES)), 'tail');
+  }
+
+  try {
+    const response = await api.post('/api/test/upload/preflight/', formData, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    });
+    return response.data;
+  } catch (err) {
+    // The upload itself is validated again, so carry on without the pre-flight answer
+    console.error('Pre-flight check failed:', err);
+    return null;
+  }
+};
+
 export const Detection = ({ onAnalysisComplete }: DetectionProps): JSX.Element => {
   const { isDarkMode, isTransitioning } = useTheme();
   const [selectedFile, setSelectedFile] = useState<File | null>(null);
@@ -16,11 +87,13 @@ export const Detection = ({ onAnalysisComplete }: DetectionProps): JSX.Element =
   const [uploadProgress, setUploadProgress] = useState(0);
   const [isAnalyzing, setIsAnalyzing] = useState(false);
   const [analysisProgress, setAnalysisProgress] = useState(0);
+  const [analysisStage, setAnalysisStage] = useState<string | null>(null);
+  const [runningProbability, setRunningProbability] = useState<number | null>(null);
   const [videoDuration, setVideoDuration] = useState<number | null>(null);
   const [error, setError] = useState<string | null>(null);
   const fileInputRef = useRef<HTMLInputElement>(null);
   const videoRef = useRef<HTMLVideoElement>(null);
-  const analysisTimerRef = useRef<NodeJS.Timeout | null>(null);
+  const streamOffsetRef = useRef(0);
   const navigate = useNavigate();
 
   // Function to check video duration
@@ -126,7 +199,18 @@ export const Detection = ({ onAnalysisComplete }: DetectionProps): JSX.Element =
       setIsUploading(true);
       setIsAnalyzing(false);
       setUploadProgress(0);
+      setAnalysisProgress(0);
+      setAnalysisStage(null);
+      setRunningProbability(null);
       setError(null);
+      streamOffsetRef.current = 0;
+
+      // Let the server turn down videos it would reject before sending the whole file
+      const preflight = await preflightVideo(selectedFile);
+      if (preflight && !preflight.accepted) {
+        setError(preflight.reasons.join(' '));
+        return;
+      }
 
       const formData = new FormData();
       formData.append('video', selectedFile);
@@ -138,11 +222,13 @@ export const Detection = ({ onAnalysisComplete }: DetectionProps): JSX.Element =
         formData.append('duration', videoDuration.toString());
       }
 
-      // Make API request with upload progress
-      const response = await api.post('/api/test/upload/', formData, {
+      // Upload and stream analysis progress as Server-Sent Events
+      const response = await api.post('/api/test/upload/stream/', formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
+          'Accept': 'text/event-stream',
         },
+        responseType: 'text',
         onUploadProgress: (progressEvent) => {
           const percentCompleted = Math.round(
             (progressEvent.loaded * 100) / (progressEvent.total || 100)
@@ -152,39 +238,50 @@ export const Detection = ({ onAnalysisComplete }: DetectionProps): JSX.Element =
           // When upload is complete, switch to analyzing state
           if (percentCompleted === 100) {
             setIsAnalyzing(true);
-            setAnalysisProgress(0);
-            
-            // Simulate analysis progress
-            let progress = 0;
-            const estimatedAnalysisTime = 10000; // 8 seconds estimated time for analysis
-            const intervalTime = 200; // Update every 200ms
-            const steps = estimatedAnalysisTime / intervalTime;
-            const increment = 95 / steps; // Go up to 95% with timer, last 5% when complete
-            
-            // Clear any existing timer
-            if (analysisTimerRef.current) {
-              clearInterval(analysisTimerRef.current);
+          }
+        },
+        onDownloadProgress: (progressEvent) => {
+          // The XHR exposes everything received so far; only handle new complete events
+          const xhr = progressEvent.event?.target as XMLHttpRequest | undefined;
+          const text = xhr?.responseText || '';
+          const complete = text.lastIndexOf('\n\n') + 2;
+          if (complete < 2 || complete <= streamOffsetRef.current) {
+            return;
+          }
+          const events = parseEventStream(text.slice(streamOffsetRef.current, complete));
+          streamOffsetRef.current = complete;
+          for (const { event, data } of events) {
+            if (event !== 'progress') {
+              continue;
+            }
+            setIsAnalyzing(true);
+            setAnalysisStage(STAGE_LABELS[data.stage] || 'Analyzing video');
+            setAnalysisProgress(Math.min(Math.round((data.progress || 0) * 100), 99));
+            if (typeof data.running_probability === 'number') {
+              setRunningProbability(data.running_probability);
             }
-            
-            // Start a new timer for analysis progress
-            analysisTimerRef.current = setInterval(() => {
-              progress += increment;
-              if (progress >= 95) {
-                clearInterval(analysisTimerRef.current!);
-              }
-              setAnalysisProgress(Math.min(Math.round(progress), 95));
-            }, intervalTime);
           }
         },
       });
 
+      // The final event carries the regular upload response and its status
+      const finalEvent = parseEventStream(response.data)
+        .filter(({ event }) => event === 'result' || event === 'error')
+        .pop();
+      if (!finalEvent || finalEvent.event === 'error' || finalEvent.data.status !== 201) {
+        setError(finalEvent?.data?.error || 'Failed to upload and analyze video. Please try again.');
+        return;
+      }
+      const result = finalEvent.data;
+      setAnalysisProgress(100);
+
       // Check response and handle success
-      if (response.status === 201) {
-        console.log('Upload successful:', response.data);
+      if (result.status === 201) {
+        console.log('Upload successful:', result);
 
         // Store the video ID and other details
-        if (response.data && response.data.video_id) {
-          const videoId = response.data.video_id;
+        if (result.video_id) {
+          const videoId = result.video_id;
           localStorage.setItem('last_uploaded_video_id', videoId.toString());
           console.log('Stored video ID for highlighting:', videoId);
 
@@ -213,13 +310,13 @@ export const Detection = ({ onAnalysisComplete }: DetectionProps): JSX.Element =
         }
 
         // Log the thumbnail path from the API response
-        if (response.data && response.data.thumbnail_path) {
-          console.log('Thumbnail path in response:', response.data.thumbnail_path);
-          localStorage.setItem('last_api_thumbnail_url', response.data.thumbnail_path);
+        if (result.thumbnail_path) {
+          console.log('Thumbnail path in response:', result.thumbnail_path);
+          localStorage.setItem('last_api_thumbnail_url', result.thumbnail_path);
 
           // Try to get a signed URL for this path
           try {
-            let s3Key = response.data.thumbnail_path;
+            let s3Key = result.thumbnail_path;
 
             // Convert relative path to S3 key if needed
             if (s3Key.startsWith('/')) {
@@ -241,7 +338,7 @@ export const Detection = ({ onAnalysisComplete }: DetectionProps): JSX.Element =
         navigate('/dashboard', {
           state: {
             refresh: true,
-            lastUploadedVideoId: response.data?.video_id,
+            lastUploadedVideoId: result.video_id,
             signedThumbnailUrl: localStorage.getItem('last_signed_thumbnail_url') ||
               localStorage.getItem('last_api_signed_url'),
             videoDuration: videoDuration
@@ -251,17 +348,18 @@ export const Detection = ({ onAnalysisComplete }: DetectionProps): JSX.Element =
         // Call onAnalysisComplete when done
         onAnalysisComplete?.();
       }
-    } catch (error) {
+    } catch (error: any) {
       console.error('Upload error:', error);
-      setError('Failed to upload and analyze video. Please try again.');
+      if (error.response?.status === 429 || error.response?.status === 503) {
+        // Detection service is at capacity, the server says when to retry
+        const retryAfter = error.response.headers?.['retry-after'];
+        setError(`The detection service is busy. Please try again${retryAfter ? ` in ${retryAfter} seconds` : ' shortly'}.`);
+      } else {
+        setError('Failed to upload and analyze video. Please try again.');
+      }
     } finally {
       setIsUploading(false);
       setIsAnalyzing(false);
-      // Clear any running analysis progress timer
-      if (analysisTimerRef.current) {
-        clearInterval(analysisTimerRef.current);
-        analysisTimerRef.current = null;
-      }
     }  
   };
 
@@ -332,8 +430,13 @@ export const Detection = ({ onAnalysisComplete }: DetectionProps): JSX.Element =
               />
             </div>
             <p className={`${isDarkMode ? 'text-gray-400' : 'text-gray-600'} text-sm`}>
-              {isAnalyzing ? `Analyzing video... ${analysisProgress}%` : `Uploading... ${uploadProgress}%`}
+              {isAnalyzing ? `${analysisStage || 'Analyzing video'}... ${analysisProgress}%` : `Uploading... ${uploadProgress}%`}
             </p>
+            {isAnalyzing && runningProbability !== null && (
+              <p className={`${isDarkMode ? 'text-gray-500' : 'text-gray-500'} text-xs mt-1`}>
+                Running deepfake probability: {(runningProbability * 100).toFixed(1)}%
+              </p>
+            )}
           </div>
         )}
 